@@ -0,0 +1,67 @@
+"""Fixtures of the benchmark suite.
+
+The benchmarks are a local tool, as the timings of different machines can't be
+compared. Save a baseline on the commit before a change using
+``tox -e benchmark-baseline``, and then compare the change with it on the same machine
+using ``tox -e benchmark``. The runs are saved in ``.benchmarks/`` per platform.
+The peer counts can be changed with ``--peer-counts``, e.g. ``--peer-counts 100000``.
+"""
+from pathlib import Path
+import stat
+import sys
+
+import pytest
+
+from wg_wizard.wg import get_key_backend, set_key_backend, WgCommandKeyBackend
+from .synthetic import write_synthetic_wg_wizard
+
+DEFAULT_PEER_COUNTS = "10,1000,10000"
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--peer-counts",
+        default=DEFAULT_PEER_COUNTS,
+        help="Comma-separated numbers of peers in the synthetic configs.",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "n_peers" in metafunc.fixturenames:
+        peer_counts = metafunc.config.getoption("--peer-counts").split(",")
+        metafunc.parametrize(
+            "n_peers", [int(count) for count in peer_counts], scope="session"
+        )
+
+
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    # the raw timings are not needed for comparing, so keep the saved runs small
+    for benchmark in output_json["benchmarks"]:
+        benchmark["stats"].pop("data", None)
+
+
+@pytest.fixture(scope="session")
+def config_dir(tmp_path_factory, n_peers) -> Path:
+    """Generate a config dir with the synthetic ``wg0`` interface once per session."""
+    config_dir = tmp_path_factory.mktemp(f"peers_{n_peers}")
+    write_synthetic_wg_wizard(config_dir, "wg0", n_peers)
+    return config_dir
+
+
+@pytest.fixture(scope="session")
+def fake_wg_path(tmp_path_factory) -> Path:
+    """Write an executable ``wg`` stand-in which runs ``fake_wg.py`` with this Python."""
+    path = tmp_path_factory.mktemp("bin") / "wg"
+    source = (Path(__file__).parent / "fake_wg.py").read_text()
+    path.write_text(f"#!{sys.executable}\n{source}")
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return path
+
+
+@pytest.fixture
+def fake_wg_backend(fake_wg_path):
+    """Use the ``wg`` key backend with the stand-in binary during a test."""
+    original_backend = get_key_backend()
+    backend = set_key_backend(WgCommandKeyBackend(str(fake_wg_path)))
+    yield backend
+    set_key_backend(original_backend)
@@ -0,0 +1,27 @@
+"""A stand-in for the ``wg`` binary which only implements ``genkey``, ``pubkey`` and ``genpsk``.
+
+It reads and writes the same formats as ``wg``, so the ``wg`` key backend can be
+benchmarked without installing WireGuard. The keys come from the in-process key
+backends, so they are real Curve25519 key pairs.
+"""
+import sys
+
+from wg_wizard.wg import create_key_backend
+
+
+def main(argv: list[str]) -> int:
+    backend = create_key_backend()
+    if argv == ["genkey"]:
+        print(backend.genkey())
+    elif argv == ["pubkey"]:
+        print(backend.pubkey(sys.stdin.read()))
+    elif argv == ["genpsk"]:
+        print(backend.genpsk())
+    else:
+        print(f"Usage: wg genkey | pubkey | genpsk, got {argv}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,60 @@
+from ipaddress import ip_network
+from pathlib import Path
+from typing import Optional
+
+from ruamel.yaml import YAML
+
+from wg_wizard.core import WgWizardSecret
+from wg_wizard.paths import get_config_path, get_secret_path
+
+
+def get_peer_name(i: int) -> str:
+    return f"peer_{i}"
+
+
+def build_raw_config(interface: str, n_peers: int) -> dict:
+    network = ip_network("10.0.0.0/8")
+    peers = {}
+    for i in range(n_peers):
+        address = f"{network[i + 2]}/32"
+        peers[get_peer_name(i)] = {
+            "addresses": [address],
+            "server_allowed_ips": [address],
+            "client_allowed_ips": ["0.0.0.0/0", "::/0"],
+            "client_persistent_keepalive": 25,
+        }
+    return {
+        "name": interface,
+        "listen_port": 51820,
+        "addresses": [f"{network[1]}/8"],
+        "post_up": ["iptables -A FORWARD -i %i -o %i -j ACCEPT"],
+        "pre_down": ["iptables -D FORWARD -i %i -o %i -j ACCEPT"],
+        "default_endpoint": "example.com:51820",
+        "peers": peers,
+    }
+
+
+def build_secret(n_peers: int, jobs: Optional[int] = None) -> WgWizardSecret:
+    secret = WgWizardSecret.generate()
+    secret.generate_peer_secrets((get_peer_name(i) for i in range(n_peers)), jobs)
+    return secret
+
+
+def write_synthetic_config(config_dir: Path, interface: str, n_peers: int) -> Path:
+    config_path = get_config_path(config_dir, interface)
+    # the safe dumper uses the C emitter, which matters with 100k peers
+    yaml = YAML(typ="safe")
+    yaml.default_flow_style = False
+    yaml.dump(build_raw_config(interface, n_peers), config_path)
+    config_path.chmod(0o600)
+    return config_path
+
+
+def write_synthetic_wg_wizard(
+    config_dir: Path, interface: str, n_peers: int, jobs: Optional[int] = None
+) -> tuple[Path, Path]:
+    """Write a config with ``n_peers`` peers and its secret with real key pairs."""
+    config_path = write_synthetic_config(config_dir, interface, n_peers)
+    secret_path = get_secret_path(config_dir, interface)
+    build_secret(n_peers, jobs).dump(secret_path, overwrite=True)
+    return config_path, secret_path
@@ -0,0 +1,37 @@
+import gc
+import tracemalloc
+
+import pytest
+
+from wg_wizard.core import WgWizardConfig
+from wg_wizard.paths import get_config_path
+
+
+def measure_retained_bytes(func) -> tuple[object, int]:
+    """Call ``func`` and measure the memory still taken by its result."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func()
+        gc.collect()
+        retained_bytes, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, retained_bytes
+
+
+@pytest.mark.parametrize("compact", [False, True], ids=["models", "compact"])
+def test_config_memory(benchmark, config_dir, n_peers, compact):
+    def load():
+        return WgWizardConfig.from_file(
+            get_config_path(config_dir, "wg0"), read_only=True, compact=compact
+        )
+
+    benchmark.group = f"config_memory-{n_peers}"
+    config, retained_bytes = measure_retained_bytes(load)
+    assert len(config.peers) == n_peers
+    del config
+    # compared by `--benchmark-compare` as well, with the loading time
+    benchmark.extra_info["retained_bytes"] = retained_bytes
+    benchmark.extra_info["retained_bytes_per_peer"] = retained_bytes / n_peers
+    benchmark.pedantic(load, rounds=3)
@@ -0,0 +1,67 @@
+from io import StringIO
+
+import pytest
+from qrcode import QRCode
+
+from wg_wizard.qr import format_qrcode_ascii, QrCodeCache, render_qrcode_image
+from wg_wizard.wg import gen_key_pair, genpsk
+from wg_wizard.wg_quick import (
+    WgQuickConfig,
+    WgQuickInterfaceConfig,
+    WgQuickPeerConfig,
+)
+
+
+@pytest.fixture(scope="module")
+def client_config() -> WgQuickConfig:
+    return WgQuickConfig(
+        interface=WgQuickInterfaceConfig(
+            private_key=gen_key_pair()[0],
+            address=["10.0.0.2/32", "fd00::2/128"],
+            dns=["10.0.0.1"],
+            pre_up=[],
+            post_up=[],
+            pre_down=[],
+            post_down=[],
+        ),
+        peer=[
+            WgQuickPeerConfig(
+                comment="server",
+                public_key=gen_key_pair()[1],
+                preshared_key=genpsk(),
+                allowed_ips=["0.0.0.0/0", "::/0"],
+                endpoint="vpn.example.com:51820",
+                persistent_keepalive=25,
+            )
+        ],
+    )
+
+
+def print_default_ascii(data: str) -> str:
+    # the QR Code used to be generated like this
+    qr = QRCode()
+    qr.add_data(data)
+    output = StringIO()
+    qr.print_ascii(out=output)
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("compact", [False, True], ids=["full", "compact"])
+@pytest.mark.parametrize("output", ["default_ascii", "ascii", "png", "svg"])
+def test_qrcode(benchmark, client_config, output, compact):
+    benchmark.group = "qrcode"
+    data = client_config.format_ini(compact=compact)
+    if output == "default_ascii":
+        benchmark(print_default_ascii, data)
+    elif output == "ascii":
+        benchmark(format_qrcode_ascii, data)
+    else:
+        benchmark(render_qrcode_image, data, output)
+
+
+def test_qrcode_cached(benchmark, client_config):
+    benchmark.group = "qrcode"
+    qrcode_cache = QrCodeCache()
+    data = client_config.format_ini()
+    png = benchmark(qrcode_cache.get_or_render, data, "png")
+    assert png == render_qrcode_image(data, "png")
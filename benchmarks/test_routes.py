@@ -0,0 +1,72 @@
+from ipaddress import collapse_addresses, ip_interface, IPv4Network, IPv6Network
+import random
+
+import pytest
+
+from wg_wizard.routes import collapse_allowed_ips, resolve_allowed_ips
+
+
+def make_excluded_networks(n: int) -> list:
+    # e.g., the blocked ranges of a geo-IP list, half of them IPv6
+    rng = random.Random(n)
+    networks = []
+    for i in range(n):
+        if i % 2:
+            prefixlen = rng.randint(24, 64)
+            network = IPv6Network((rng.getrandbits(128), prefixlen), strict=False)
+        else:
+            prefixlen = rng.randint(12, 32)
+            network = IPv4Network((rng.getrandbits(32), prefixlen), strict=False)
+        networks.append(network)
+    return networks
+
+
+def exclude_networks_one_by_one(include, exclude) -> list:
+    # how the AllowedIPs calculators usually do it, with ``address_exclude``
+    networks = list(include)
+    for excluded in exclude:
+        networks = [
+            subnet
+            for network in networks
+            for subnet in (
+                network.address_exclude(excluded)
+                if network.version == excluded.version and excluded.subnet_of(network)
+                else ([] if network.overlaps(excluded) else [network])
+            )
+        ]
+    return list(collapse_addresses(n for n in networks if n.version == 4)) + list(
+        collapse_addresses(n for n in networks if n.version == 6)
+    )
+
+
+INCLUDE = [IPv4Network("0.0.0.0/0"), IPv6Network("::/0")]
+
+
+@pytest.mark.parametrize("n_excluded", [100, 1000, 10000])
+def test_resolve_allowed_ips(benchmark, n_excluded):
+    exclude = make_excluded_networks(n_excluded)
+    benchmark.group = f"resolve_allowed_ips-{n_excluded}"
+    networks = benchmark(resolve_allowed_ips, INCLUDE, exclude)
+    benchmark.extra_info["n_prefixes"] = len(networks)
+
+
+# about 300 times slower than resolve_allowed_ips with 1000 excluded networks
+@pytest.mark.parametrize("n_excluded", [100])
+def test_resolve_allowed_ips_one_by_one(benchmark, n_excluded):
+    exclude = make_excluded_networks(n_excluded)
+    benchmark.group = f"resolve_allowed_ips-{n_excluded}"
+    networks = benchmark.pedantic(
+        exclude_networks_one_by_one, (INCLUDE, exclude), rounds=3
+    )
+    assert networks == resolve_allowed_ips(INCLUDE, exclude)
+
+
+@pytest.mark.parametrize("n_allowed_ips", [1, 1000])
+def test_collapse_allowed_ips(benchmark, n_allowed_ips):
+    # the addresses of a peer routing a whole subnet, e.g., a site-to-site peer
+    allowed_ips = [
+        ip_interface(f"10.{i // 256}.{i % 256}.0/24") for i in range(n_allowed_ips)
+    ]
+    benchmark.group = f"collapse_allowed_ips-{n_allowed_ips}"
+    collapsed = benchmark(collapse_allowed_ips, allowed_ips)
+    assert len(collapsed) <= len(allowed_ips)
@@ -0,0 +1,124 @@
+import pytest
+
+from wg_wizard.cache import PeerRenderCache, VerifiedKeyCache
+from wg_wizard.core import (
+    format_wg_quick_server_config,
+    to_wg_quick_server_config,
+    WgWizard,
+)
+from wg_wizard.wg import PythonKeyBackend
+from wg_wizard.wg_quick import WgQuickConfig
+
+
+@pytest.fixture(scope="session")
+def wg_wizard(config_dir) -> WgWizard:
+    return WgWizard.from_dir(config_dir, "wg0")
+
+
+@pytest.fixture(scope="session")
+def wg_quick_config(wg_wizard) -> WgQuickConfig:
+    return to_wg_quick_server_config(wg_wizard)
+
+
+@pytest.mark.parametrize("read_only", [False, True], ids=["round_trip", "read_only"])
+def test_from_dir(benchmark, config_dir, n_peers, read_only):
+    benchmark.group = f"from_dir-{n_peers}"
+    wg_wizard = benchmark(WgWizard.from_dir, config_dir, "wg0", read_only=read_only)
+    assert len(wg_wizard.config.peers) == n_peers
+
+
+def test_check_secret(benchmark, wg_wizard, n_peers):
+    def reset_key_cache():
+        wg_wizard._key_cache = VerifiedKeyCache()
+
+    # every round verifies all the key pairs from scratch
+    benchmark.group = f"check_secret-{n_peers}"
+    benchmark.pedantic(wg_wizard.check_secret, setup=reset_key_cache, rounds=5)
+
+
+def test_find_conflicts(benchmark, wg_wizard, n_peers):
+    # checked by `check` and before every session commit
+    benchmark.group = f"find_conflicts-{n_peers}"
+    conflicts = benchmark(wg_wizard.config.find_conflicts)
+    assert conflicts == []
+
+
+def test_to_wg_quick_server_config(benchmark, wg_wizard, n_peers):
+    # the key pairs are verified in the first round and cached in memory afterwards
+    benchmark.group = f"to_wg_quick_server_config-{n_peers}"
+    wg_quick_config = benchmark(to_wg_quick_server_config, wg_wizard)
+    assert len(wg_quick_config.peer) == n_peers
+
+
+def test_to_wg_quick_server_config_validated(benchmark, wg_wizard, n_peers):
+    # the values of wg_wizard are validated again
+    benchmark.group = f"to_wg_quick_server_config-{n_peers}"
+    wg_quick_config = benchmark(to_wg_quick_server_config, wg_wizard, trusted=False)
+    assert len(wg_quick_config.peer) == n_peers
+
+
+@pytest.mark.parametrize("render_cache", ["cold", "warm"])
+def test_format_wg_quick_server_config(benchmark, wg_wizard, n_peers, render_cache):
+    def reset_render_cache():
+        wg_wizard._render_cache = PeerRenderCache()
+
+    # warm: only one peer changed since the last export
+    def change_one_peer():
+        peer_config = next(iter(wg_wizard.config.peers.values()))
+        peer_config.server_persistent_keepalive = (
+            peer_config.server_persistent_keepalive or 0
+        ) + 1
+
+    benchmark.group = f"format_wg_quick_server_config-{n_peers}"
+    wg_wizard.check_secret()
+    reset_render_cache()
+    format_wg_quick_server_config(wg_wizard)
+    ini = benchmark.pedantic(
+        format_wg_quick_server_config,
+        args=(wg_wizard,),
+        setup=reset_render_cache if render_cache == "cold" else change_one_peer,
+        rounds=10,
+    )
+    assert ini.count("[Peer]") == n_peers
+
+
+def test_format_ini(benchmark, wg_quick_config, n_peers):
+    benchmark.group = f"format_ini-{n_peers}"
+    ini = benchmark(wg_quick_config.format_ini)
+    assert ini.count("[Peer]") == n_peers
+
+
+def test_find_next_available_interface(benchmark, wg_wizard, n_peers):
+    benchmark.group = f"find_next_available_interface-{n_peers}"
+    interface = benchmark(wg_wizard.config.find_next_available_interface)
+    assert interface is not None
+    assert interface not in wg_wizard.config.addresses
+
+
+def test_generate_keys(benchmark, config_dir, n_peers):
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", read_only=True)
+    benchmark.group = f"generate_keys-{n_peers}"
+    benchmark.pedantic(
+        wg_wizard.generate_keys, kwargs={"regenerate_all": True}, rounds=3
+    )
+    assert len(wg_wizard.secret.peers) == n_peers
+
+
+def test_generate_keys_fake_wg(benchmark, config_dir, n_peers, fake_wg_backend):
+    # the wg backend spawns 3 processes per peer, so only regenerate a few peers
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", read_only=True)
+    peers = list(wg_wizard.config.peers)[:10]
+    benchmark.group = f"generate_keys_fake_wg-{n_peers}"
+    benchmark.pedantic(wg_wizard.generate_keys, kwargs={"peers": peers}, rounds=3)
+    # check in-process, otherwise every peer spawns a stand-in process
+    python_backend = PythonKeyBackend()
+    for peer_name in peers:
+        peer_secret = wg_wizard.secret.peers[peer_name]
+        private_key = peer_secret.private_key.get_secret_value()
+        assert python_backend.pubkey(private_key) == peer_secret.public_key
+
+
+def test_dump(benchmark, wg_wizard, n_peers, tmp_path):
+    benchmark.group = f"dump-{n_peers}"
+    benchmark(wg_wizard.dump, tmp_path, "wg0")
+    assert len(WgWizard.from_dir(tmp_path, "wg0").config.peers) == n_peers
@@ -0,0 +1,13 @@
+import pytest
+
+from wg_wizard.core import WgWizardConfig
+from wg_wizard.paths import get_config_path
+
+
+@pytest.mark.parametrize("read_only", [False, True], ids=["round_trip", "read_only"])
+def test_config_from_file(benchmark, config_dir, n_peers, read_only):
+    benchmark.group = f"config_from_file-{n_peers}"
+    config = benchmark(
+        WgWizardConfig.from_file, get_config_path(config_dir, "wg0"), read_only
+    )
+    assert len(config.peers) == n_peers
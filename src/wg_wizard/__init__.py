@@ -1,3 +1,7 @@
-from importlib.metadata import version
+def __getattr__(name):
+    # importlib.metadata is slow to import, so only load it when asked for the version
+    if name == "__version__":
+        from importlib.metadata import version
 
-__version__ = version("wg-wizard")
+        return version("wg-wizard")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
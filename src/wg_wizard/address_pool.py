@@ -0,0 +1,234 @@
+from bisect import bisect_left, bisect_right
+from ipaddress import (
+    ip_address,
+    ip_interface,
+    IPv4Address,
+    IPv4Interface,
+    IPv4Network,
+    IPv6Address,
+    IPv6Interface,
+    IPv6Network,
+)
+from typing import Iterable, Iterator, TypeVar, Union
+
+IPAddress = Union[IPv4Address, IPv6Address]
+IPInterface = Union[IPv4Interface, IPv6Interface]
+IPNetwork = Union[IPv4Network, IPv6Network]
+OwnerT = TypeVar("OwnerT")
+
+
+class AddressPoolExhausted(ValueError):
+    pass
+
+
+def get_host_range(network: IPNetwork) -> tuple[int, int]:
+    """Return the first and last host of a network, following ``network.hosts()``."""
+    first = int(network.network_address)
+    last = int(network.broadcast_address)
+    if network.num_addresses <= 2:
+        return first, last
+    if network.version == 4:
+        return first + 1, last - 1
+    # IPv6 only excludes the Subnet-Router anycast address
+    return first + 1, last
+
+
+def find_overlapping_networks(
+    networks: Iterable[tuple[IPNetwork, OwnerT]],
+) -> Iterator[tuple[IPNetwork, OwnerT, IPNetwork, OwnerT]]:
+    """Find the overlapping networks of different owners.
+
+    Two networks either contain one another or don't overlap. With the networks
+    sorted by their first addresses and sizes, the ones containing the current one
+    form a stack, and the ones before them can be dropped. So it takes
+    O(n log n) time plus the number of overlaps, instead of comparing every pair.
+
+    Yields
+    ------
+    tuple[IPNetwork, OwnerT, IPNetwork, OwnerT]
+        A network, its owner, a network containing it and the owner of that one.
+    """
+    stack: list[tuple[IPNetwork, OwnerT]] = []
+    for network, owner in sorted(
+        networks,
+        key=lambda item: (
+            item[0].version,
+            item[0].network_address,
+            item[0].prefixlen,
+        ),
+    ):
+        while stack and (
+            stack[-1][0].version != network.version
+            or stack[-1][0].broadcast_address < network.network_address
+        ):
+            stack.pop()
+        for outer_network, outer_owner in stack:
+            if outer_owner != owner:
+                yield network, owner, outer_network, outer_owner
+        stack.append((network, owner))
+
+
+class AddressPool:
+    """The free addresses of a network stored as sorted and disjoint ranges.
+
+    ``_starts[i]`` and ``_ends[i]`` are the first and last addresses (inclusive)
+    of the i-th free range, so finding the range of an address is a binary search
+    no matter how large the network is.
+    """
+
+    def __init__(self, network: IPNetwork):
+        self.network = network
+        first, last = get_host_range(network)
+        self._starts = [first]
+        self._ends = [last]
+
+    def count_free(self) -> int:
+        # not __len__ because IPv6 pools can be larger than sys.maxsize
+        return sum(end - start + 1 for start, end in zip(self._starts, self._ends))
+
+    def __contains__(self, address: IPAddress) -> bool:
+        if address.version != self.network.version:
+            return False
+        value = int(address)
+        i = bisect_right(self._starts, value) - 1
+        return i >= 0 and value <= self._ends[i]
+
+    def reserve_range(self, first: int, last: int):
+        """Remove the addresses from ``first`` to ``last`` (inclusive) from the pool."""
+        i = bisect_right(self._ends, first - 1)
+        j = bisect_left(self._starts, last + 1)
+        if i >= j:
+            return
+        new_starts = []
+        new_ends = []
+        if self._starts[i] < first:
+            new_starts.append(self._starts[i])
+            new_ends.append(first - 1)
+        if self._ends[j - 1] > last:
+            new_starts.append(last + 1)
+            new_ends.append(self._ends[j - 1])
+        self._starts[i:j] = new_starts
+        self._ends[i:j] = new_ends
+
+    def reserve(self, addresses: IPAddress | IPNetwork):
+        if addresses.version != self.network.version:
+            return
+        if isinstance(addresses, (IPv4Network, IPv6Network)):
+            self.reserve_range(
+                int(addresses.network_address), int(addresses.broadcast_address)
+            )
+        else:
+            self.reserve_range(int(addresses), int(addresses))
+
+    def allocate(self) -> IPAddress:
+        """Allocate the lowest free address."""
+        return self.allocate_many(1)[0]
+
+    def allocate_many(self, count: int) -> list[IPAddress]:
+        """Allocate the lowest ``count`` free addresses."""
+        values = []
+        while len(values) < count and self._starts:
+            start = self._starts[0]
+            take = min(count - len(values), self._ends[0] - start + 1)
+            values.extend(range(start, start + take))
+            if start + take > self._ends[0]:
+                del self._starts[0]
+                del self._ends[0]
+            else:
+                self._starts[0] = start + take
+        if len(values) < count:
+            self.release_many(values)
+            raise AddressPoolExhausted(
+                f"Only {len(values)} addresses are available in {self.network}."
+            )
+        return [ip_address(value) for value in values]
+
+    def release_many(self, values: Iterable[int]):
+        for value in sorted(values, reverse=True):
+            i = bisect_right(self._starts, value) - 1
+            if i >= 0 and value <= self._ends[i]:
+                continue
+            if i >= 0 and self._ends[i] == value - 1:
+                self._ends[i] = value
+            else:
+                i += 1
+                self._starts.insert(i, value)
+                self._ends.insert(i, value)
+            if i + 1 < len(self._starts) and self._starts[i + 1] == value + 1:
+                self._ends[i] = self._ends.pop(i + 1)
+                del self._starts[i + 1]
+
+    def release(self, address: IPAddress):
+        self.release_many([int(address)])
+
+
+class AddressAllocator:
+    """Allocate one address from each IP version for every peer.
+
+    Each IP version can have several pools. An address is taken from the first
+    pool which still has free addresses. Overlapping networks share one pool.
+    """
+
+    def __init__(
+        self,
+        networks: Iterable[IPNetwork],
+        reserved: Iterable[IPAddress | IPNetwork] = (),
+    ):
+        self.pools: dict[int, list[AddressPool]] = {}
+        networks = list(networks)
+        for i, network in enumerate(networks):
+            # a network inside another one shares its addresses, so only the outer
+            # one gets a pool, or the same address could be allocated from both
+            if any(
+                other.version == network.version
+                and network.subnet_of(other)
+                and (other != network or j < i)
+                for j, other in enumerate(networks)
+            ):
+                continue
+            self.pools.setdefault(network.version, []).append(AddressPool(network))
+        self.reserve(reserved)
+
+    def reserve(self, addresses: Iterable[IPAddress | IPNetwork]):
+        for address in addresses:
+            for pool in self.pools.get(address.version, ()):
+                pool.reserve(address)
+
+    def is_free(self, address: IPAddress) -> bool:
+        return any(address in pool for pool in self.pools.get(address.version, ()))
+
+    def allocate_many(self, count: int) -> list[list[IPInterface]]:
+        """Allocate the addresses for ``count`` peers.
+
+        Nothing is allocated if any IP version doesn't have enough free addresses.
+        """
+        allocated: dict[int, list[IPAddress]] = {}
+        try:
+            for version, pools in self.pools.items():
+                addresses = allocated[version] = []
+                for pool in pools:
+                    take = min(count - len(addresses), pool.count_free())
+                    if take:
+                        addresses.extend(pool.allocate_many(take))
+                if len(addresses) < count:
+                    raise AddressPoolExhausted(
+                        f"Only {len(addresses)} IPv{version} addresses are available."
+                    )
+        except AddressPoolExhausted:
+            for addresses in allocated.values():
+                self.release(addresses)
+            raise
+        return [
+            [ip_interface(addresses[i]) for addresses in allocated.values()]
+            for i in range(count)
+        ]
+
+    def allocate(self) -> list[IPInterface]:
+        return self.allocate_many(1)[0]
+
+    def release(self, addresses: Iterable[IPAddress]):
+        for address in addresses:
+            for pool in self.pools.get(address.version, ()):
+                if address in pool.network:
+                    pool.release(address)
+                    break
@@ -0,0 +1,266 @@
+from ipaddress import ip_network
+import logging
+import os
+from pathlib import Path
+import tempfile
+from typing import Iterable, Literal, NamedTuple, Optional
+
+from .utils import format_ini_lines
+from .wg_quick import WgQuickConfig, WgQuickInterfaceConfig, WgQuickPeerConfig
+
+logger = logging.getLogger(__name__)
+# `wg set` gets all the peers in its arguments, so larger deltas use `wg syncconf`
+# to stay far away from the size limit of the command line
+MAX_WG_SET_PEERS = 1000
+# the fields of [Interface] which `wg` understands, the others are for wg-quick
+WG_INTERFACE_FIELDS = {"private_key", "listen_port", "fw_mark"}
+
+
+class PeerState(NamedTuple):
+    public_key: str
+    preshared_key: Optional[str]
+    endpoint: Optional[str]
+    allowed_ips: frozenset[str]
+    persistent_keepalive: int  # 0 means off
+
+
+class InterfaceState(NamedTuple):
+    private_key: str
+    listen_port: Optional[int]
+    fw_mark: int  # 0 means off
+
+
+class PeerDelta(NamedTuple):
+    interface: dict[str, tuple]
+    added: list[PeerState]
+    removed: list[PeerState]
+    changed: list[tuple[PeerState, PeerState]]
+
+    def __bool__(self) -> bool:
+        return bool(self.interface or self.added or self.removed or self.changed)
+
+
+def _parse_dump_value(value: str) -> Optional[str]:
+    return None if value in ("(none)", "off", "") else value
+
+
+def _parse_optional_int(value: Optional[str | int]) -> int:
+    return 0 if value in (None, "off") else int(value)
+
+
+def normalize_allowed_ips(allowed_ips: Iterable) -> frozenset[str]:
+    # the kernel masks the host bits, e.g., 10.0.0.5/24 is shown as 10.0.0.0/24
+    return frozenset(str(ip_network(str(ip), strict=False)) for ip in allowed_ips)
+
+
+def parse_wg_dump(dump: str) -> tuple[InterfaceState, dict[str, PeerState]]:
+    """Parse the output of ``wg show <interface> dump``.
+
+    The first line is the interface and each of the other lines is a peer.
+    The peers are keyed by their public keys.
+    """
+    lines = dump.splitlines()
+    if not lines:
+        raise ValueError("The output of `wg show dump` is empty.")
+    private_key, _public_key, listen_port, fw_mark = lines[0].split("\t")
+    interface = InterfaceState(
+        private_key=private_key,
+        listen_port=_parse_optional_int(_parse_dump_value(listen_port)) or None,
+        fw_mark=_parse_optional_int(_parse_dump_value(fw_mark)),
+    )
+    peers = {}
+    for line in lines[1:]:
+        fields = line.split("\t")
+        if len(fields) != 8:
+            raise ValueError(
+                f"Invalid peer line in the output of `wg show dump`: {line!r}"
+            )
+        allowed_ips = _parse_dump_value(fields[3])
+        peers[fields[0]] = PeerState(
+            public_key=fields[0],
+            preshared_key=_parse_dump_value(fields[1]),
+            endpoint=_parse_dump_value(fields[2]),
+            allowed_ips=normalize_allowed_ips(
+                allowed_ips.split(",") if allowed_ips else ()
+            ),
+            persistent_keepalive=_parse_optional_int(_parse_dump_value(fields[7])),
+        )
+    return interface, peers
+
+
+def to_interface_state(interface: WgQuickInterfaceConfig) -> InterfaceState:
+    return InterfaceState(
+        private_key=interface.private_key.get_secret_value(),
+        listen_port=interface.listen_port,
+        fw_mark=_parse_optional_int(interface.fw_mark),
+    )
+
+
+def to_peer_state(peer: WgQuickPeerConfig) -> PeerState:
+    return PeerState(
+        public_key=peer.public_key,
+        preshared_key=(
+            None
+            if peer.preshared_key is None
+            else peer.preshared_key.get_secret_value()
+        ),
+        endpoint=peer.endpoint,
+        allowed_ips=normalize_allowed_ips(peer.allowed_ips),
+        persistent_keepalive=_parse_optional_int(peer.persistent_keepalive),
+    )
+
+
+def is_peer_changed(current: PeerState, desired: PeerState) -> bool:
+    # the endpoint of a server-side peer is usually learned from the handshakes,
+    # so it only matters if it is set explicitly
+    return (
+        current.preshared_key != desired.preshared_key
+        or current.allowed_ips != desired.allowed_ips
+        or current.persistent_keepalive != desired.persistent_keepalive
+        or (desired.endpoint is not None and current.endpoint != desired.endpoint)
+    )
+
+
+def compute_peer_delta(
+    current_interface: InterfaceState,
+    current_peers: dict[str, PeerState],
+    desired_interface: InterfaceState,
+    desired_peers: Iterable[PeerState],
+) -> PeerDelta:
+    """Compare the running peers with the desired peers by their public keys."""
+    interface = {
+        field: (current, desired)
+        for field, current, desired in zip(
+            InterfaceState._fields, current_interface, desired_interface
+        )
+        if current != desired
+    }
+    added = []
+    changed = []
+    seen = set()
+    for desired in desired_peers:
+        seen.add(desired.public_key)
+        current = current_peers.get(desired.public_key)
+        if current is None:
+            added.append(desired)
+        elif is_peer_changed(current, desired):
+            changed.append((current, desired))
+    removed = [peer for key, peer in current_peers.items() if key not in seen]
+    return PeerDelta(interface=interface, added=added, removed=removed, changed=changed)
+
+
+def build_wg_set_args(
+    interface_name: str, delta: PeerDelta, key_dir: Path
+) -> list[str]:
+    """Build the arguments of one ``wg set`` call which applies the delta.
+
+    ``wg set`` only reads keys from files, so the keys are written into ``key_dir``.
+    """
+    key_count = 0
+
+    def write_key(key: str) -> str:
+        nonlocal key_count
+        key_count += 1
+        path = key_dir / f"key_{key_count}"
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(key)
+        return str(path)
+
+    args = ["set", interface_name]
+    if "private_key" in delta.interface:
+        args += ["private-key", write_key(delta.interface["private_key"][1])]
+    if "listen_port" in delta.interface:
+        args += ["listen-port", str(delta.interface["listen_port"][1] or 0)]
+    if "fw_mark" in delta.interface:
+        args += ["fwmark", str(delta.interface["fw_mark"][1] or "off")]
+    for peer in delta.removed:
+        args += ["peer", peer.public_key, "remove"]
+    for peer in [*delta.added, *(desired for _, desired in delta.changed)]:
+        args += ["peer", peer.public_key]
+        args += [
+            "preshared-key",
+            "/dev/null"
+            if peer.preshared_key is None
+            else write_key(peer.preshared_key),
+        ]
+        if peer.endpoint is not None:
+            args += ["endpoint", peer.endpoint]
+        args += ["persistent-keepalive", str(peer.persistent_keepalive or "off")]
+        args += ["allowed-ips", ",".join(sorted(peer.allowed_ips))]
+    return args
+
+
+def format_wg_conf(wg_quick_config: WgQuickConfig) -> str:
+    """Format the config for ``wg setconf`` and ``wg syncconf``, like ``wg-quick strip``."""
+    interface = wg_quick_config.interface
+    exclude = type(interface).model_fields.keys() - WG_INTERFACE_FIELDS
+    chunks = ["\n".join(["[Interface]", *format_ini_lines(interface, exclude)])]
+    chunks.extend("\n".join(peer.format_ini_lines()) for peer in wg_quick_config.peer)
+    return "\n\n".join(chunks) + "\n"
+
+
+class WgCommand:
+    """Run the ``wg`` binary, which can be replaced by a compatible stand-in."""
+
+    def __init__(self, command: str = "wg"):
+        self.command = command
+
+    def run(self, args: list[str]) -> str:
+        import subprocess
+
+        logger.debug("Running %s %s", self.command, args[:2])
+        return subprocess.run(
+            [self.command, *args], stdout=subprocess.PIPE, check=True, text=True
+        ).stdout
+
+    def show_dump(self, interface_name: str) -> str:
+        return self.run(["show", interface_name, "dump"])
+
+
+def apply_wg_quick_config(
+    wg_quick_config: WgQuickConfig,
+    interface_name: str,
+    wg_command: WgCommand,
+    method: Literal["auto", "set", "syncconf"] = "auto",
+    dry_run: bool = False,
+) -> PeerDelta:
+    """Push the difference between the running interface and the config to the kernel.
+
+    Only the added, removed and changed peers are sent in a single ``wg set`` call,
+    so the sessions of the untouched peers are kept. With ``method="syncconf"``,
+    the whole stripped config is sent to ``wg syncconf``, which also only touches
+    the changed peers. ``auto`` uses ``wg syncconf`` if the delta is large.
+    """
+    current_interface, current_peers = parse_wg_dump(
+        wg_command.show_dump(interface_name)
+    )
+    delta = compute_peer_delta(
+        current_interface,
+        current_peers,
+        to_interface_state(wg_quick_config.interface),
+        (to_peer_state(peer) for peer in wg_quick_config.peer),
+    )
+    logger.info(
+        "%d peers to add, %d peers to remove, %d peers to change, "
+        "%d interface fields to change.",
+        len(delta.added),
+        len(delta.removed),
+        len(delta.changed),
+        len(delta.interface),
+    )
+    if dry_run or not delta:
+        return delta
+    if method == "auto":
+        n_peers = len(delta.added) + len(delta.removed) + len(delta.changed)
+        method = "set" if n_peers <= MAX_WG_SET_PEERS else "syncconf"
+    with tempfile.TemporaryDirectory(prefix="wg-wizard-") as tmp_dir:
+        if method == "set":
+            wg_command.run(build_wg_set_args(interface_name, delta, Path(tmp_dir)))
+        else:
+            conf_path = Path(tmp_dir, f"{interface_name}.conf")
+            fd = os.open(conf_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "w") as f:
+                f.write(format_wg_conf(wg_quick_config))
+            wg_command.run(["syncconf", interface_name, str(conf_path)])
+    return delta
@@ -0,0 +1,239 @@
+from collections import Counter
+import csv
+from ipaddress import ip_interface
+from itertools import chain
+import json
+import logging
+from pathlib import PurePath
+from typing import Any, get_origin, Iterable, Iterator, Optional, TextIO
+
+from pydantic import TypeAdapter
+
+from .address_pool import AddressAllocator, IPAddress, IPInterface
+from .conflicts import find_peer_conflicts
+from .core import PeerName, WgWizard, WgWizardConfig, WgWizardPeerConfig
+
+logger = logging.getLogger(__name__)
+PEER_FORMATS = {
+    ".csv": "csv",
+    ".json": "json",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+}
+LIST_FIELDS = {
+    name
+    for name, field in WgWizardPeerConfig.model_fields.items()
+    if get_origin(field.annotation) is list
+}
+peer_name_adapter = TypeAdapter(PeerName)
+
+
+def guess_peer_format(filename: str) -> str:
+    suffix = PurePath(filename).suffix.lower()
+    if suffix not in PEER_FORMATS:
+        raise ValueError(
+            f"Cannot guess the format of '{filename}'. Please specify the format."
+        )
+    return PEER_FORMATS[suffix]
+
+
+def _iter_document_peers(document: Any) -> Iterator[dict[str, Any]]:
+    if document is None:
+        return
+    if isinstance(document, list):
+        yield from document
+    elif isinstance(document, dict) and "name" not in document:
+        # a mapping from peer names to peer configs like the `peers` in the config
+        for name, peer in document.items():
+            if isinstance(peer, dict):
+                yield {"name": name, **peer}
+            else:
+                yield ValueError(f"Peer {name} must be a mapping, got {peer!r}.")
+    else:
+        yield document
+
+
+def _iter_yaml_peers(file: TextIO) -> Iterator[dict[str, Any]]:
+    from ruamel.yaml import YAML
+
+    for document in YAML(typ="safe").load_all(file):
+        yield from _iter_document_peers(document)
+
+
+def iter_peer_rows(file: TextIO, format: str) -> Iterator[dict[str, Any]]:
+    """Read the peer definitions one by one from a CSV, YAML, JSON or JSON-lines file.
+
+    Empty CSV cells are ignored, and list fields in CSV can be separated by commas.
+    A JSON file contains a list of peers or a mapping like a YAML document.
+    """
+    if format == "csv":
+        for row in csv.DictReader(file):
+            yield {key: value for key, value in row.items() if value not in ("", None)}
+    elif format == "jsonl":
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                # let the caller report the broken line and continue
+                yield ValueError(f"Invalid JSON: {exc}")
+    elif format == "json":
+        try:
+            document = json.load(file)
+        except ValueError as exc:
+            yield ValueError(f"Invalid JSON: {exc}")
+            return
+        yield from _iter_document_peers(document)
+    elif format == "yaml":
+        yield from _iter_yaml_peers(file)
+    else:
+        raise ValueError(f"Unknown peer format '{format}'.")
+
+
+def normalize_peer_row(row: dict[str, Any], defaults: dict[str, Any]) -> dict[str, Any]:
+    if isinstance(row, ValueError):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError(f"A peer definition must be a mapping, got {row!r}.")
+    row = {**defaults, **row}
+    for key in LIST_FIELDS & row.keys():
+        if isinstance(row[key], str):
+            row[key] = [value.strip() for value in row[key].split(",")]
+    if "addresses" in row and "server_allowed_ips" not in row:
+        row["server_allowed_ips"] = row["addresses"]
+    return row
+
+
+def _find_conflicting_peers(
+    config: WgWizardConfig, peer_configs: dict[str, WgWizardPeerConfig]
+) -> dict[str, str]:
+    """Find the new peers conflicting with the existing peers or the previous rows.
+
+    A new peer only conflicting with rejected peers is not rejected.
+    """
+    conflicts = find_peer_conflicts(
+        config.addresses, chain(config.peers.items(), peer_configs.items())
+    )
+    if not conflicts:
+        return {}
+    positions = {name: i for i, name in enumerate(chain(config.peers, peer_configs))}
+    rejected: dict[str, str] = {}
+    for conflict in sorted(conflicts, key=lambda c: positions[c.peer_names[-1]]):
+        *others, name = conflict.peer_names
+        if name in peer_configs and name not in rejected:
+            if not any(other in rejected for other in others):
+                rejected[name] = conflict.message
+    return rejected
+
+
+class _RowAddresses:
+    """The addresses taken by the rows, released again if the rows fail.
+
+    An explicit address of several rows stays taken until all of them fail, and the
+    addresses taken before, e.g., by the existing peers, are never released.
+    """
+
+    def __init__(self, allocator: AddressAllocator):
+        self.allocator = allocator
+        self._addresses: dict[int, list[IPAddress]] = {}
+        self._counts: Counter[IPAddress] = Counter()
+
+    def _take(self, row_number: int, addresses: list[IPAddress]):
+        self._addresses.setdefault(row_number, []).extend(addresses)
+        self._counts.update(addresses)
+
+    def reserve(self, row_number: int, addresses: Iterable[IPAddress]):
+        addresses = [
+            address
+            for address in addresses
+            if address in self._counts or self.allocator.is_free(address)
+        ]
+        self.allocator.reserve(addresses)
+        self._take(row_number, addresses)
+
+    def add_allocated(self, row_number: int, interfaces: Iterable[IPInterface]):
+        self._take(row_number, [interface.ip for interface in interfaces])
+
+    def release(self, row_number: int):
+        released = []
+        for address in self._addresses.pop(row_number, ()):
+            self._counts[address] -= 1
+            if not self._counts[address]:
+                del self._counts[address]
+                released.append(address)
+        self.allocator.release(released)
+
+
+def add_peers(
+    wg_wizard: WgWizard,
+    rows: Iterable[dict[str, Any]],
+    defaults: Optional[dict[str, Any]] = None,
+    jobs: Optional[int] = None,
+) -> tuple[list[str], dict[int, str]]:
+    """Add many peers to a wg-wizard config and generate their secrets in one batch.
+
+    The peers without ``addresses`` get addresses from the pools in the config.
+    An invalid row doesn't stop the other rows from being added.
+
+    Returns
+    -------
+    tuple[list[str], dict[int, str]]
+        The names of the added peers and the error messages of the failed rows
+        keyed by the 1-based row numbers.
+    """
+    config = wg_wizard.config
+    defaults = defaults or {}
+    errors: dict[int, str] = {}
+    pending: list[tuple[int, dict[str, Any]]] = []
+    allocator = config.get_address_allocator()
+    row_addresses = _RowAddresses(allocator)
+    for row_number, row in enumerate(rows, 1):
+        try:
+            row = normalize_peer_row(row, defaults)
+        except ValueError as exc:
+            errors[row_number] = str(exc)
+            continue
+        pending.append((row_number, row))
+        # reserve the explicit addresses before allocating any address
+        try:
+            addresses = {ip_interface(ip).ip for ip in row.get("addresses", ())}
+        except ValueError:
+            continue  # reported by the validation below
+        row_addresses.reserve(row_number, addresses)
+
+    peer_configs: dict[str, WgWizardPeerConfig] = {}
+    row_numbers: dict[str, int] = {}
+    for row_number, row in pending:
+        name = row.pop("name", None)
+        try:
+            if not name:
+                raise ValueError("Peer name is missing.")
+            name = peer_name_adapter.validate_python(name)
+            if name in config.peers or name in peer_configs:
+                raise ValueError(f"Peer name '{name}' is not unique.")
+            if "addresses" not in row:
+                allocated = allocator.allocate()
+                row["addresses"] = allocated
+                row.setdefault("server_allowed_ips", allocated)
+                row_addresses.add_allocated(row_number, allocated)
+            peer_configs[name] = WgWizardPeerConfig(**row)
+            row_numbers[name] = row_number
+        except ValueError as exc:
+            row_addresses.release(row_number)
+            errors[row_number] = str(exc)
+    for name, error in _find_conflicting_peers(config, peer_configs).items():
+        del peer_configs[name]
+        row_addresses.release(row_numbers[name])
+        errors[row_numbers[name]] = error
+
+    errors = dict(sorted(errors.items()))
+    for row_number, error in errors.items():
+        logger.error("Failed to add the peer in row %d: %s", row_number, error)
+    wg_wizard.secret.generate_peer_secrets(peer_configs, jobs)
+    for name, peer_config in peer_configs.items():
+        config.add_peer(name, peer_config)
+    logger.info("Added %d peers. %d rows failed.", len(peer_configs), len(errors))
+    return list(peer_configs), errors
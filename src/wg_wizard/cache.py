@@ -0,0 +1,262 @@
+from hashlib import sha256
+import json
+import logging
+import os
+from pathlib import Path
+import pickle
+from typing import Any, Callable, Optional
+
+from .utils import atomic_open, atomic_write, check_file_mode
+
+logger = logging.getLogger(__name__)
+SNAPSHOT_FORMAT_VERSION = 1
+RENDER_CACHE_FORMAT_VERSION = 1
+
+
+def is_private_file(path: Path) -> bool:
+    try:
+        check_file_mode(path)
+    except PermissionError:
+        logger.warning("Ignoring the cache %s because its mode is too open.", path)
+        return False
+    if path.stat().st_uid != os.getuid():
+        logger.warning("Ignoring the cache %s owned by another user.", path)
+        return False
+    return True
+
+
+def load_cache_file(path: Path) -> Optional[bytes]:
+    """Read a cache file, or return None if it is missing or not private."""
+    try:
+        if not is_private_file(path):
+            return None
+        return path.read_bytes()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def write_cache_file(path: Path, data: str | bytes) -> bool:
+    """Write a private cache file, or log a warning and return False if it fails.
+
+    The caches only save time, so e.g. a read-only config dir doesn't fail the
+    command.
+    """
+    try:
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        atomic_write(path, data)
+    except OSError as error:
+        logger.warning("Failed to write the cache %s: %s", path, error.strerror)
+        return False
+    return True
+
+
+def get_file_fingerprint(path: Path) -> tuple[str, int, int, str]:
+    data = path.read_bytes()
+    st = path.stat()
+    return str(path.resolve()), st.st_size, st.st_mtime_ns, sha256(data).hexdigest()
+
+
+def get_code_versions(module_files: list[str]) -> list:
+    """Fingerprint the code which the cached objects depend on.
+
+    A changed module invalidates the caches without the slow lookup of the
+    installed package version.
+    """
+    import pydantic
+
+    versions: list = [pydantic.VERSION]
+    for module_file in module_files:
+        st = (Path(__file__).parent / module_file).stat()
+        versions.extend([module_file, st.st_size, st.st_mtime_ns])
+    return versions
+
+
+class SnapshotCache:
+    """Store an object built from some source files, e.g., a validated model.
+
+    The snapshot is a pickle file which is only used if the size, mtime and
+    SHA-256 of every source file are unchanged and the code of the pickled classes
+    is the same.
+    A snapshot can be deleted at any time, and failing to write it only logs a
+    warning. It is ignored if it is not private to the current user, because
+    unpickling an untrusted file can run any code.
+    """
+
+    # the modules of the classes in the pickled WgWizard, e.g., its private caches
+    # and the PeerTable of the compact peers
+    module_files = [
+        "address_pool.py",
+        "cache.py",
+        "core.py",
+        "peer_table.py",
+        "utils.py",
+    ]
+
+    def __init__(self, path: Path, source_paths: list[Path]):
+        self.path = path
+        self.source_paths = source_paths
+        self._key: Optional[dict[str, Any]] = None
+
+    def get_key(self) -> dict[str, Any]:
+        return {
+            "format": SNAPSHOT_FORMAT_VERSION,
+            "versions": get_code_versions(self.module_files),
+            "sources": [get_file_fingerprint(path) for path in self.source_paths],
+        }
+
+    def load(self) -> Optional[Any]:
+        # fingerprint the sources before they are read, so if they are modified
+        # in between, the saved snapshot will be stale instead of wrong
+        self._key = self.get_key()
+        try:
+            if not is_private_file(self.path):
+                return None
+            with self.path.open("rb") as f:
+                # the key is pickled separately so we don't unpickle a stale object
+                if pickle.load(f) != self._key:
+                    logger.debug("The snapshot %s is stale.", self.path)
+                    return None
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("Ignoring the broken snapshot %s", self.path, exc_info=True)
+            return None
+
+    def save(self, obj: Any):
+        logger.debug("Writing snapshot to %s", self.path)
+        key = self._key or self.get_key()
+        try:
+            self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            # streamed like the pickle.load calls, without a copy of the snapshot
+            with atomic_open(self.path) as f:
+                pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as error:
+            logger.warning(
+                "Failed to write the snapshot %s: %s", self.path, error.strerror
+            )
+
+
+class VerifiedKeyCache:
+    """Remember the key pairs whose public key has been derived from the private key.
+
+    Only the SHA-256 digests of the key pairs are kept. When ``path`` is given,
+    the digests are loaded from and saved to that file. Saving only keeps the key
+    pairs looked up since loading, so the entries of replaced keys are dropped. If
+    the file can't be written, the cache is kept in memory only.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._loaded: set[str] = set()
+        self._seen: set[str] = set()
+        if path is not None:
+            self.load()
+
+    @staticmethod
+    def digest(private_key: str, public_key: str) -> str:
+        return sha256(f"{private_key}\n{public_key}".encode()).hexdigest()
+
+    def load(self):
+        raw = load_cache_file(self.path)
+        if raw is None:
+            return
+        try:
+            self._loaded = set(json.loads(raw)["verified"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring the broken cache %s", self.path)
+
+    def is_verified(self, private_key: str, public_key: str) -> bool:
+        digest = self.digest(private_key, public_key)
+        if digest in self._loaded or digest in self._seen:
+            self._seen.add(digest)
+            return True
+        return False
+
+    def add(self, private_key: str, public_key: str):
+        self._seen.add(self.digest(private_key, public_key))
+
+    def save(self):
+        if self.path is None or self._seen == self._loaded:
+            return
+        logger.debug("Writing verified key cache to %s", self.path)
+        if not write_cache_file(
+            self.path, json.dumps({"verified": sorted(self._seen)})
+        ):
+            # keep the digests in memory only, without retrying every save
+            self.path = None
+        self._loaded = set(self._seen)
+
+
+class PeerRenderCache:
+    """Keep the rendered [Peer] blocks of the server config by content.
+
+    A block is keyed by the SHA-256 of everything it is rendered from, so a changed
+    peer simply misses the cache and the stale entry is never used. When ``path``
+    is given, the blocks are loaded from and saved to that file. The blocks contain
+    the preshared keys, so the file is private like the secret. Saving only keeps
+    the blocks looked up since the last save, so the entries of changed and deleted
+    peers are dropped. If the file can't be written, the cache is kept in memory only.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._blocks: dict[str, str] = {}
+        self._used: dict[str, str] = {}
+        if path is not None:
+            self.load()
+
+    @staticmethod
+    def get_versions() -> list:
+        # the blocks are formatted by the code in these modules
+        return [
+            RENDER_CACHE_FORMAT_VERSION,
+            *get_code_versions(["core.py", "routes.py", "utils.py", "wg_quick.py"]),
+        ]
+
+    @staticmethod
+    def digest(*parts: str) -> str:
+        return sha256("\0".join(parts).encode()).hexdigest()
+
+    def load(self):
+        raw = load_cache_file(self.path)
+        if raw is None:
+            return
+        try:
+            cache = json.loads(raw)
+            if cache["versions"] != self.get_versions():
+                logger.debug("The render cache %s is stale.", self.path)
+                return
+            self._blocks = dict(cache["blocks"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring the broken cache %s", self.path)
+
+    def get_or_render(self, key: str, render: Callable[[], str]) -> str:
+        block = self._used.get(key)
+        if block is None:
+            block = self._blocks.get(key)
+        if block is None:
+            self.misses += 1
+            block = render()
+        else:
+            self.hits += 1
+        self._used[key] = block
+        return block
+
+    def save(self):
+        # start over for the next config, so the blocks of deleted peers and
+        # replaced keys aren't kept by a long-running process either
+        is_changed = self._used.keys() != self._blocks.keys()
+        self._blocks, self._used = self._used, {}
+        if self.path is None or not is_changed:
+            return
+        logger.debug("Writing render cache to %s", self.path)
+        if not write_cache_file(
+            self.path,
+            json.dumps({"versions": self.get_versions(), "blocks": self._blocks}),
+        ):
+            # keep the blocks in memory only, without retrying every save
+            self.path = None
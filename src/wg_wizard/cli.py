@@ -5,9 +5,20 @@ import click
 
 logger = logging.getLogger(__name__)
 option = partial(click.option, show_default=True)
+
+
+class InterfaceOption(click.Option):
+    def prompt_for_value(self, ctx):
+        # the commands running on all the interfaces don't need an interface
+        if ctx.params.get("all_interfaces"):
+            return self.get_default(ctx)
+        return super().prompt_for_value(ctx)
+
+
 interface_option = option(
     "--interface",
     "-i",
+    cls=InterfaceOption,
     prompt="Interface name for WireGuard",
     help="Interface name for WireGuard.",
     default="wg0",
@@ -25,14 +36,96 @@ invert_qrcode_option = option(
     default=True,
     help="Whether to invert the color of the QR Code.",
 )
+compact_qrcode_option = option(
+    "--compact-qrcode/--no-compact-qrcode",
+    is_flag=True,
+    default=False,
+    help="""
+        Whether to leave the comments and the default values out of the QR Code,
+        which makes it smaller and faster to generate.
+    """,
+)
+qrcode_file_option = option(
+    "--qrcode-file",
+    type=click.Path(dir_okay=False),
+    help="Write the QR Code to a PNG or SVG file instead of the stdout.",
+)
+cache_option = option(
+    "--cache/--no-cache",
+    is_flag=True,
+    default=True,
+    help="Whether to use the cache files in the `.wg-wizard-cache` directory of the config dir.",
+)
+jobs_option = option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    help="The number of parallel workers. Defaults to a number based on the CPU count.",
+)
+all_interfaces_option = option(
+    "--all-interfaces",
+    is_flag=True,
+    # processed before --interface, which isn't prompted then
+    is_eager=True,
+    help="""
+        Run on all the interfaces in the config dir in parallel, and check that they
+        don't share a listen port or overlapping address pools.
+    """,
+)
+
+
+def run_on_all_interfaces(ctx, config_dir, jobs, cache, func=None, **kwargs):
+    """Check all the interfaces together, and then run ``func`` on each of them.
+
+    Nothing is run if any interface is invalid or they conflict with each other.
+    Exit with 1 if anything fails.
+    """
+    from .interfaces import check_interface, find_interface_conflicts, run_on_interfaces
+    from .paths import discover_interfaces
+
+    interfaces = discover_interfaces(config_dir)
+    if not interfaces:
+        raise click.ClickException(f"No interface is found in {config_dir}.")
+
+    def run(func, **kwargs):
+        results = run_on_interfaces(func, config_dir, interfaces, jobs=jobs, **kwargs)
+        for result in results:
+            if result.error is not None:
+                logger.error("%s: %s", result.interface, result.error)
+        return [result.summary for result in results if result.error is None]
+
+    summaries = run(check_interface, cache=cache)
+    conflicts = find_interface_conflicts(summaries)
+    for conflict in conflicts:
+        logger.error(conflict)
+    if conflicts or len(summaries) < len(interfaces):
+        ctx.exit(1)
+    if func is not None and len(run(func, cache=cache, **kwargs)) < len(interfaces):
+        ctx.exit(1)
+    for summary in summaries:
+        logger.info("%s: %d peers.", summary.name, summary.n_peers)
 
 
 @click.group(context_settings={"max_content_width": 120})
 @click.version_option()
-def main():
+@option(
+    "--key-backend",
+    type=click.Choice(["auto", "cryptography", "python", "wg"]),
+    default="auto",
+    envvar="WG_WIZARD_KEY_BACKEND",
+    help="""
+        The backend for generating keys and deriving public keys.
+        `auto` uses `cryptography` if it is installed and falls back to `python`.
+        `wg` calls the `wg` binary, which spawns one process per key.
+    """,
+)
+def main(key_backend):
+    from .wg import set_key_backend
+
     logging.basicConfig(
         level=logging.INFO, format="[%(asctime)s][%(levelname)s] %(name)s: %(message)s"
     )
+    set_key_backend(key_backend)
 
 
 @main.command()
@@ -180,6 +273,10 @@ def init(
     "--client-allowed-ips",
     help="Peer.AllowedIPs of the client.",
 )
+@option(
+    "--client-excluded-ips",
+    help="The networks removed from Peer.AllowedIPs of the client, e.g., its LAN.",
+)
 @option(
     "--client-persistent-keepalive",
     prompt="Peer.PersistentKeepalive of the client",
@@ -193,24 +290,34 @@ def add_peer(
     name,
     addresses,
     client_allowed_ips,
+    client_excluded_ips,
     client_persistent_keepalive,
     invert_qrcode,
 ):
     """Add a new client to a wg-wizard config."""
-    from .core import WgWizard, WgWizardPeerConfig, export_wg_quick_config
+    from ipaddress import ip_interface
 
-    wg_wizard = WgWizard.from_dir(config_dir, interface)
-    config = wg_wizard.config
+    from .core import (
+        export_wg_quick_config,
+        WgWizard,
+        WgWizardPeerConfig,
+        WgWizardSession,
+    )
 
-    # check name
+    # ask the user before locking the interface, so the other jobs don't wait for
+    # the user to answer
+    config = WgWizard.from_dir(config_dir, interface, read_only=True).config
     if name in config.peers:
         raise ValueError("Peer name must be unique.")
 
     # get default addresses and client_allowed_ips and then ask the user
+    default_addresses = None
     if addresses is None:
+        default_addresses = ", ".join(
+            str(address) for address in config.find_next_available_addresses()[0]
+        )
         addresses = click.prompt(
-            "Interface.Address of the client",
-            default=str(config.find_next_available_interface()),
+            "Interface.Address of the client", default=default_addresses
         )
     addresses = [ip.strip() for ip in addresses.split(",")]
     if client_allowed_ips is None:
@@ -219,18 +326,38 @@ def add_peer(
         )
     client_allowed_ips = [ip.strip() for ip in client_allowed_ips.split(",")]
 
-    # add a peer to the config
-    peer_config = WgWizardPeerConfig(
-        addresses=addresses,
-        server_allowed_ips=addresses,
-        client_allowed_ips=client_allowed_ips,
-        client_persistent_keepalive=client_persistent_keepalive,
-    )
-    config.add_peer(name, peer_config)
+    with WgWizardSession(config_dir, interface) as session:
+        wg_wizard = session.wg_wizard
+        config = wg_wizard.config
+
+        # check again, since another job could have changed the config meanwhile
+        if name in config.peers:
+            raise ValueError("Peer name must be unique.")
+        if ", ".join(addresses) == default_addresses:
+            allocator = config.get_address_allocator()
+            if not all(allocator.is_free(ip_interface(ip).ip) for ip in addresses):
+                addresses = config.find_next_available_addresses()[0]
+                logger.warning(
+                    "The suggested addresses were taken meanwhile. Using %s instead.",
+                    ", ".join(map(str, addresses)),
+                )
+
+        # add a peer to the config
+        peer_config = WgWizardPeerConfig(
+            addresses=addresses,
+            server_allowed_ips=addresses,
+            client_allowed_ips=client_allowed_ips,
+            client_persistent_keepalive=client_persistent_keepalive,
+        )
+        if client_excluded_ips is not None:
+            peer_config.client_excluded_ips = [
+                ip.strip() for ip in client_excluded_ips.split(",")
+            ]
+        config.add_peer(name, peer_config)
 
-    # generate secret
-    wg_wizard.secret.generate_peer_secret(name)
-    wg_wizard.dump(config_dir, interface)
+        # generate secret
+        wg_wizard.secret.generate_peer_secret(name)
+        session.changed_peers = {name}
 
     logger.info("Client's wg-quick config QR Code:")
     export_wg_quick_config(
@@ -238,6 +365,112 @@ def add_peer(
     )
 
 
+@main.command()
+@interface_option
+@config_dir_option
+@option(
+    "--input",
+    "-f",
+    "input_file",
+    type=click.File("r"),
+    default="-",
+    help="The file containing the peer definitions. `-` means the stdin.",
+)
+@option(
+    "--format",
+    "input_format",
+    type=click.Choice(["auto", "csv", "yaml", "json", "jsonl"]),
+    default="auto",
+    help="The format of the input. `auto` guesses the format from the file extension.",
+)
+@option(
+    "--client-allowed-ips",
+    default="0.0.0.0/0, ::/0",
+    help="The default Peer.AllowedIPs of the clients.",
+)
+@option(
+    "--client-excluded-ips",
+    help="The default networks removed from Peer.AllowedIPs of the clients.",
+)
+@option(
+    "--client-persistent-keepalive",
+    default=25,
+    help="The default Peer.PersistentKeepalive of the clients.",
+)
+@jobs_option
+@click.pass_context
+def add_peers(
+    ctx,
+    interface,
+    config_dir,
+    input_file,
+    input_format,
+    client_allowed_ips,
+    client_excluded_ips,
+    client_persistent_keepalive,
+    jobs,
+):
+    """Add many clients to a wg-wizard config at once.
+
+    Each peer definition contains a `name` and optionally any field of the peer config,
+    e.g., `addresses` and `client_allowed_ips`.
+    The addresses are allocated automatically if they are not provided.
+    The input can be a CSV file with a header, a JSON-lines file, or a JSON or YAML
+    file containing a list of peers or a mapping from the peer names to the peers.
+    The rows with errors are skipped and reported, and the other rows are still added.
+    """
+    from .bulk import add_peers, guess_peer_format, iter_peer_rows
+    from .core import WgWizardSession
+
+    if input_format == "auto":
+        input_format = guess_peer_format(input_file.name)
+    defaults = {
+        "client_allowed_ips": client_allowed_ips,
+        "client_persistent_keepalive": client_persistent_keepalive,
+    }
+    if client_excluded_ips is not None:
+        defaults["client_excluded_ips"] = client_excluded_ips
+    with WgWizardSession(config_dir, interface) as session:
+        added_peers, errors = add_peers(
+            session.wg_wizard,
+            iter_peer_rows(input_file, input_format),
+            defaults=defaults,
+            jobs=jobs,
+        )
+        session.changed_peers = set(added_peers)
+    if errors:
+        ctx.exit(1)
+
+
+@main.command()
+@option(
+    "--include",
+    default="0.0.0.0/0, ::/0",
+    help="The networks to route through WireGuard, separated by commas.",
+)
+@option(
+    "--exclude",
+    required=True,
+    help="The networks not to route through WireGuard, separated by commas.",
+)
+def allowed_ips(include, exclude):
+    """Calculate the fewest Peer.AllowedIPs covering --include but not --exclude.
+
+    Use it to route everything except, e.g., the LAN through WireGuard.
+    The same is done for the peers with `client_excluded_ips` in their config.
+    """
+    from .routes import resolve_allowed_ips
+
+    try:
+        networks = resolve_allowed_ips(
+            [ip.strip() for ip in include.split(",")],
+            [ip.strip() for ip in exclude.split(",")],
+        )
+    except ValueError as exc:
+        raise click.UsageError(str(exc))
+    click.echo(", ".join(map(str, networks)))
+
+
 @main.command()
 @interface_option
 @config_dir_option
@@ -255,34 +488,46 @@ def add_peer(
     is_flag=True,
     help="Whether to overwrite the keys without confirmation.",
 )
-def generate_keys(interface, config_dir, all, server, missing, peer, overwrite):
+@jobs_option
+def generate_keys(interface, config_dir, all, server, missing, peer, overwrite, jobs):
     """Generate or regenerate public, private and preshared keys."""
-    from .core import WgWizard
+    from .core import WgWizardSession
 
-    wg_wizard = WgWizard.from_dir(config_dir, interface)
-    missing_peers = wg_wizard.generate_keys(
-        regenerate_all=all,
-        server=server,
-        missing=missing,
-        peers=peer,
-        overwrite=overwrite,
-    )
-    if missing_peers:
-        logger.info("Generated secret for missing peers %s.", missing_peers)
-    if all or server or missing_peers or peer:
-        wg_wizard.dump(config_dir, interface, config=False)
-    else:
-        logger.info("Nothing changed.")
+    with WgWizardSession(config_dir, interface, config=False) as session:
+        missing_peers = session.wg_wizard.generate_keys(
+            regenerate_all=all,
+            server=server,
+            missing=missing,
+            peers=peer,
+            overwrite=overwrite,
+            jobs=jobs,
+        )
+        if missing_peers:
+            logger.info("Generated secret for missing peers %s.", missing_peers)
+        if not (all or server or missing_peers or peer):
+            logger.info("Nothing changed.")
+            # don't rewrite the secret
+            session.secret = False
+        if not all:
+            session.changed_peers = {*peer, *missing_peers}
 
 
 @main.command()
 @interface_option
 @config_dir_option
-def check(interface, config_dir):
+@all_interfaces_option
+@jobs_option
+@cache_option
+@click.pass_context
+def check(ctx, interface, config_dir, all_interfaces, jobs, cache):
     """Check whether the wg-wizard config is ready for export."""
+    if all_interfaces:
+        run_on_all_interfaces(ctx, config_dir, jobs, cache)
+        return
+
     from .core import WgWizard
 
-    WgWizard.from_dir(config_dir, interface).check_secret()
+    WgWizard.from_dir(config_dir, interface, cache=cache, read_only=True).check()
 
 
 @main.command()
@@ -300,12 +545,64 @@ def check(interface, config_dir):
     help="Whether to output the QR Code to the stdout.",
 )
 @invert_qrcode_option
-def export_server_config(interface, config_dir, text, qrcode, invert_qrcode):
+@compact_qrcode_option
+@qrcode_file_option
+@all_interfaces_option
+@option(
+    "--output-dir",
+    "-o",
+    type=click.Path(file_okay=False),
+    help="The directory to write `{interface}.conf` to. Required by --all-interfaces.",
+)
+@jobs_option
+@cache_option
+@click.pass_context
+def export_server_config(
+    ctx,
+    interface,
+    config_dir,
+    text,
+    qrcode,
+    invert_qrcode,
+    compact_qrcode,
+    qrcode_file,
+    all_interfaces,
+    output_dir,
+    jobs,
+    cache,
+):
     """Export a wg-quick server config."""
+    if all_interfaces != (output_dir is not None):
+        raise click.UsageError(
+            "--all-interfaces requires --output-dir, and vice versa."
+        )
+    if all_interfaces:
+        from pathlib import Path
+
+        from .interfaces import export_server_config_to_dir
+
+        Path(output_dir).mkdir(mode=0o700, parents=True, exist_ok=True)
+        run_on_all_interfaces(
+            ctx,
+            config_dir,
+            jobs,
+            cache,
+            export_server_config_to_dir,
+            output_dir=output_dir,
+        )
+        return
+
     from .core import export_wg_quick_config_from_files
 
     export_wg_quick_config_from_files(
-        config_dir, interface, text, qrcode, invert_qrcode
+        config_dir,
+        interface,
+        text,
+        qrcode or qrcode_file is not None,
+        invert_qrcode,
+        cache=cache,
+        compact_qrcode=compact_qrcode,
+        qrcode_path=qrcode_file,
     )
 
 
@@ -331,10 +628,491 @@ def export_server_config(interface, config_dir, text, qrcode, invert_qrcode):
     help="Whether to output the QR Code to the stdout.",
 )
 @invert_qrcode_option
-def export_client_config(interface, config_dir, name, text, qrcode, invert_qrcode):
+@compact_qrcode_option
+@qrcode_file_option
+@cache_option
+def export_client_config(
+    interface,
+    config_dir,
+    name,
+    text,
+    qrcode,
+    invert_qrcode,
+    compact_qrcode,
+    qrcode_file,
+    cache,
+):
     """Export a wg-quick client config."""
     from .core import export_wg_quick_config_from_files
 
     export_wg_quick_config_from_files(
-        config_dir, interface, text, qrcode, invert_qrcode, peer_name=name
+        config_dir,
+        interface,
+        text,
+        qrcode,
+        invert_qrcode,
+        peer_name=name,
+        cache=cache,
+        compact_qrcode=compact_qrcode,
+        qrcode_path=qrcode_file,
+    )
+
+
+@main.command()
+@interface_option
+@config_dir_option
+@option("--all", "-a", "all_peers", is_flag=True, help="Export all the clients.")
+@option(
+    "--name",
+    "-n",
+    "name_patterns",
+    multiple=True,
+    help="""
+        Export the clients whose names match the glob pattern.
+        Can be specified multiple times.
+    """,
+)
+@option(
+    "--output-dir",
+    "-o",
+    type=click.Path(file_okay=False),
+    help="The directory to write `{name}.conf` and the QR Codes to.",
+)
+@option(
+    "--tar",
+    "tar_path",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    help="The tar archive to write the files to. `-` means the stdout.",
+)
+@option(
+    "--qrcode-format",
+    "qrcode_formats",
+    type=click.Choice(["png", "svg"]),
+    multiple=True,
+    help="""
+        Also write the QR Code of each client as `{name}.{format}`.
+        Can be specified multiple times.
+    """,
+)
+@compact_qrcode_option
+@all_interfaces_option
+@jobs_option
+@cache_option
+@click.pass_context
+def export_client_configs(
+    ctx,
+    interface,
+    config_dir,
+    all_peers,
+    name_patterns,
+    output_dir,
+    tar_path,
+    qrcode_formats,
+    compact_qrcode,
+    all_interfaces,
+    jobs,
+    cache,
+):
+    """Export the wg-quick configs of many clients at once.
+
+    The config and secret are loaded and checked only once, and the clients are
+    rendered in parallel. The files are written with permission 0600.
+    With --all-interfaces, the interfaces are exported in parallel instead, each to
+    the `{interface}` subdirectory of the output dir.
+    """
+    if all_peers == bool(name_patterns):
+        raise click.UsageError("Exactly one of --all and --name must be provided.")
+    if (output_dir is None) == (tar_path is None):
+        raise click.UsageError(
+            "Exactly one of --output-dir and --tar must be provided."
+        )
+    if all_interfaces:
+        if output_dir is None:
+            raise click.UsageError("--all-interfaces requires --output-dir.")
+        from .interfaces import export_client_configs_to_dir
+
+        run_on_all_interfaces(
+            ctx,
+            config_dir,
+            jobs,
+            cache,
+            export_client_configs_to_dir,
+            output_dir=output_dir,
+            name_patterns=name_patterns,
+            qrcode_formats=qrcode_formats,
+            compact_qrcode=compact_qrcode,
+        )
+        return
+
+    import sys
+    from pathlib import Path
+
+    from .core import WgWizard
+    from .export import (
+        iter_client_files,
+        select_peers,
+        write_client_files_to_dir,
+        write_client_files_to_tar,
+    )
+    from .utils import atomic_open
+
+    wg_wizard = WgWizard.from_dir(config_dir, interface, cache=cache, read_only=True)
+    peer_names = select_peers(wg_wizard, name_patterns)
+    qrcode_cache = None
+    if cache and qrcode_formats:
+        from .paths import get_qrcode_cache_dir
+        from .qr import QrCodeCache
+
+        qrcode_cache = QrCodeCache(get_qrcode_cache_dir(config_dir, interface))
+    files = iter_client_files(
+        wg_wizard,
+        peer_names,
+        qrcode_formats,
+        jobs=jobs,
+        compact_qrcode=compact_qrcode,
+        qrcode_cache=qrcode_cache,
+    )
+    if output_dir is not None:
+        write_client_files_to_dir(files, output_dir)
+    elif tar_path == "-":
+        write_client_files_to_tar(files, sys.stdout.buffer)
+    else:
+        with atomic_open(Path(tar_path).resolve()) as f:
+            write_client_files_to_tar(files, f)
+    logger.info("Exported %d client configs.", len(peer_names))
+
+
+@main.command()
+@interface_option
+@config_dir_option
+@option(
+    "--name",
+    "-n",
+    "name_patterns",
+    multiple=True,
+    help="""
+        Export the mesh nodes whose names match the glob pattern.
+        Can be specified multiple times. Defaults to all the mesh nodes.
+    """,
+)
+@option(
+    "--output-dir",
+    "-o",
+    type=click.Path(file_okay=False),
+    help="The directory to write `{name}.conf` to.",
+)
+@option(
+    "--tar",
+    "tar_path",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    help="The tar archive to write the files to. `-` means the stdout.",
+)
+@cache_option
+def export_mesh_configs(
+    interface, config_dir, name_patterns, output_dir, tar_path, cache
+):
+    """Export the wg-quick configs of the peers in the meshes.
+
+    Each config is the client config of the peer with the other peers it connects
+    to directly. The configs are generated and written one by one.
+    """
+    if (output_dir is None) == (tar_path is None):
+        raise click.UsageError(
+            "Exactly one of --output-dir and --tar must be provided."
+        )
+
+    import sys
+    from pathlib import Path
+
+    from .core import WgWizard
+    from .export import (
+        select_peers,
+        write_client_files_to_dir,
+        write_client_files_to_tar,
+    )
+    from .mesh import iter_mesh_files, MeshTopology
+    from .utils import atomic_open
+
+    wg_wizard = WgWizard.from_dir(config_dir, interface, cache=cache, read_only=True)
+    selected_peers = set(select_peers(wg_wizard, name_patterns))
+    peer_names = [
+        peer_name
+        for peer_name in MeshTopology(wg_wizard).get_nodes()
+        if peer_name in selected_peers
+    ]
+    files = iter_mesh_files(wg_wizard, peer_names)
+    if output_dir is not None:
+        write_client_files_to_dir(files, output_dir)
+    elif tar_path == "-":
+        write_client_files_to_tar(files, sys.stdout.buffer)
+    else:
+        with atomic_open(Path(tar_path).resolve()) as f:
+            write_client_files_to_tar(files, f)
+    logger.info("Exported %d mesh configs.", len(peer_names))
+
+
+@main.command()
+@interface_option
+@config_dir_option
+@option(
+    "--wg-command",
+    default="wg",
+    envvar="WG_WIZARD_WG_COMMAND",
+    help="The `wg` binary. It can be replaced by any compatible command.",
+)
+@option(
+    "--method",
+    type=click.Choice(["auto", "set", "syncconf"]),
+    default="auto",
+    help="""
+        How to push the changes. `set` sends only the changed peers in one `wg set` call.
+        `syncconf` sends the whole stripped config to `wg syncconf`.
+        `auto` uses `syncconf` if more than 1000 peers are changed.
+    """,
+)
+@option(
+    "--dry-run",
+    is_flag=True,
+    help="Only show the changes without applying them.",
+)
+@cache_option
+def apply(interface, config_dir, wg_command, method, dry_run, cache):
+    """Apply the server config to the running interface without restarting it.
+
+    The running peers are read from `wg show <interface> dump`. Only the added, removed
+    and changed peers are pushed, so the sessions of the other peers are kept.
+    The wg-quick fields like Address and PostUp are not applied.
+    """
+    from .apply import apply_wg_quick_config, WgCommand
+    from .core import to_wg_quick_server_config, WgWizard
+
+    wg_wizard = WgWizard.from_dir(config_dir, interface, cache=cache, read_only=True)
+    delta = apply_wg_quick_config(
+        to_wg_quick_server_config(wg_wizard),
+        wg_wizard.config.name,
+        WgCommand(wg_command),
+        method=method,
+        dry_run=dry_run,
+    )
+    if dry_run:
+        for field, (current, desired) in delta.interface.items():
+            if field != "private_key":
+                click.echo(f"~ interface {field}: {current} -> {desired}")
+            else:
+                click.echo("~ interface private_key")
+        for peer in delta.added:
+            click.echo(f"+ peer {peer.public_key}")
+        for peer in delta.removed:
+            click.echo(f"- peer {peer.public_key}")
+        for _, peer in delta.changed:
+            click.echo(f"~ peer {peer.public_key}")
+
+
+@main.command()
+@interface_option
+@config_dir_option
+@option(
+    "--old",
+    "-o",
+    "old_file",
+    type=click.File("r"),
+    required=True,
+    help="The existing wg-quick config, e.g., /etc/wireguard/wg0.conf. `-` means the stdin.",
+)
+@option(
+    "--format",
+    "output_format",
+    type=click.Choice(["text", "json"]),
+    default="text",
+    help="The output format.",
+)
+@cache_option
+@click.pass_context
+def diff_server_config(ctx, interface, config_dir, old_file, output_format, cache):
+    """Compare an existing wg-quick server config with the one to be exported.
+
+    The peers are matched by their PublicKey, so the added, removed and changed peers
+    are shown instead of a line diff. The keys are hidden in the output.
+    Like `diff`, the exit code is 1 if the configs are different.
+    """
+    import json
+
+    from .core import (
+        iter_wg_quick_server_peer_configs,
+        to_wg_quick_server_interface_config,
+        WgWizard,
+    )
+    from .diff import config_diff_to_json, diff_wg_quick_configs, format_config_diff
+    from .wg_quick import iter_wg_quick_config
+
+    wg_wizard = WgWizard.from_dir(config_dir, interface, cache=cache, read_only=True)
+    wg_wizard.check_secret()
+    old_interface, old_peers = iter_wg_quick_config(old_file)
+    config_diff = diff_wg_quick_configs(
+        old_interface,
+        old_peers,
+        to_wg_quick_server_interface_config(wg_wizard),
+        iter_wg_quick_server_peer_configs(wg_wizard),
+    )
+    if output_format == "json":
+        click.echo(json.dumps(config_diff_to_json(config_diff), indent=2))
+    else:
+        for line in format_config_diff(config_diff):
+            click.echo(line)
+    if config_diff:
+        ctx.exit(1)
+
+
+@main.command("import")
+@interface_option
+@config_dir_option
+@option(
+    "--server",
+    "-s",
+    "server_file",
+    type=click.File("r"),
+    required=True,
+    help="The existing wg-quick server config, e.g., /etc/wireguard/wg0.conf.",
+)
+@option(
+    "--client",
+    "client_paths",
+    type=click.Path(exists=True, dir_okay=False),
+    multiple=True,
+    help="""
+        An existing wg-quick client config. Can be specified multiple times.
+        The clients are matched with the server peers by their keys.
+    """,
+)
+@option(
+    "--default-endpoint",
+    "-e",
+    help="""
+        The default endpoint in clients' Peer.Endpoint configs (e.g., example.com:51820).
+        Defaults to the most common endpoint in the client configs.
+    """,
+)
+@option(
+    "--client-allowed-ips",
+    default="0.0.0.0/0, ::/0",
+    help="The Peer.AllowedIPs of the clients without client configs.",
+)
+@option(
+    "--overwrite/--no-overwrite",
+    help="Whether to overwrite the config and secret files without confirmation.",
+    is_flag=True,
+)
+def import_configs(
+    interface,
+    config_dir,
+    server_file,
+    client_paths,
+    default_endpoint,
+    client_allowed_ips,
+    overwrite,
+):
+    """Create a wg-wizard config from existing wg-quick configs.
+
+    The peer names come from the comment lines in the [Peer] sections of the server config
+    or the file names of the client configs. The private keys of the peers without
+    client configs are unknown, so their keys must be regenerated using
+    `generate-keys --missing`.
+    """
+    from .importer import import_wg_quick_configs, read_client_configs
+
+    try:
+        wg_wizard = import_wg_quick_configs(
+            interface,
+            server_file,
+            read_client_configs(client_paths),
+            default_endpoint=default_endpoint,
+            client_allowed_ips=[ip.strip() for ip in client_allowed_ips.split(",")],
+        )
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    wg_wizard.dump(config_dir, interface, overwrite)
+
+
+@main.command()
+@interface_option
+@config_dir_option
+@option(
+    "--to",
+    "target",
+    type=click.Choice(["sqlite", "files"]),
+    required=True,
+    help="""
+        `sqlite` copies the YAML config and JSON secret to `{interface}.sqlite3`.
+        `files` exports the SQLite storage to the YAML config and JSON secret.
+    """,
+)
+@option(
+    "--overwrite/--no-overwrite",
+    help="Whether to overwrite the target files without confirmation.",
+    is_flag=True,
+)
+def convert_storage(interface, config_dir, target, overwrite):
+    """Convert between the YAML and JSON files and the SQLite storage.
+
+    The SQLite storage keeps the config and secret in one file (mode 0600),
+    so a single peer can be read or written without rewriting all the peers.
+    If `{interface}.sqlite3` exists, all the commands use it instead of the files.
+    """
+    from .core import WgWizard
+    from .paths import get_sqlite_path
+
+    source = "files" if target == "sqlite" else "sqlite"
+    wg_wizard = WgWizard.from_dir(config_dir, interface, storage=source)
+    wg_wizard.dump(config_dir, interface, overwrite=overwrite, storage=target)
+    if target == "sqlite":
+        logger.info("The YAML and JSON files are not used anymore and can be removed.")
+    else:
+        logger.info(
+            "%s is still used until it is removed.",
+            get_sqlite_path(config_dir, interface),
+        )
+
+
+@main.command()
+@interface_option
+@config_dir_option
+@option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    help="The Unix socket to listen on. Defaults to `{interface}.sock` in the config dir.",
+)
+@option(
+    "--max-concurrency",
+    type=click.IntRange(min=1),
+    default=8,
+    help="The maximum number of requests handled at the same time.",
+)
+@option(
+    "--compact-peers/--no-compact-peers",
+    is_flag=True,
+    default=False,
+    help="Whether to keep the peers in a compact table, which takes much less memory.",
+)
+@cache_option
+def serve(interface, config_dir, socket_path, max_concurrency, compact_peers, cache):
+    """Serve the configs over HTTP on a Unix socket.
+
+    The config and secret are loaded and checked once and reloaded when the files
+    change, so the requests don't pay for the loading.
+    The socket can only be accessed by the owner (mode 0600). Example:
+    `curl --unix-socket wg0.sock http://localhost/peers/phone1/config`.
+    Routes: `GET /peers`, `POST /peers`, `GET /peers/{name}/config`,
+    `GET /peers/{name}/qrcode?format=txt|png|svg`, `GET /server/config`,
+    `GET /check` and `GET /metrics`.
+    """
+    from .paths import get_socket_path
+    from .server import serve_unix_socket, WgWizardService
+
+    if socket_path is None:
+        socket_path = get_socket_path(config_dir, interface)
+    serve_unix_socket(
+        socket_path,
+        WgWizardService(config_dir, interface, cache, compact_peers),
+        max_concurrency,
     )
@@ -0,0 +1,70 @@
+from typing import Iterable, NamedTuple, TYPE_CHECKING
+
+from .address_pool import find_overlapping_networks, IPInterface
+
+if TYPE_CHECKING:
+    from .core import WgWizardPeerConfig
+
+
+class PeerConflict(NamedTuple):
+    message: str
+    # the peers in the order of the config, so the last one causes the conflict
+    peer_names: tuple[str, ...]
+
+
+def find_peer_conflicts(
+    server_addresses: Iterable[IPInterface],
+    peers: Iterable[tuple[str, "WgWizardPeerConfig"]],
+) -> list[PeerConflict]:
+    """Find the peer addresses and AllowedIPs which would route to the wrong peer.
+
+    - Two peers, or a peer and the server, have the same address.
+    - A peer address is outside the addresses of the server.
+    - The ``server_allowed_ips`` of two peers overlap.
+    """
+    server_addresses = list(server_addresses)
+    server_networks = [address.network for address in server_addresses]
+    server_ips = {address.ip for address in server_addresses}
+    conflicts = []
+    address_owners = {}
+    allowed_ips = []
+    for position, (name, peer_config) in enumerate(peers):
+        for address in peer_config.addresses:
+            ip = address.ip
+            if ip in server_ips:
+                conflicts.append(
+                    PeerConflict(
+                        f"Peer {name} has the address {ip} of the server.", (name,)
+                    )
+                )
+            elif (owner := address_owners.setdefault(ip, name)) != name:
+                conflicts.append(
+                    PeerConflict(
+                        f"Peers {owner} and {name} have the same address {ip}.",
+                        (owner, name),
+                    )
+                )
+            if not any(ip in network for network in server_networks):
+                conflicts.append(
+                    PeerConflict(
+                        f"The address {ip} of peer {name} is outside the addresses "
+                        "of the server.",
+                        (name,),
+                    )
+                )
+        allowed_ips.extend(
+            (allowed_ip.network, (position, name))
+            for allowed_ip in peer_config.server_allowed_ips
+        )
+    for network, owner, outer_network, outer_owner in find_overlapping_networks(
+        allowed_ips
+    ):
+        (_, name), (_, other_name) = sorted([owner, outer_owner])
+        conflicts.append(
+            PeerConflict(
+                f"The server_allowed_ips {network} of peer {owner[1]} overlap with "
+                f"{outer_network} of peer {outer_owner[1]}.",
+                (name, other_name),
+            )
+        )
+    return conflicts
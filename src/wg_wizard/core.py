@@ -1,34 +1,94 @@
+from contextlib import ExitStack
 import datetime
-from ipaddress import ip_interface
+from functools import partial
 from pathlib import Path
-from typing import Annotated, Literal, Optional
+from typing import (
+    Annotated,
+    Iterable,
+    Iterator,
+    Literal,
+    Optional,
+    TextIO,
+    TYPE_CHECKING,
+)
 import json
 import logging
+import sys
 
-import click
 from pydantic import (
     Field,
     IPvAnyInterface,
     IPvAnyAddress,
+    IPvAnyNetwork,
     StringConstraints,
     SecretStr,
     PrivateAttr,
     field_serializer,
+    field_validator,
+    ValidationInfo,
 )
-from ruamel.yaml import YAML
 
-from .paths import get_config_path, get_secret_path
+from .address_pool import (
+    AddressAllocator,
+    AddressPoolExhausted,
+    IPInterface,
+    IPNetwork,
+)
+from .cache import PeerRenderCache, SnapshotCache, VerifiedKeyCache
+from .paths import (
+    get_config_path,
+    get_key_cache_path,
+    get_lock_path,
+    get_render_cache_path,
+    get_secret_path,
+    get_snapshot_path,
+    get_sqlite_path,
+)
+from .routes import collapse_allowed_ips, resolve_allowed_ips, to_interfaces
 from .utils import (
     StrictModel,
+    atomic_open,
+    atomic_write,
+    build_model,
     check_file_mode,
     check_key,
     check_key_pair,
+    confirm_overwrite,
     ensure_file,
+    file_lock,
 )
 from .wg import gen_key_pair, genpsk
-from .wg_quick import WgQuickConfig, WgQuickInterfaceConfig, WgQuickPeerConfig
+from .wg_quick import (
+    format_ini_section,
+    iter_ini_block_chunks,
+    WgQuickConfig,
+    WgQuickInterfaceConfig,
+    WgQuickPeerConfig,
+    write_ini_chunks,
+)
+
+if TYPE_CHECKING:
+    from .conflicts import PeerConflict
 
 logger = logging.getLogger(__name__)
+PeerName = Annotated[str, StringConstraints(pattern=r"[a-zA-Z0-9_=+.-]+")]
+GroupName = Annotated[str, StringConstraints(pattern=r"[a-zA-Z0-9_=+.-]+")]
+Storage = Literal["auto", "files", "sqlite"]
+
+
+def _resolve_client_allowed_ips(
+    client_allowed_ips: list[IPInterface],
+    client_excluded_ips: Optional[list[IPNetwork]],
+) -> list[IPInterface]:
+    if not client_excluded_ips:
+        return collapse_allowed_ips(client_allowed_ips)
+    allowed_ips = resolve_allowed_ips(client_allowed_ips, client_excluded_ips)
+    if not allowed_ips:
+        raise ValueError(
+            "client_excluded_ips cover all the client_allowed_ips, "
+            "so the client would route nothing through WireGuard."
+        )
+    return to_interfaces(allowed_ips)
 
 
 class WgWizardPeerConfig(StrictModel):
@@ -48,10 +108,52 @@ class WgWizardPeerConfig(StrictModel):
     ] = None
     server_persistent_keepalive: Optional[Literal["off"] | int] = None
     client_allowed_ips: list[IPvAnyInterface] = Field(min_length=1)
+    # removed from client_allowed_ips, e.g., the LAN of the client
+    client_excluded_ips: list[IPvAnyNetwork] = Field(default_factory=list)
     client_endpoint: Optional[
         Annotated[str, StringConstraints(pattern=r".+:\d+")]
     ] = None
     client_persistent_keepalive: Optional[Literal["off"] | int] = None
+    groups: list[GroupName] = Field(default_factory=list)
+    # how the other nodes of the meshes connect to this peer directly
+    mesh_endpoint: Optional[Annotated[str, StringConstraints(pattern=r".+:\d+")]] = None
+    mesh_persistent_keepalive: Optional[Literal["off"] | int] = None
+
+    def get_server_allowed_ips(self) -> list[IPInterface]:
+        """Peer.AllowedIPs of the server, collapsed into the fewest prefixes."""
+        return collapse_allowed_ips(self.server_allowed_ips)
+
+    # field validators instead of a model validator, which would keep an invalid
+    # assigned value, and client_excluded_ips is only in `info.data` on assignment
+    @field_validator("client_allowed_ips")
+    @classmethod
+    def check_client_allowed_ips(cls, value, info: ValidationInfo):
+        _resolve_client_allowed_ips(value, info.data.get("client_excluded_ips"))
+        return value
+
+    @field_validator("client_excluded_ips")
+    @classmethod
+    def check_client_excluded_ips(cls, value, info: ValidationInfo):
+        if "client_allowed_ips" in info.data:
+            _resolve_client_allowed_ips(info.data["client_allowed_ips"], value)
+        return value
+
+    def get_client_allowed_ips(self) -> list[IPInterface]:
+        """Peer.AllowedIPs of the client, without the ``client_excluded_ips``.
+
+        The result is the fewest prefixes covering the same addresses. It is checked
+        here as well, since the trusted wg-quick configs aren't validated again.
+        """
+        return _resolve_client_allowed_ips(
+            self.client_allowed_ips, self.client_excluded_ips
+        )
+
+
+class WgWizardMeshConfig(StrictModel):
+    groups: list[GroupName] = Field(min_length=1)
+    # full: all the peers in the groups connect to each other
+    # partial: only the peers in different groups connect to each other
+    topology: Literal["full", "partial"] = "full"
 
 
 class WgWizardConfig(StrictModel):
@@ -68,46 +170,172 @@ class WgWizardConfig(StrictModel):
     pre_down: list[str] = Field(default_factory=list)
     post_down: list[str] = Field(default_factory=list)
     default_endpoint: Annotated[str, StringConstraints(pattern=r".+:\d+")]
-    peers: dict[
-        Annotated[str, StringConstraints(pattern=r"[a-zA-Z0-9_=+.-]+")],
-        WgWizardPeerConfig,
-    ] = Field(default_factory=dict)
+    reserved_addresses: list[IPvAnyNetwork] = Field(default_factory=list)
+    meshes: list[WgWizardMeshConfig] = Field(default_factory=list)
+    peers: dict[PeerName, WgWizardPeerConfig] = Field(default_factory=dict)
     _yaml: dict = PrivateAttr(default=None)
+    _address_allocator: Optional[AddressAllocator] = PrivateAttr(default=None)
+    _address_allocator_key: Optional[tuple] = PrivateAttr(default=None)
 
     @classmethod
-    def from_file(cls, path: Path):
-        yaml = YAML()
-        raw_config = yaml.load(path)
-        config = cls(**raw_config)
-        config._yaml = raw_config
+    def from_file(cls, path: Path, read_only: bool = False, compact: bool = False):
+        """Load the config from a YAML file.
+
+        By default, the round-trip loader is used so that the comments are kept when
+        the config is dumped. If ``read_only`` is true, the safe loader is used
+        instead, which uses the C parser from ruamel.yaml.clib if it is installed.
+        Dumping a read-only config drops the comments.
+        If ``compact`` is true, the peers are validated one by one into a
+        ``PeerTable``. See ``compact_peers``.
+        """
+        from ruamel.yaml import YAML
+
+        if read_only:
+            raw_config = YAML(typ="safe").load(path)
+        else:
+            raw_config = YAML().load(path)
+        if compact:
+            config = cls(**{k: v for k, v in raw_config.items() if k != "peers"})
+            config._set_peers(
+                (name, WgWizardPeerConfig(**raw_peer))
+                for name, raw_peer in (raw_config.get("peers") or {}).items()
+            )
+            if "peers" in raw_config:
+                config.model_fields_set.add("peers")
+        else:
+            config = cls(**raw_config)
+        if not read_only:
+            config._yaml = raw_config
         return config
 
+    def _set_peers(self, peers: Iterable[tuple[str, WgWizardPeerConfig]]):
+        from .peer_table import PeerTable
+
+        # not assigned as a field, which would validate it into a dict
+        self.__dict__["peers"] = PeerTable(peers)
+
+    def compact_peers(self, compact: bool = True):
+        """Keep the peers in a columnar ``PeerTable``, or back in a dict.
+
+        The table takes a fraction of the memory of the peer models, e.g., for
+        serving 100k peers. ``peers`` is still a mapping of the peer names to the
+        models, but a model is built whenever a peer is looked up, so a changed
+        model must be set to ``peers`` again.
+        """
+        from .peer_table import PeerTable
+
+        is_compact = isinstance(self.peers, PeerTable)
+        if compact and not is_compact:
+            self._set_peers(self.peers.items())
+        elif not compact and is_compact:
+            self.__dict__["peers"] = dict(self.peers.items())
+
     def dump(self, path: Path, overwrite=False):
         path = path.resolve()
         logger.info("Writing config to %s", path)
-        ensure_file(path, mode=0o600, overwrite=overwrite)
+        confirm_overwrite(path, overwrite)
+        from ruamel.yaml import YAML
+
         yaml = YAML()
         yaml.indent(mapping=2, sequence=4, offset=2)
-        if self._yaml is None:
-            yaml.dump(json.loads(self.model_dump_json(exclude_unset=True)), path)
-        else:
-            yaml.dump(self._yaml, path)
+        with atomic_open(path) as f:
+            if self._yaml is None:
+                yaml.dump(self._to_json(), f)
+            else:
+                yaml.dump(self._yaml, f)
+
+    def _to_json(self) -> dict:
+        if isinstance(self.peers, dict):
+            return json.loads(self.model_dump_json(exclude_unset=True))
+        raw_config = json.loads(
+            self.model_dump_json(exclude_unset=True, exclude={"peers"})
+        )
+        if "peers" in self.model_fields_set:
+            raw_config["peers"] = {
+                name: json.loads(peer_config.model_dump_json(exclude_unset=True))
+                for name, peer_config in self.peers.items()
+            }
+        return raw_config
 
-    def find_next_available_interface(self) -> Optional[IPvAnyInterface]:
-        existing_ips = set(address.ip for address in self.addresses)
-        existing_ips.update(
-            address.ip
-            for _peer_config in self.peers.values()
-            for address in _peer_config.addresses
+    def find_conflicts(self) -> list["PeerConflict"]:
+        from .conflicts import find_peer_conflicts
+
+        return find_peer_conflicts(self.addresses, self.peers.items())
+
+    def check_conflicts(self):
+        """Raise if the peers have the same addresses or overlapping AllowedIPs.
+
+        All the conflicts are reported at once, with the names of the peers.
+        """
+        conflicts = self.find_conflicts()
+        if conflicts:
+            raise ValueError(
+                f"Found {len(conflicts)} conflicts in the peer addresses:\n"
+                + "\n".join(f"- {conflict.message}" for conflict in conflicts)
+            )
+
+    def _get_address_allocator_key(self) -> tuple:
+        # the taken addresses themselves, so the peers which are replaced or edited
+        # in place without add_peer invalidate the allocator too
+        return (
+            tuple(self.addresses),
+            tuple(self.reserved_addresses),
+            {
+                address.ip
+                for _peer_config in self.peers.values()
+                for address in _peer_config.addresses
+            },
         )
-        for _address in self.addresses:
-            for ip in _address.network.hosts():
-                if ip not in existing_ips:
-                    return ip_interface(ip)
-        return None
+
+    def get_address_allocator(self) -> AddressAllocator:
+        """Get the allocator over the networks of ``addresses``.
+
+        The addresses of the server and peers and ``reserved_addresses`` are not
+        available for allocation. The allocator is kept and updated by ``add_peer``,
+        so the addresses allocated from it stay taken until they are released. It is
+        rebuilt when the taken addresses are changed in any other way.
+        """
+        key = self._get_address_allocator_key()
+        if self._address_allocator_key == key:
+            return self._address_allocator
+        allocator = AddressAllocator(
+            (address.network for address in self.addresses),
+            reserved=self.reserved_addresses,
+        )
+        allocator.reserve(address.ip for address in self.addresses)
+        allocator.reserve(key[2])
+        self._address_allocator = allocator
+        self._address_allocator_key = key
+        return allocator
+
+    def find_next_available_addresses(
+        self, count: int = 1
+    ) -> list[list[IPvAnyInterface]]:
+        """Find the addresses for ``count`` new peers, one from each IP version.
+
+        The addresses are not taken until a peer is added with them.
+        """
+        allocator = self.get_address_allocator()
+        allocated = allocator.allocate_many(count)
+        allocator.release(
+            address.ip for addresses in allocated for address in addresses
+        )
+        return allocated
+
+    def find_next_available_interface(self) -> Optional[IPvAnyInterface]:
+        try:
+            return self.find_next_available_addresses()[0][0]
+        except AddressPoolExhausted:
+            return None
 
     def add_peer(self, name: str, peer_config: WgWizardPeerConfig):
         self.peers[name] = peer_config
+        if self._address_allocator is not None:
+            # the key stays the addresses taken in the allocator, so it is still
+            # compared with the peers if they were changed without add_peer
+            ips = [address.ip for address in peer_config.addresses]
+            self._address_allocator.reserve(ips)
+            self._address_allocator_key[2].update(ips)
         if self._yaml is not None:
             if "peers" not in self._yaml:
                 self._yaml["peers"] = {}
@@ -133,9 +361,12 @@ class WgWizardPeerSecret(StrictModel):
             issued_on=datetime.datetime.now(datetime.timezone.utc),
         )
 
-    def check(self, name: str):
+    def check(self, name: str, key_cache: Optional[VerifiedKeyCache] = None):
         check_key_pair(
-            self.private_key.get_secret_value(), self.public_key, f"Peer {name}"
+            self.private_key.get_secret_value(),
+            self.public_key,
+            f"Peer {name}",
+            key_cache,
         )
         if self.preshared_key is not None:
             check_key(
@@ -147,6 +378,24 @@ class WgWizardPeerSecret(StrictModel):
         return v.get_secret_value()
 
 
+def generate_peer_secrets(
+    count: int, jobs: Optional[int] = None
+) -> list[WgWizardPeerSecret]:
+    if count == 0:
+        return []
+    from concurrent.futures import ThreadPoolExecutor
+
+    log_interval = max(count // 10, 1)
+    peer_secrets = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(lambda _: WgWizardPeerSecret.generate(), range(count))
+        for peer_secret in results:
+            peer_secrets.append(peer_secret)
+            if len(peer_secrets) % log_interval == 0 or len(peer_secrets) == count:
+                logger.info("Generated %d/%d peer secrets.", len(peer_secrets), count)
+    return peer_secrets
+
+
 class WgWizardSecret(StrictModel):
     private_key: SecretStr
     public_key: str = Field(min_length=1)
@@ -174,18 +423,33 @@ class WgWizardSecret(StrictModel):
     def dump(self, path: Path, overwrite=False):
         path = path.resolve()
         logger.info("Writing secret to %s", path)
-        ensure_file(path, mode=0o600, overwrite=overwrite)
-        path.write_text(self.model_dump_json(indent=2))
+        confirm_overwrite(path, overwrite)
+        atomic_write(path, self.model_dump_json(indent=2))
 
     def generate_peer_secret(self, name: str) -> WgWizardPeerSecret:
         peer_secret = WgWizardPeerSecret.generate()
         self.peers[name] = peer_secret
         return peer_secret
 
-    def check(self):
-        check_key_pair(self.private_key.get_secret_value(), self.public_key, "Server")
+    def generate_peer_secrets(
+        self, names: Iterable[str], jobs: Optional[int] = None
+    ) -> dict[str, WgWizardPeerSecret]:
+        """Generate the secrets of multiple peers using a pool of ``jobs`` workers.
+
+        The secrets are merged into ``self.peers`` in the order of ``names``
+        no matter in which order the workers finish.
+        """
+        names = list(names)
+        peer_secrets = dict(zip(names, generate_peer_secrets(len(names), jobs)))
+        self.peers.update(peer_secrets)
+        return peer_secrets
+
+    def check(self, key_cache: Optional[VerifiedKeyCache] = None):
+        check_key_pair(
+            self.private_key.get_secret_value(), self.public_key, "Server", key_cache
+        )
         for peer_name, peer_secret in self.peers.items():
-            peer_secret.check(peer_name)
+            peer_secret.check(peer_name, key_cache)
 
     @field_serializer("private_key", when_used="json")
     def dump_secret(self, v):
@@ -195,18 +459,116 @@ class WgWizardSecret(StrictModel):
 class WgWizard(StrictModel):
     config: WgWizardConfig
     secret: WgWizardSecret
+    _key_cache: VerifiedKeyCache = PrivateAttr(default_factory=VerifiedKeyCache)
+    # None doesn't keep the blocks, so streaming the server config takes no memory
+    # per peer. Set by `from_dir(cache=True)` and by the service.
+    _render_cache: Optional[PeerRenderCache] = PrivateAttr(default=None)
+    # whether only some of the peers are loaded from the storage
+    _partial: bool = PrivateAttr(default=False)
+
+    @classmethod
+    def from_dir(
+        cls,
+        config_dir,
+        interface,
+        cache: bool = False,
+        read_only: bool = False,
+        storage: Storage = "auto",
+        peer_names: Optional[Iterable[str]] = None,
+        compact: bool = False,
+    ):
+        """Load the config and secret of an interface.
+
+        If ``read_only`` is true, the config is loaded without the YAML comments,
+        which is faster but the comments are lost if the config is dumped.
+        If ``cache`` is true, the verified key pairs and the rendered [Peer] blocks
+        are cached in the config dir, and a read-only config and secret are loaded
+        from a validated snapshot in the config dir if the files haven't changed.
+        Otherwise, only the verified key pairs are cached in memory.
+
+        ``storage="auto"`` uses the SQLite storage if its file exists in the config
+        dir, and the YAML config and JSON secret otherwise. Only the SQLite storage
+        loads just the peers in ``peer_names``.
+        If ``compact`` is true, the peers are kept in a columnar table, which takes
+        much less memory. See ``WgWizardConfig.compact_peers``.
+        """
+        config_path = get_config_path(config_dir, interface)
+        secret_path = get_secret_path(config_dir, interface)
+        sqlite_path = get_sqlite_path(config_dir, interface)
+        if storage == "sqlite" or (storage == "auto" and sqlite_path.exists()):
+            from .sqlite_store import SqliteStore
+
+            wg_wizard = SqliteStore(sqlite_path).load(peer_names)
+        elif not (cache and read_only):
+            wg_wizard = cls.from_files(config_path, secret_path, read_only, compact)
+        else:
+            check_file_mode(secret_path)
+            snapshot = SnapshotCache(
+                get_snapshot_path(config_dir, interface), [config_path, secret_path]
+            )
+            wg_wizard = snapshot.load()
+            if not isinstance(wg_wizard, cls):
+                wg_wizard = cls.from_files(config_path, secret_path, read_only, compact)
+                snapshot.save(wg_wizard)
+        # the snapshot and the SQLite storage might keep the peers in the other way
+        wg_wizard.config.compact_peers(compact)
+        if cache:
+            wg_wizard._key_cache = VerifiedKeyCache(
+                get_key_cache_path(config_dir, interface)
+            )
+            wg_wizard._render_cache = PeerRenderCache(
+                get_render_cache_path(config_dir, interface)
+            )
+        return wg_wizard
 
     @classmethod
-    def from_dir(cls, config_dir, interface):
-        config = WgWizardConfig.from_file(get_config_path(config_dir, interface))
-        secret = WgWizardSecret.from_file(get_secret_path(config_dir, interface))
+    def from_files(
+        cls,
+        config_path: Path,
+        secret_path: Path,
+        read_only: bool = False,
+        compact: bool = False,
+    ):
+        config = WgWizardConfig.from_file(config_path, read_only, compact)
+        secret = WgWizardSecret.from_file(secret_path)
         return cls(config=config, secret=secret)
 
-    def dump(self, config_dir, interface, overwrite=True, config=True, secret=True):
-        if config:
-            self.config.dump(get_config_path(config_dir, interface), overwrite)
+    def dump(
+        self,
+        config_dir,
+        interface,
+        overwrite=True,
+        config=True,
+        secret=True,
+        storage: Storage = "auto",
+        peer_names: Optional[Iterable[str]] = None,
+    ):
+        """Write the config and secret of an interface.
+
+        The storage is chosen like ``from_dir``. The SQLite storage only writes the
+        peers in ``peer_names`` if it is given, while the files are always rewritten.
+        """
+        sqlite_path = get_sqlite_path(config_dir, interface)
+        if storage == "sqlite" or (storage == "auto" and sqlite_path.exists()):
+            from .sqlite_store import SqliteStore
+
+            ensure_file(sqlite_path.resolve(), mode=0o600, overwrite=overwrite)
+            logger.info("Writing config and secret to %s", sqlite_path.resolve())
+            SqliteStore(sqlite_path).save(self, peer_names, config, secret)
+            return
+        if self._partial:
+            raise ValueError("Cannot write the files with a partial load.")
+        # if the config is not written after the secret, e.g., on a power loss,
+        # the new peers only leave redundant secrets instead of peers without secrets
         if secret:
             self.secret.dump(get_secret_path(config_dir, interface), overwrite)
+        if config:
+            self.config.dump(get_config_path(config_dir, interface), overwrite)
+
+    def check(self):
+        """Check the secret and the conflicts of the peer addresses."""
+        self.check_secret()
+        self.config.check_conflicts()
 
     def check_secret(self):
         config_peers = set(self.config.peers.keys())
@@ -222,7 +584,8 @@ class WgWizard(StrictModel):
         if redundant_secrets:
             logger.warning("Redundant peers in the secret: %s", redundant_secrets)
 
-        self.secret.check()
+        self.secret.check(self._key_cache)
+        self._key_cache.save()
 
     def generate_keys(
         self,
@@ -231,7 +594,10 @@ class WgWizard(StrictModel):
         missing: bool = False,
         peers: Optional[list[str]] = None,
         overwrite: bool = True,
+        jobs: Optional[int] = None,
     ) -> list[str]:
+        import click
+
         if regenerate_all:
             if not overwrite:
                 click.confirm(
@@ -243,8 +609,7 @@ class WgWizard(StrictModel):
                 )
             self.secret.regenerate_server_secret()
             self.secret.peers = {}
-            for peer_name in self.config.peers:
-                self.secret.generate_peer_secret(peer_name)
+            self.secret.generate_peer_secrets(self.config.peers, jobs)
             return []
         if server:
             if not overwrite:
@@ -256,6 +621,7 @@ class WgWizard(StrictModel):
                     abort=True,
                 )
             self.secret.regenerate_server_secret()
+        peers = list(dict.fromkeys(peers or []))
         for peer_name in peers:
             if not overwrite and peer_name in self.secret.peers:
                 click.confirm(
@@ -265,22 +631,93 @@ class WgWizard(StrictModel):
                     ),
                     abort=True,
                 )
-            self.secret.generate_peer_secret(peer_name)
         missing_peers = []
         if missing:
-            for peer_name in self.config.peers:
-                if peer_name not in self.secret.peers:
-                    self.secret.generate_peer_secret(peer_name)
-                    missing_peers.append(peer_name)
+            missing_peers = [
+                peer_name
+                for peer_name in self.config.peers
+                if peer_name not in self.secret.peers and peer_name not in peers
+            ]
+        self.secret.generate_peer_secrets(peers + missing_peers, jobs)
         return missing_peers
 
 
-def to_wg_quick_server_config(wg_wizard: WgWizard) -> WgQuickConfig:
-    wg_wizard.check_secret()
+class WgWizardSession:
+    """Load an interface under an exclusive lock and write it back once on exit.
+
+    Any number of mutations can be made to ``wg_wizard`` inside the ``with`` block.
+    They are written when the block exits without an exception, with one atomic
+    write per file, and discarded otherwise. The lock makes the concurrent sessions
+    on the same interface wait for each other, so no changes are lost.
+
+    The SQLite storage only writes the peers in ``changed_peers``, which defaults to
+    ``peer_names``. ``None`` means all the peers. The config isn't written if the
+    addresses of its peers conflict. See ``WgWizardConfig.check_conflicts``.
+    """
+
+    def __init__(
+        self,
+        config_dir,
+        interface,
+        peer_names: Optional[Iterable[str]] = None,
+        config: bool = True,
+        secret: bool = True,
+    ):
+        self.config_dir = config_dir
+        self.interface = interface
+        self.peer_names = None if peer_names is None else list(peer_names)
+        self.config = config
+        self.secret = secret
+        self.changed_peers: Optional[set[str]] = (
+            None if self.peer_names is None else set(self.peer_names)
+        )
+        self.wg_wizard: Optional[WgWizard] = None
+        self._exit_stack = ExitStack()
+
+    def __enter__(self) -> "WgWizardSession":
+        with ExitStack() as exit_stack:
+            exit_stack.enter_context(
+                file_lock(get_lock_path(self.config_dir, self.interface))
+            )
+            self.wg_wizard = WgWizard.from_dir(
+                self.config_dir, self.interface, peer_names=self.peer_names
+            )
+            # keep the lock until the session exits
+            self._exit_stack = exit_stack.pop_all()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self._exit_stack:
+            if exc_type is None:
+                self.commit()
+
+    def commit(self):
+        if self.config:
+            # refuse to write a config which would route to the wrong peers
+            self.wg_wizard.config.check_conflicts()
+        self.wg_wizard.dump(
+            self.config_dir,
+            self.interface,
+            config=self.config,
+            secret=self.secret,
+            peer_names=self.changed_peers,
+        )
+
+
+def to_wg_quick_server_interface_config(
+    wg_wizard: WgWizard, trusted: bool = True
+) -> WgQuickInterfaceConfig:
+    """Build the [Interface] section of the server config.
+
+    The values of ``wg_wizard`` have already been validated, so they aren't
+    validated again unless ``trusted`` is false. The same applies to the other
+    ``to_wg_quick_*`` functions.
+    """
     config = wg_wizard.config
-    secret = wg_wizard.secret
-    interface_config = WgQuickInterfaceConfig(
-        private_key=secret.private_key,
+    return build_model(
+        WgQuickInterfaceConfig,
+        trusted,
+        private_key=wg_wizard.secret.private_key,
         listen_port=config.listen_port,
         fw_mark=config.fw_mark,
         address=config.addresses,
@@ -292,25 +729,113 @@ def to_wg_quick_server_config(wg_wizard: WgWizard) -> WgQuickConfig:
         pre_down=config.pre_down,
         post_down=config.post_down,
     )
-    peer_configs = [
-        WgQuickPeerConfig(
-            comment=peer_name,
-            public_key=secret.peers[peer_name].public_key,
-            preshared_key=secret.peers[peer_name].preshared_key,
-            allowed_ips=peer_config.server_allowed_ips,
-            endpoint=peer_config.server_endpoint,
-            persistent_keepalive=peer_config.server_persistent_keepalive,
+
+
+def to_wg_quick_server_peer_config(
+    wg_wizard: WgWizard, peer_name: str, trusted: bool = True
+) -> WgQuickPeerConfig:
+    peer_config = wg_wizard.config.peers[peer_name]
+    peer_secret = wg_wizard.secret.peers[peer_name]
+    return build_model(
+        WgQuickPeerConfig,
+        trusted,
+        comment=peer_name,
+        public_key=peer_secret.public_key,
+        preshared_key=peer_secret.preshared_key,
+        allowed_ips=peer_config.get_server_allowed_ips(),
+        endpoint=peer_config.server_endpoint,
+        persistent_keepalive=peer_config.server_persistent_keepalive,
+    )
+
+
+def iter_wg_quick_server_peer_configs(
+    wg_wizard: WgWizard, trusted: bool = True
+) -> Iterator[WgQuickPeerConfig]:
+    for peer_name in wg_wizard.config.peers:
+        yield to_wg_quick_server_peer_config(wg_wizard, peer_name, trusted)
+
+
+def _format_server_peer_block(wg_wizard: WgWizard, peer_name: str) -> str:
+    return format_ini_section(to_wg_quick_server_peer_config(wg_wizard, peer_name))
+
+
+def iter_wg_quick_server_peer_blocks(wg_wizard: WgWizard) -> Iterator[str]:
+    """Format the [Peer] blocks of the server config using the render cache if any.
+
+    Only the peers which aren't in the cache are converted and formatted, and the
+    cache is saved after the last peer.
+    """
+    render_cache = wg_wizard._render_cache
+    if render_cache is None:
+        for peer_name in wg_wizard.config.peers:
+            yield _format_server_peer_block(wg_wizard, peer_name)
+        return
+    for peer_name, peer_config in wg_wizard.config.peers.items():
+        peer_secret = wg_wizard.secret.peers[peer_name]
+        preshared_key = peer_secret.preshared_key
+        # only the fields in the block, since serializing the whole peer config
+        # costs more than formatting the block
+        key = render_cache.digest(
+            peer_name,
+            repr(
+                (
+                    peer_config.server_allowed_ips,
+                    peer_config.server_endpoint,
+                    peer_config.server_persistent_keepalive,
+                )
+            ),
+            peer_secret.public_key,
+            "" if preshared_key is None else preshared_key.get_secret_value(),
         )
-        for peer_name, peer_config in config.peers.items()
-    ]
-    return WgQuickConfig(interface=interface_config, peer=peer_configs)
+        yield render_cache.get_or_render(
+            key, partial(_format_server_peer_block, wg_wizard, peer_name)
+        )
+    render_cache.save()
+
+
+def to_wg_quick_server_config(
+    wg_wizard: WgWizard, trusted: bool = True
+) -> WgQuickConfig:
+    wg_wizard.check_secret()
+    return build_model(
+        WgQuickConfig,
+        trusted,
+        interface=to_wg_quick_server_interface_config(wg_wizard, trusted),
+        peer=list(iter_wg_quick_server_peer_configs(wg_wizard, trusted)),
+    )
 
 
-def to_wg_quick_client_config(wg_wizard: WgWizard, peer_name: str) -> WgQuickConfig:
+def iter_wg_quick_server_config_chunks(wg_wizard: WgWizard) -> Iterator[str]:
     wg_wizard.check_secret()
+    return iter_ini_block_chunks(
+        format_ini_section(to_wg_quick_server_interface_config(wg_wizard)),
+        iter_wg_quick_server_peer_blocks(wg_wizard),
+    )
+
+
+def format_wg_quick_server_config(wg_wizard: WgWizard) -> str:
+    """Format the server config using the render cache.
+
+    The result is the same as ``to_wg_quick_server_config(wg_wizard).format_ini()``.
+    """
+    return "".join(iter_wg_quick_server_config_chunks(wg_wizard))
+
+
+def write_wg_quick_server_config(wg_wizard: WgWizard, file: TextIO):
+    """Write the server config without holding all the peer configs in memory."""
+    write_ini_chunks(file, iter_wg_quick_server_config_chunks(wg_wizard))
+
+
+def to_wg_quick_client_config(
+    wg_wizard: WgWizard, peer_name: str, check: bool = True, trusted: bool = True
+) -> WgQuickConfig:
+    if check:
+        wg_wizard.check_secret()
     peer_config = wg_wizard.config.peers[peer_name]
     secret = wg_wizard.secret
-    interface_config = WgQuickInterfaceConfig(
+    interface_config = build_model(
+        WgQuickInterfaceConfig,
+        trusted,
         private_key=secret.peers[peer_name].private_key,
         listen_port=peer_config.listen_port,
         fw_mark=peer_config.fw_mark,
@@ -324,15 +849,19 @@ def to_wg_quick_client_config(wg_wizard: WgWizard, peer_name: str) -> WgQuickCon
         post_down=peer_config.post_down,
     )
     peer_configs = [
-        WgQuickPeerConfig(
+        build_model(
+            WgQuickPeerConfig,
+            trusted,
             public_key=secret.public_key,
             preshared_key=secret.peers[peer_name].preshared_key,
-            allowed_ips=peer_config.client_allowed_ips,
+            allowed_ips=peer_config.get_client_allowed_ips(),
             endpoint=peer_config.client_endpoint or wg_wizard.config.default_endpoint,
             persistent_keepalive=peer_config.client_persistent_keepalive,
         )
     ]
-    return WgQuickConfig(interface=interface_config, peer=peer_configs)
+    return build_model(
+        WgQuickConfig, trusted, interface=interface_config, peer=peer_configs
+    )
 
 
 def export_wg_quick_config(
@@ -341,20 +870,42 @@ def export_wg_quick_config(
     qrcode: bool,
     invert_qrcode: bool,
     peer_name: Optional[str],
+    compact_qrcode: bool = False,
+    qrcode_path: Optional[Path] = None,
 ):
+    """Print the config as text and/or QR Code.
+
+    If ``qrcode_path`` is given, the QR Code is written to that PNG or SVG file
+    instead of being printed. A compact QR Code encodes the config without the
+    comments and the default values, so it is smaller and faster to generate.
+    """
+    if peer_name is None and text and not qrcode:
+        write_wg_quick_server_config(wg_wizard, sys.stdout)
+        print()
+        return
     if peer_name is None:
-        server_config = to_wg_quick_server_config(wg_wizard)
+        wg_quick_config = None
+        ini_str = format_wg_quick_server_config(wg_wizard)
     else:
-        server_config = to_wg_quick_client_config(wg_wizard, peer_name)
-    ini_str = server_config.format_ini()
+        wg_quick_config = to_wg_quick_client_config(wg_wizard, peer_name)
+        ini_str = wg_quick_config.format_ini()
     if text:
         print(ini_str)
     if qrcode:
-        from qrcode import QRCode
-
-        qr = QRCode()
-        qr.add_data(ini_str)
-        qr.print_ascii(invert=invert_qrcode)
+        from .qr import format_qrcode_ascii, render_qrcode_image
+
+        if compact_qrcode:
+            if wg_quick_config is None:
+                wg_quick_config = to_wg_quick_server_config(wg_wizard)
+            ini_str = wg_quick_config.format_ini(compact=True)
+        if qrcode_path is None:
+            print(format_qrcode_ascii(ini_str, invert=invert_qrcode), end="")
+        else:
+            qrcode_path = Path(qrcode_path).resolve()
+            image_format = qrcode_path.suffix.lstrip(".").lower()
+            image = render_qrcode_image(ini_str, image_format)
+            logger.info("Writing QR Code to %s", qrcode_path)
+            atomic_write(qrcode_path, image)
 
 
 def export_wg_quick_config_from_files(
@@ -364,6 +915,23 @@ def export_wg_quick_config_from_files(
     qrcode: bool,
     invert_qrcode: bool,
     peer_name: Optional[str] = None,
+    cache: bool = False,
+    compact_qrcode: bool = False,
+    qrcode_path: Optional[Path] = None,
 ):
-    wg_wizard = WgWizard.from_dir(config_dir, interface)
-    export_wg_quick_config(wg_wizard, text, qrcode, invert_qrcode, peer_name)
+    wg_wizard = WgWizard.from_dir(
+        config_dir,
+        interface,
+        cache=cache,
+        read_only=True,
+        peer_names=None if peer_name is None else [peer_name],
+    )
+    export_wg_quick_config(
+        wg_wizard,
+        text,
+        qrcode,
+        invert_qrcode,
+        peer_name,
+        compact_qrcode=compact_qrcode,
+        qrcode_path=qrcode_path,
+    )
@@ -0,0 +1,139 @@
+from typing import Any, Iterable, Iterator, NamedTuple, Optional
+
+from pydantic import SecretStr
+
+from .utils import StrictCamelModel
+from .wg_quick import (
+    COMMA_SEPARATED_FIELDS,
+    WgQuickInterfaceConfig,
+    WgQuickPeerConfig,
+)
+
+# the values of the keys are not shown in the diff
+SECRET_KEYS = {"PrivateKey", "PresharedKey"}
+
+
+class ConfigDiff(NamedTuple):
+    interface: dict[str, tuple[Any, Any]]
+    added: list[WgQuickPeerConfig]
+    removed: list[WgQuickPeerConfig]
+    changed: list[tuple[WgQuickPeerConfig, dict[str, tuple[Any, Any]]]]
+
+    def __bool__(self) -> bool:
+        return bool(self.interface or self.added or self.removed or self.changed)
+
+
+def _normalize_value(field_name: str, value: Any) -> Any:
+    if isinstance(value, SecretStr):
+        return value.get_secret_value()
+    if isinstance(value, list):
+        values = [str(v) for v in value]
+        # the order of the addresses doesn't matter, but the order of the commands does
+        return sorted(values) if field_name in COMMA_SEPARATED_FIELDS else values
+    return value
+
+
+def diff_fields(
+    old: StrictCamelModel, new: StrictCamelModel, exclude: Iterable[str] = ()
+) -> dict[str, tuple[Any, Any]]:
+    """Compare the fields of two models and return the changed fields keyed by alias."""
+    changes = {}
+    for field_name, field in type(new).model_fields.items():
+        if field_name in exclude:
+            continue
+        old_value = _normalize_value(field_name, getattr(old, field_name))
+        new_value = _normalize_value(field_name, getattr(new, field_name))
+        if old_value != new_value:
+            changes[field.alias] = (old_value, new_value)
+    return changes
+
+
+def diff_wg_quick_configs(
+    old_interface: WgQuickInterfaceConfig,
+    old_peers: Iterable[WgQuickPeerConfig],
+    new_interface: WgQuickInterfaceConfig,
+    new_peers: Iterable[WgQuickPeerConfig],
+) -> ConfigDiff:
+    """Compare two wg-quick configs in linear time by joining the peers on PublicKey.
+
+    Both ``old_peers`` and ``new_peers`` can be generators, and only the old peers
+    are kept in memory for the join.
+    """
+    old_peer_index: dict[str, WgQuickPeerConfig] = {}
+    for peer in old_peers:
+        if peer.public_key in old_peer_index:
+            raise ValueError(
+                f"Duplicated PublicKey {peer.public_key} in the old config."
+            )
+        old_peer_index[peer.public_key] = peer
+    added = []
+    changed = []
+    for peer in new_peers:
+        old_peer = old_peer_index.pop(peer.public_key, None)
+        if old_peer is None:
+            added.append(peer)
+            continue
+        changes = diff_fields(old_peer, peer)
+        if changes:
+            changed.append((peer, changes))
+    return ConfigDiff(
+        interface=diff_fields(old_interface, new_interface),
+        added=added,
+        removed=list(old_peer_index.values()),
+        changed=changed,
+    )
+
+
+def _format_change(key: str, change: tuple[Any, Any]) -> tuple[Any, Any]:
+    if key in SECRET_KEYS:
+        return tuple(None if value is None else "(hidden)" for value in change)
+    return change
+
+
+def _peer_summary(peer: WgQuickPeerConfig) -> dict[str, Optional[str]]:
+    return {"name": peer.comment, "public_key": peer.public_key}
+
+
+def config_diff_to_json(config_diff: ConfigDiff) -> dict[str, Any]:
+    """Convert the diff to a JSON-serializable dict with the keys hidden."""
+
+    def format_changes(changes):
+        return {
+            key: dict(zip(("old", "new"), _format_change(key, change)))
+            for key, change in changes.items()
+        }
+
+    return {
+        "interface": format_changes(config_diff.interface),
+        "added": [_peer_summary(peer) for peer in config_diff.added],
+        "removed": [_peer_summary(peer) for peer in config_diff.removed],
+        "changed": [
+            {**_peer_summary(peer), "changes": format_changes(changes)}
+            for peer, changes in config_diff.changed
+        ],
+    }
+
+
+def format_config_diff(config_diff: ConfigDiff) -> Iterator[str]:
+    """Format the diff as lines of text with the keys hidden."""
+
+    def format_peer(peer):
+        if peer.comment is None:
+            return peer.public_key
+        return f"{peer.comment} ({peer.public_key})"
+
+    def format_changes(changes):
+        for key, change in changes.items():
+            old, new = _format_change(key, change)
+            yield f"    {key}: {old} -> {new}"
+
+    if config_diff.interface:
+        yield "~ [Interface]"
+        yield from format_changes(config_diff.interface)
+    for peer in config_diff.added:
+        yield f"+ [Peer] {format_peer(peer)}"
+    for peer in config_diff.removed:
+        yield f"- [Peer] {format_peer(peer)}"
+    for peer, changes in config_diff.changed:
+        yield f"~ [Peer] {format_peer(peer)}"
+        yield from format_changes(changes)
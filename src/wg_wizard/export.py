@@ -0,0 +1,125 @@
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatchcase
+from io import BytesIO
+import logging
+import os
+from pathlib import Path
+import re
+import tarfile
+import time
+from typing import BinaryIO, Iterable, Iterator, Optional, TYPE_CHECKING
+
+from .core import to_wg_quick_client_config, WgWizard
+from .utils import atomic_write
+
+if TYPE_CHECKING:
+    from .qr import QrCodeCache
+
+logger = logging.getLogger(__name__)
+_worker_wg_wizard: Optional[WgWizard] = None
+_worker_qrcode_cache: Optional["QrCodeCache"] = None
+
+
+def select_peers(wg_wizard: WgWizard, patterns: Iterable[str] = ()) -> list[str]:
+    """Select the peers whose names match any of the glob patterns, or all peers."""
+    patterns = list(patterns)
+    peer_names = []
+    for peer_name in wg_wizard.config.peers:
+        if not re.fullmatch(r"[a-zA-Z0-9_=+.-]+", peer_name) or peer_name in (
+            ".",
+            "..",
+        ):
+            raise ValueError(f"Peer name {peer_name!r} cannot be used as a file name.")
+        if not patterns or any(fnmatchcase(peer_name, p) for p in patterns):
+            peer_names.append(peer_name)
+    return peer_names
+
+
+def render_client_files(
+    wg_wizard: WgWizard,
+    peer_name: str,
+    qrcode_formats: Iterable[str] = (),
+    compact_qrcode: bool = False,
+    qrcode_cache: Optional["QrCodeCache"] = None,
+) -> dict[str, bytes]:
+    """Render the wg-quick config of a client and its QR Code images.
+
+    The secrets are not checked here. Call ``WgWizard.check_secret`` beforehand.
+    """
+    wg_quick_config = to_wg_quick_client_config(wg_wizard, peer_name, check=False)
+    ini_str = wg_quick_config.format_ini()
+    files = {f"{peer_name}.conf": f"{ini_str}\n".encode()}
+    if qrcode_formats:
+        from .qr import QrCodeCache
+
+        if qrcode_cache is None:
+            qrcode_cache = QrCodeCache()
+        if compact_qrcode:
+            ini_str = wg_quick_config.format_ini(compact=True)
+        for image_format in qrcode_formats:
+            files[f"{peer_name}.{image_format}"] = qrcode_cache.get_or_render(
+                ini_str, image_format, peer_name
+            )
+    return files
+
+
+def _init_worker(wg_wizard: WgWizard, qrcode_cache: Optional["QrCodeCache"]):
+    global _worker_wg_wizard, _worker_qrcode_cache
+    _worker_wg_wizard = wg_wizard
+    _worker_qrcode_cache = qrcode_cache
+
+
+def _render_in_worker(args: tuple[str, tuple[str, ...], bool]) -> dict[str, bytes]:
+    return render_client_files(
+        _worker_wg_wizard, *args, qrcode_cache=_worker_qrcode_cache
+    )
+
+
+def iter_client_files(
+    wg_wizard: WgWizard,
+    peer_names: list[str],
+    qrcode_formats: Iterable[str] = (),
+    jobs: Optional[int] = None,
+    compact_qrcode: bool = False,
+    qrcode_cache: Optional["QrCodeCache"] = None,
+) -> Iterator[dict[str, bytes]]:
+    """Render the files of the clients in a process pool in the order of ``peer_names``."""
+    wg_wizard.check_secret()
+    qrcode_formats = tuple(qrcode_formats)
+    if jobs == 1 or len(peer_names) <= 1:
+        for peer_name in peer_names:
+            yield render_client_files(
+                wg_wizard, peer_name, qrcode_formats, compact_qrcode, qrcode_cache
+            )
+        return
+    jobs = min(jobs or os.cpu_count() or 1, len(peer_names))
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(wg_wizard, qrcode_cache)
+    ) as executor:
+        yield from executor.map(
+            _render_in_worker,
+            ((peer_name, qrcode_formats, compact_qrcode) for peer_name in peer_names),
+            chunksize=max(len(peer_names) // (jobs * 4), 1),
+        )
+
+
+def write_client_files_to_dir(files: Iterable[dict[str, bytes]], output_dir: Path):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+    for client_files in files:
+        for filename, data in client_files.items():
+            logger.info("Writing %s", output_dir / filename)
+            atomic_write(output_dir / filename, data, mode=0o600)
+
+
+def write_client_files_to_tar(files: Iterable[dict[str, bytes]], fileobj: BinaryIO):
+    """Write the files as a tar stream, which works with non-seekable outputs."""
+    mtime = time.time()
+    with tarfile.open(fileobj=fileobj, mode="w|") as tar:
+        for client_files in files:
+            for filename, data in client_files.items():
+                tar_info = tarfile.TarInfo(filename)
+                tar_info.size = len(data)
+                tar_info.mode = 0o600
+                tar_info.mtime = mtime
+                tar.addfile(tar_info, BytesIO(data))
@@ -0,0 +1,178 @@
+from collections import Counter
+import logging
+from pathlib import Path
+import re
+from typing import Iterable, NamedTuple, Optional
+
+from .core import (
+    WgWizard,
+    WgWizardConfig,
+    WgWizardPeerConfig,
+    WgWizardPeerSecret,
+    WgWizardSecret,
+)
+from .wg import pubkey
+from .wg_quick import iter_wg_quick_config, read_ini, WgQuickConfig, WgQuickPeerConfig
+
+logger = logging.getLogger(__name__)
+INVALID_PEER_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_=+.-]+")
+
+
+class ClientConfig(NamedTuple):
+    name: str
+    config: WgQuickConfig
+
+
+def read_client_configs(paths: Iterable[Path]) -> dict[str, ClientConfig]:
+    """Read the client configs and key them by the public keys of the clients."""
+    client_configs = {}
+    for path in paths:
+        path = Path(path)
+        with path.open() as f:
+            config = read_ini(f)
+        public_key = pubkey(config.interface.private_key.get_secret_value())
+        if public_key in client_configs:
+            raise ValueError(
+                f"{path} has the same key as {client_configs[public_key].name}."
+            )
+        client_configs[public_key] = ClientConfig(path.stem, config)
+    return client_configs
+
+
+def to_peer_name(name: str, used_names: set[str]) -> str:
+    """Turn a comment or a file name into a unique peer name."""
+    name = INVALID_PEER_NAME_CHARS.sub("_", name.strip()).strip("_") or "peer"
+    unique_name = name
+    suffix = 1
+    while unique_name in used_names:
+        suffix += 1
+        unique_name = f"{name}_{suffix}"
+    used_names.add(unique_name)
+    return unique_name
+
+
+def _drop_empty(**values) -> dict:
+    # only set the given fields so that the dumped config is as short as the others
+    return {key: value for key, value in values.items() if value not in (None, [])}
+
+
+def _get_host_addresses(peer: WgQuickPeerConfig) -> list:
+    # the AllowedIPs of a client on the server are usually the addresses of the client
+    hosts = [ip for ip in peer.allowed_ips if ip.network.prefixlen == ip.max_prefixlen]
+    return hosts or peer.allowed_ips
+
+
+def to_peer_config(
+    server_peer: WgQuickPeerConfig,
+    client_config: Optional[WgQuickConfig],
+    default_endpoint: str,
+    client_allowed_ips: list[str],
+) -> WgWizardPeerConfig:
+    values = {
+        "server_allowed_ips": server_peer.allowed_ips,
+        "server_endpoint": server_peer.endpoint,
+        "server_persistent_keepalive": server_peer.persistent_keepalive,
+    }
+    if client_config is None:
+        values.update(
+            addresses=_get_host_addresses(server_peer),
+            client_allowed_ips=client_allowed_ips,
+        )
+    else:
+        interface = client_config.interface
+        client_peer = client_config.peer[0]
+        values.update(
+            listen_port=interface.listen_port,
+            fw_mark=interface.fw_mark,
+            addresses=interface.address,
+            dns_addresses=interface.dns,
+            mtu=interface.mtu,
+            table=interface.table,
+            pre_up=interface.pre_up,
+            post_up=interface.post_up,
+            pre_down=interface.pre_down,
+            post_down=interface.post_down,
+            client_allowed_ips=client_peer.allowed_ips,
+            client_persistent_keepalive=client_peer.persistent_keepalive,
+        )
+        if client_peer.endpoint != default_endpoint:
+            values["client_endpoint"] = client_peer.endpoint
+    return WgWizardPeerConfig(**_drop_empty(**values))
+
+
+def import_wg_quick_configs(
+    interface_name: str,
+    server_lines: Iterable[str],
+    client_configs: dict[str, ClientConfig],
+    default_endpoint: Optional[str] = None,
+    client_allowed_ips: Iterable[str] = ("0.0.0.0/0", "::/0"),
+) -> WgWizard:
+    """Build a wg-wizard config and secret from an existing wg-quick server config.
+
+    The server config is parsed section by section. The peer names come from the
+    ``# comment`` lines of the [Peer] sections or the file names of the client configs.
+    The peers without a client config have no private key, so they don't have
+    secrets and must be regenerated using ``wg-wizard generate-keys --missing``.
+    """
+    client_allowed_ips = list(client_allowed_ips)
+    if default_endpoint is None:
+        endpoints = Counter(
+            client.config.peer[0].endpoint
+            for client in client_configs.values()
+            if client.config.peer[0].endpoint is not None
+        )
+        if not endpoints:
+            raise ValueError(
+                "The default endpoint cannot be found in the client configs. "
+                "Please provide it."
+            )
+        default_endpoint = endpoints.most_common(1)[0][0]
+
+    interface, server_peers = iter_wg_quick_config(server_lines)
+    if interface.listen_port is None:
+        raise ValueError("The server config must have a ListenPort.")
+    private_key = interface.private_key.get_secret_value()
+    secret = WgWizardSecret(private_key=private_key, public_key=pubkey(private_key))
+    peers = {}
+    used_names = set()
+    missing_clients = []
+    for i, server_peer in enumerate(server_peers):
+        client = client_configs.get(server_peer.public_key)
+        name = server_peer.comment or (client and client.name) or f"peer_{i}"
+        name = to_peer_name(name, used_names)
+        client_config = None if client is None else client.config
+        peers[name] = to_peer_config(
+            server_peer, client_config, default_endpoint, client_allowed_ips
+        )
+        if client is None:
+            missing_clients.append(name)
+            continue
+        secret.peers[name] = WgWizardPeerSecret(
+            private_key=client.config.interface.private_key,
+            public_key=server_peer.public_key,
+            preshared_key=server_peer.preshared_key,
+        )
+    if missing_clients:
+        logger.warning(
+            "Peers without client configs: %s. Their keys must be regenerated.",
+            missing_clients,
+        )
+    config = WgWizardConfig(
+        **_drop_empty(
+            name=interface_name,
+            listen_port=interface.listen_port,
+            fw_mark=interface.fw_mark,
+            addresses=interface.address,
+            dns_addresses=interface.dns,
+            mtu=interface.mtu,
+            table=interface.table,
+            pre_up=interface.pre_up,
+            post_up=interface.post_up,
+            pre_down=interface.pre_down,
+            post_down=interface.post_down,
+            default_endpoint=default_endpoint,
+            peers=peers,
+        )
+    )
+    logger.info("Imported %d peers.", len(peers))
+    return WgWizard(config=config, secret=secret)
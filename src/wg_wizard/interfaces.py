@@ -0,0 +1,153 @@
+from concurrent.futures import ProcessPoolExecutor
+from ipaddress import IPv4Network, IPv6Network
+import logging
+import os
+from pathlib import Path
+from typing import Any, Callable, Iterable, NamedTuple, Optional
+
+from .address_pool import find_overlapping_networks
+from .core import format_wg_quick_server_config, WgWizard
+from .utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class InterfaceSummary(NamedTuple):
+    name: str
+    listen_port: int
+    networks: list[IPv4Network | IPv6Network]
+    n_peers: int
+
+
+class InterfaceResult(NamedTuple):
+    interface: str
+    summary: Optional[InterfaceSummary]
+    # the message of the error, as the exceptions might not be picklable
+    error: Optional[str]
+
+
+def load_interface(config_dir, interface, cache: bool = True) -> WgWizard:
+    wg_wizard = WgWizard.from_dir(config_dir, interface, cache=cache, read_only=True)
+    wg_wizard.check_secret()
+    return wg_wizard
+
+
+def summarize_interface(interface: str, wg_wizard: WgWizard) -> InterfaceSummary:
+    config = wg_wizard.config
+    return InterfaceSummary(
+        interface,
+        config.listen_port,
+        [address.network for address in config.addresses],
+        len(config.peers),
+    )
+
+
+def check_interface(config_dir, interface, cache: bool = True) -> InterfaceSummary:
+    wg_wizard = load_interface(config_dir, interface, cache)
+    wg_wizard.config.check_conflicts()
+    return summarize_interface(interface, wg_wizard)
+
+
+def export_server_config_to_dir(
+    config_dir, interface, output_dir: Path, cache: bool = True
+) -> InterfaceSummary:
+    """Write the server config of the interface as ``{output_dir}/{interface}.conf``."""
+    wg_wizard = load_interface(config_dir, interface, cache)
+    path = Path(output_dir, f"{interface}.conf")
+    logger.info("Writing %s", path)
+    # ended by a newline like the output of export-server-config
+    atomic_write(path, f"{format_wg_quick_server_config(wg_wizard)}\n", mode=0o600)
+    return summarize_interface(interface, wg_wizard)
+
+
+def export_client_configs_to_dir(
+    config_dir,
+    interface,
+    output_dir: Path,
+    name_patterns: Iterable[str] = (),
+    qrcode_formats: Iterable[str] = (),
+    compact_qrcode: bool = False,
+    cache: bool = True,
+) -> InterfaceSummary:
+    """Write the client files of the interface to ``{output_dir}/{interface}/``.
+
+    The clients are rendered in the current process, as the interfaces are already
+    processed in parallel.
+    """
+    from .export import iter_client_files, select_peers, write_client_files_to_dir
+
+    wg_wizard = load_interface(config_dir, interface, cache)
+    qrcode_cache = None
+    if cache and qrcode_formats:
+        from .paths import get_qrcode_cache_dir
+        from .qr import QrCodeCache
+
+        qrcode_cache = QrCodeCache(get_qrcode_cache_dir(config_dir, interface))
+    peer_names = select_peers(wg_wizard, name_patterns)
+    files = iter_client_files(
+        wg_wizard,
+        peer_names,
+        qrcode_formats,
+        jobs=1,
+        compact_qrcode=compact_qrcode,
+        qrcode_cache=qrcode_cache,
+    )
+    write_client_files_to_dir(files, Path(output_dir, interface))
+    return summarize_interface(interface, wg_wizard)
+
+
+def _run_on_interface(
+    func: Callable[..., InterfaceSummary], config_dir, interface, kwargs: dict
+) -> InterfaceResult:
+    try:
+        return InterfaceResult(interface, func(config_dir, interface, **kwargs), None)
+    except Exception as exc:
+        return InterfaceResult(interface, None, f"{type(exc).__name__}: {exc}")
+
+
+def run_on_interfaces(
+    func: Callable[..., InterfaceSummary],
+    config_dir,
+    interfaces: list[str],
+    jobs: Optional[int] = None,
+    **kwargs: Any,
+) -> list[InterfaceResult]:
+    """Run ``func(config_dir, interface, **kwargs)`` on the interfaces in a process pool.
+
+    The failure of an interface doesn't stop the others. Its error is returned in
+    the result instead.
+    """
+    if jobs == 1 or len(interfaces) <= 1:
+        return [
+            _run_on_interface(func, config_dir, interface, kwargs)
+            for interface in interfaces
+        ]
+    jobs = min(jobs or os.cpu_count() or 1, len(interfaces))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(_run_on_interface, func, config_dir, interface, kwargs)
+            for interface in interfaces
+        ]
+        return [future.result() for future in futures]
+
+
+def find_interface_conflicts(summaries: Iterable[InterfaceSummary]) -> list[str]:
+    """Find the interfaces sharing a listen port or overlapping address pools."""
+    summaries = list(summaries)
+    conflicts = []
+    port_owners: dict[int, str] = {}
+    for summary in summaries:
+        owner = port_owners.setdefault(summary.listen_port, summary.name)
+        if owner != summary.name:
+            conflicts.append(
+                f"{summary.name} and {owner} use the same listen port "
+                f"{summary.listen_port}."
+            )
+    for network, name, outer_network, outer_name in find_overlapping_networks(
+        (network, summary.name) for summary in summaries for network in summary.networks
+    ):
+        conflicts.append(
+            f"The address pool {network} of {name} overlaps with "
+            f"{outer_network} of {outer_name}."
+        )
+    return conflicts
@@ -0,0 +1,120 @@
+import logging
+from typing import Iterable, Iterator, Optional
+
+from .core import to_wg_quick_client_config, WgWizard
+from .utils import build_model
+from .wg_quick import format_ini_section, iter_ini_block_chunks, WgQuickPeerConfig
+
+logger = logging.getLogger(__name__)
+
+
+class MeshTopology:
+    """Find the peers which connect to each other directly by the meshes of a config.
+
+    A peer is in a mesh if it is in any of the groups of the mesh. The members of
+    the groups are indexed once, so finding the neighbors of a node only costs the
+    size of its meshes, and the O(n²) neighbor lists are never built at once.
+    """
+
+    def __init__(self, wg_wizard: WgWizard):
+        config = wg_wizard.config
+        self._peer_indices = {name: i for i, name in enumerate(config.peers)}
+        self._group_members: dict[str, list[str]] = {}
+        for peer_name, peer_config in config.peers.items():
+            for group in dict.fromkeys(peer_config.groups):
+                self._group_members.setdefault(group, []).append(peer_name)
+        self._meshes = config.meshes
+        self._peer_groups = {
+            peer_name: set(peer_config.groups)
+            for peer_name, peer_config in config.peers.items()
+        }
+        for mesh in self._meshes:
+            for group in mesh.groups:
+                if group not in self._group_members:
+                    logger.warning("The mesh group %s doesn't have any peer.", group)
+
+    def get_nodes(self) -> list[str]:
+        """Return the peers in any mesh in the order of the config."""
+        mesh_groups = {group for mesh in self._meshes for group in mesh.groups}
+        return [
+            peer_name
+            for peer_name, groups in self._peer_groups.items()
+            if not groups.isdisjoint(mesh_groups)
+        ]
+
+    def get_neighbors(self, peer_name: str) -> list[str]:
+        """Return the peers connecting to ``peer_name`` directly in the config order."""
+        peer_groups = self._peer_groups[peer_name]
+        neighbors = set()
+        for mesh in self._meshes:
+            if peer_groups.isdisjoint(mesh.groups):
+                continue
+            for group in mesh.groups:
+                if mesh.topology == "full" or group not in peer_groups:
+                    neighbors.update(self._group_members.get(group, ()))
+        neighbors.discard(peer_name)
+        return sorted(neighbors, key=self._peer_indices.__getitem__)
+
+
+def to_wg_quick_mesh_peer_config(
+    wg_wizard: WgWizard, peer_name: str
+) -> WgQuickPeerConfig:
+    """Build the [Peer] section of a node in the configs of its neighbors.
+
+    The section is the same in all those configs, so it can be formatted only once.
+    The AllowedIPs are the same as on the relay server.
+    """
+    peer_config = wg_wizard.config.peers[peer_name]
+    return build_model(
+        WgQuickPeerConfig,
+        trusted=True,
+        comment=peer_name,
+        public_key=wg_wizard.secret.peers[peer_name].public_key,
+        allowed_ips=peer_config.get_server_allowed_ips(),
+        endpoint=peer_config.mesh_endpoint,
+        persistent_keepalive=peer_config.mesh_persistent_keepalive,
+    )
+
+
+def iter_wg_quick_mesh_configs(
+    wg_wizard: WgWizard, peer_names: Optional[Iterable[str]] = None
+) -> Iterator[tuple[str, str]]:
+    """Format the wg-quick configs of the mesh nodes one by one.
+
+    A node's config is its client config with a [Peer] section for each of its
+    neighbors. Only one config is held in memory at a time, and the [Peer] block of
+    each node is formatted once and reused in the configs of all its neighbors.
+    ``peer_names`` selects the nodes to format, which are all the nodes by default.
+    """
+    wg_wizard.check_secret()
+    topology = MeshTopology(wg_wizard)
+    if peer_names is None:
+        peer_names = topology.get_nodes()
+    blocks: dict[str, str] = {}
+
+    def get_block(peer_name: str) -> str:
+        block = blocks.get(peer_name)
+        if block is None:
+            block = blocks[peer_name] = format_ini_section(
+                to_wg_quick_mesh_peer_config(wg_wizard, peer_name)
+            )
+        return block
+
+    for peer_name in peer_names:
+        client_config = to_wg_quick_client_config(wg_wizard, peer_name, check=False)
+        chunks = iter_ini_block_chunks(
+            format_ini_section(client_config.interface),
+            [
+                format_ini_section(client_config.peer[0]),
+                *map(get_block, topology.get_neighbors(peer_name)),
+            ],
+        )
+        yield peer_name, "".join(chunks)
+
+
+def iter_mesh_files(
+    wg_wizard: WgWizard, peer_names: Optional[Iterable[str]] = None
+) -> Iterator[dict[str, bytes]]:
+    """Turn the mesh configs into files for ``write_client_files_to_dir`` or tar."""
+    for peer_name, ini_str in iter_wg_quick_mesh_configs(wg_wizard, peer_names):
+        yield {f"{peer_name}.conf": f"{ini_str}\n".encode()}
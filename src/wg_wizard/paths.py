@@ -7,3 +7,47 @@ def get_config_path(config_dir, interface) -> Path:
 
 def get_secret_path(config_dir, interface) -> Path:
     return Path(config_dir, f"{interface}_secret.json")
+
+
+def get_sqlite_path(config_dir, interface) -> Path:
+    return Path(config_dir, f"{interface}.sqlite3")
+
+
+def get_lock_path(config_dir, interface) -> Path:
+    return Path(config_dir, f".{interface}.lock")
+
+
+def get_socket_path(config_dir, interface) -> Path:
+    return Path(config_dir, f"{interface}.sock")
+
+
+def get_cache_dir(config_dir) -> Path:
+    return Path(config_dir, ".wg-wizard-cache")
+
+
+def get_key_cache_path(config_dir, interface) -> Path:
+    return get_cache_dir(config_dir) / f"{interface}_verified_keys.json"
+
+
+def get_render_cache_path(config_dir, interface) -> Path:
+    return get_cache_dir(config_dir) / f"{interface}_rendered_peers.json"
+
+
+def get_qrcode_cache_dir(config_dir, interface) -> Path:
+    return get_cache_dir(config_dir) / f"{interface}_qrcodes"
+
+
+def get_snapshot_path(config_dir, interface) -> Path:
+    return get_cache_dir(config_dir) / f"{interface}_snapshot.pickle"
+
+
+def discover_interfaces(config_dir) -> list[str]:
+    """Find the interfaces with both a config and a secret, or a SQLite file."""
+    config_dir = Path(config_dir)
+    interfaces = {
+        path.stem
+        for path in config_dir.glob("*.yml")
+        if get_secret_path(config_dir, path.stem).is_file()
+    }
+    interfaces.update(path.stem for path in config_dir.glob("*.sqlite3"))
+    return sorted(interfaces)
@@ -0,0 +1,151 @@
+from collections.abc import MutableMapping
+from ipaddress import (
+    IPv4Address,
+    IPv4Interface,
+    IPv6Address,
+    IPv6Interface,
+    ip_address,
+)
+from typing import Any, Iterable, Iterator, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .core import WgWizardPeerConfig
+
+# the fields packed as bytes, since the ipaddress objects are large
+INTERFACE_LIST_FIELDS = {"addresses", "server_allowed_ips", "client_allowed_ips"}
+ADDRESS_LIST_FIELDS = {"dns_addresses"}
+
+
+def pack_interfaces(interfaces: Iterable[IPv4Interface | IPv6Interface]) -> bytes:
+    """Pack each interface as its version, its prefix length and its address."""
+    return b"".join(
+        bytes((interface.version, interface.network.prefixlen)) + interface.packed
+        for interface in interfaces
+    )
+
+
+def unpack_interfaces(data: bytes) -> list[IPv4Interface | IPv6Interface]:
+    interfaces = []
+    i = 0
+    while i < len(data):
+        version, prefixlen = data[i], data[i + 1]
+        size = 4 if version == 4 else 16
+        interface_cls = IPv4Interface if version == 4 else IPv6Interface
+        interfaces.append(interface_cls((data[i + 2 : i + 2 + size], prefixlen)))
+        i += 2 + size
+    return interfaces
+
+
+def pack_addresses(addresses: Iterable[IPv4Address | IPv6Address]) -> bytes:
+    return b"".join(bytes((address.version,)) + address.packed for address in addresses)
+
+
+def unpack_addresses(data: bytes) -> list[IPv4Address | IPv6Address]:
+    addresses = []
+    i = 0
+    while i < len(data):
+        size = 4 if data[i] == 4 else 16
+        addresses.append(ip_address(data[i + 1 : i + 1 + size]))
+        i += 1 + size
+    return addresses
+
+
+class PeerTable(MutableMapping):
+    """Keep the peer configs in columns, one value per peer in each column.
+
+    The addresses are packed as bytes, the other lists are kept as tuples, and the
+    equal values are stored only once, e.g., the empty lists, the common
+    ``client_allowed_ips`` and ``None``. The ``WgWizardPeerConfig`` of a peer is
+    built from the columns whenever it is looked up, without validating it again.
+    Changing the built model doesn't change the table, so a changed peer must be
+    set again.
+    """
+
+    def __init__(self, peers: Iterable[tuple[str, "WgWizardPeerConfig"]] = ()):
+        from .core import WgWizardPeerConfig
+
+        self._field_names = list(WgWizardPeerConfig.model_fields)
+        self._columns: dict[str, list] = {name: [] for name in self._field_names}
+        # the fields set in each peer, so the dumped configs stay the same
+        self._fields_set: list[frozenset[str]] = []
+        self._names: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._values: dict[Any, Any] = {}
+        for name, peer_config in peers:
+            self[name] = peer_config
+
+    @classmethod
+    def from_dict(cls, peers: dict[str, "WgWizardPeerConfig"]) -> "PeerTable":
+        return cls(peers.items())
+
+    def _intern(self, value):
+        return self._values.setdefault(value, value)
+
+    def _pack(self, field_name: str, value):
+        if field_name in INTERFACE_LIST_FIELDS:
+            value = pack_interfaces(value)
+        elif field_name in ADDRESS_LIST_FIELDS:
+            value = pack_addresses(value)
+        elif isinstance(value, list):
+            value = tuple(value)
+        return self._intern(value)
+
+    def _unpack(self, field_name: str, value):
+        if field_name in INTERFACE_LIST_FIELDS:
+            return unpack_interfaces(value)
+        if field_name in ADDRESS_LIST_FIELDS:
+            return unpack_addresses(value)
+        if isinstance(value, tuple):
+            return list(value)
+        return value
+
+    def __getitem__(self, name: str) -> "WgWizardPeerConfig":
+        from .core import WgWizardPeerConfig
+
+        row = self._rows[name]
+        # the values were validated when they were set
+        return WgWizardPeerConfig.model_construct(
+            _fields_set=set(self._fields_set[row]),
+            **{
+                field_name: self._unpack(field_name, self._columns[field_name][row])
+                for field_name in self._field_names
+            },
+        )
+
+    def __setitem__(self, name: str, peer_config: "WgWizardPeerConfig"):
+        values = [
+            self._pack(field_name, getattr(peer_config, field_name))
+            for field_name in self._field_names
+        ]
+        fields_set = self._intern(frozenset(peer_config.model_fields_set))
+        row = self._rows.get(name)
+        if row is None:
+            self._rows[name] = len(self._names)
+            self._names.append(name)
+            for field_name, value in zip(self._field_names, values):
+                self._columns[field_name].append(value)
+            self._fields_set.append(fields_set)
+            return
+        for field_name, value in zip(self._field_names, values):
+            self._columns[field_name][row] = value
+        self._fields_set[row] = fields_set
+
+    def __delitem__(self, name: str):
+        row = self._rows.pop(name)
+        del self._names[row]
+        for column in self._columns.values():
+            del column[row]
+        del self._fields_set[row]
+        self._rows = {name: i for i, name in enumerate(self._names)}
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name) -> bool:
+        return name in self._rows
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({len(self)} peers)"
@@ -0,0 +1,149 @@
+from collections import OrderedDict
+from contextlib import suppress
+from hashlib import sha256
+from io import BytesIO, StringIO
+import logging
+from pathlib import Path
+import struct
+from typing import Optional
+import zlib
+
+from qrcode import QRCode
+from qrcode.constants import (
+    ERROR_CORRECT_H,
+    ERROR_CORRECT_L,
+    ERROR_CORRECT_M,
+    ERROR_CORRECT_Q,
+)
+from qrcode.exceptions import DataOverflowError
+
+from .cache import load_cache_file, write_cache_file
+
+logger = logging.getLogger(__name__)
+QRCODE_IMAGE_FORMATS = ("png", "svg")
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + tag
+        + data
+        + struct.pack(">I", zlib.crc32(tag + data))
+    )
+
+
+def matrix_to_png(matrix: list[list[bool]], scale: int = 8) -> bytes:
+    """Encode a QR Code matrix as an 8-bit grayscale PNG without any image library."""
+    size = len(matrix) * scale
+    scanlines = []
+    for row in matrix:
+        pixels = b"".join(b"\x00" * scale if dark else b"\xff" * scale for dark in row)
+        scanlines.extend([b"\x00" + pixels] * scale)
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            _png_chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 0, 0, 0, 0)),
+            _png_chunk(b"IDAT", zlib.compress(b"".join(scanlines), 9)),
+            _png_chunk(b"IEND", b""),
+        ]
+    )
+
+
+def make_qrcode(data: str) -> QRCode:
+    """Build the smallest QR Code of the data.
+
+    The smallest version is the one fitting the data with the lowest error
+    correction level. Then the highest level which fits the same version is used,
+    so the QR Code is as robust as possible without being larger.
+    """
+    qr = QRCode(error_correction=ERROR_CORRECT_L)
+    qr.add_data(data)
+    version = qr.best_fit()
+    for error_correction in (ERROR_CORRECT_H, ERROR_CORRECT_Q, ERROR_CORRECT_M):
+        qr.error_correction = error_correction
+        try:
+            if qr.best_fit(start=version) == version:
+                break
+        except DataOverflowError:
+            pass
+    else:
+        qr.error_correction = ERROR_CORRECT_L
+    qr.version = version
+    qr.make(fit=False)
+    return qr
+
+
+def format_qrcode_ascii(data: str, invert: bool = False) -> str:
+    output = StringIO()
+    make_qrcode(data).print_ascii(out=output, invert=invert)
+    return output.getvalue()
+
+
+def render_qrcode_image(data: str, image_format: str) -> bytes:
+    qr = make_qrcode(data)
+    if image_format == "png":
+        return matrix_to_png(qr.get_matrix())
+    if image_format == "svg":
+        from qrcode.image.svg import SvgPathImage
+
+        output = BytesIO()
+        qr.make_image(image_factory=SvgPathImage).save(output)
+        return output.getvalue()
+    raise ValueError(f"Unknown QR Code image format '{image_format}'.")
+
+
+class QrCodeCache:
+    """Keep the rendered QR Code images by the SHA-256 of their data.
+
+    The recently used images are kept in memory. When ``cache_dir`` is given, the
+    image of a named config is also saved as ``{name}.{format}`` with its digest
+    in ``{name}.{format}.sha256``, so there is at most one image per config and
+    format. The images contain the private keys, so the files are private like
+    the secret. If the files can't be written, the images are kept in memory only.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_size: int = 256):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._images: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+
+    def __getstate__(self):
+        # only the directory is sent to the worker processes
+        return {**self.__dict__, "_images": OrderedDict()}
+
+    def _get_file(self, name: str, image_format: str) -> Optional[Path]:
+        if self.cache_dir is None or name is None:
+            return None
+        return Path(self.cache_dir, f"{name}.{image_format}")
+
+    def get_or_render(
+        self, data: str, image_format: str, name: Optional[str] = None
+    ) -> bytes:
+        digest = sha256(data.encode()).hexdigest()
+        key = (digest, image_format)
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+            return image
+        path = self._get_file(name, image_format)
+        digest_path = None if path is None else path.with_name(f"{path.name}.sha256")
+        if path is not None and load_cache_file(digest_path) == digest.encode():
+            image = load_cache_file(path)
+        if image is None:
+            image = render_qrcode_image(data, image_format)
+            if path is not None:
+                logger.debug("Writing QR Code cache to %s", path)
+                # the digest is written last, so a failed image is never used
+                if not (
+                    write_cache_file(path, image)
+                    and write_cache_file(digest_path, digest)
+                ):
+                    # the old digest mustn't be used for a new image
+                    with suppress(OSError):
+                        digest_path.unlink(missing_ok=True)
+                    # keep the images in memory only, without retrying every image
+                    self.cache_dir = None
+        self._images[key] = image
+        if len(self._images) > self.max_size:
+            self._images.popitem(last=False)
+        return image
@@ -0,0 +1,116 @@
+from ipaddress import (
+    collapse_addresses,
+    ip_interface,
+    ip_network,
+    IPv4Address,
+    IPv4Interface,
+    IPv6Address,
+    IPv6Interface,
+    summarize_address_range,
+)
+from typing import Iterable
+
+from .address_pool import IPInterface, IPNetwork
+
+ADDRESS_CLASSES = {4: IPv4Address, 6: IPv6Address}
+
+
+def merge_ranges(ranges: Iterable[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Merge the overlapping and adjacent ranges of integers (inclusive)."""
+    merged: list[tuple[int, int]] = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def subtract_ranges(
+    ranges: list[tuple[int, int]], excluded: list[tuple[int, int]]
+) -> list[tuple[int, int]]:
+    """Remove the ``excluded`` ranges from the ``ranges``.
+
+    Both must be sorted and disjoint, e.g., returned by ``merge_ranges``, so it takes
+    a single pass over both of them.
+    """
+    result = []
+    i = 0
+    for first, last in ranges:
+        # skip the excluded ranges before this range
+        while i < len(excluded) and excluded[i][1] < first:
+            i += 1
+        j = i
+        while j < len(excluded) and excluded[j][0] <= last:
+            if excluded[j][0] > first:
+                result.append((first, excluded[j][0] - 1))
+            first = excluded[j][1] + 1
+            j += 1
+        if first <= last:
+            result.append((first, last))
+        # the last excluded range may overlap the next range, so it isn't skipped
+        i = max(i, j - 1)
+    return result
+
+
+def _to_range(network: IPNetwork | IPInterface) -> tuple[int, int]:
+    if isinstance(network, (IPv4Interface, IPv6Interface)):
+        network = network.network
+    return int(network.network_address), int(network.broadcast_address)
+
+
+def resolve_allowed_ips(
+    include: Iterable[IPNetwork | IPInterface | str],
+    exclude: Iterable[IPNetwork | IPInterface | str] = (),
+) -> list[IPNetwork]:
+    """Return the fewest prefixes covering ``include`` but not ``exclude``.
+
+    The networks are turned into ranges of integers per IP version, and the merged
+    excluded ranges are subtracted from the merged included ones. Each remaining
+    range is then covered by its largest aligned prefixes, which is the minimal
+    prefix list since the ranges are disjoint and not adjacent. The host bits of
+    the networks are ignored, like the AllowedIPs of WireGuard.
+    """
+    include_ranges: dict[int, list[tuple[int, int]]] = {4: [], 6: []}
+    exclude_ranges: dict[int, list[tuple[int, int]]] = {4: [], 6: []}
+    for networks, ranges in ((include, include_ranges), (exclude, exclude_ranges)):
+        for network in networks:
+            if isinstance(network, str):
+                network = ip_network(network, strict=False)
+            ranges[network.version].append(_to_range(network))
+    resolved: list[IPNetwork] = []
+    for version, address_cls in ADDRESS_CLASSES.items():
+        for first, last in subtract_ranges(
+            merge_ranges(include_ranges[version]),
+            merge_ranges(exclude_ranges[version]),
+        ):
+            resolved.extend(
+                summarize_address_range(address_cls(first), address_cls(last))
+            )
+    return resolved
+
+
+def to_interfaces(networks: Iterable[IPNetwork]) -> list[IPInterface]:
+    return [
+        ip_interface((network.network_address, network.prefixlen))
+        for network in networks
+    ]
+
+
+def collapse_allowed_ips(allowed_ips: list[IPInterface]) -> list[IPInterface]:
+    """Collapse the AllowedIPs into the fewest prefixes.
+
+    The AllowedIPs are returned unchanged if they can't be collapsed, which is the
+    usual case of the single address of a client, so the configs stay the same.
+    """
+    if len(allowed_ips) <= 1:
+        return allowed_ips
+    networks = [allowed_ip.network for allowed_ip in allowed_ips]
+    collapsed = [
+        *collapse_addresses(network for network in networks if network.version == 4),
+        *collapse_addresses(network for network in networks if network.version == 6),
+    ]
+    if len(collapsed) == len(allowed_ips):
+        return allowed_ips
+    return to_interfaces(collapsed)
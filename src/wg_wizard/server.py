@@ -0,0 +1,370 @@
+from collections import deque
+from http.server import BaseHTTPRequestHandler
+import json
+import logging
+import os
+from pathlib import Path
+import socketserver
+import stat
+import threading
+import time
+from typing import Any, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .cache import PeerRenderCache
+from .core import (
+    format_wg_quick_server_config,
+    to_wg_quick_client_config,
+    WgWizard,
+    WgWizardSession,
+)
+from .paths import (
+    get_config_path,
+    get_render_cache_path,
+    get_secret_path,
+    get_sqlite_path,
+)
+from .qr import format_qrcode_ascii, QrCodeCache
+from .wg_quick import WgQuickConfig
+
+logger = logging.getLogger(__name__)
+# the same as the defaults of `wg-wizard add-peers`
+PEER_DEFAULTS = {
+    "client_allowed_ips": "0.0.0.0/0, ::/0",
+    "client_persistent_keepalive": 25,
+}
+QRCODE_CONTENT_TYPES = {
+    "txt": "text/plain; charset=utf-8",
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+
+class ServiceError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class LatencyMetrics:
+    """Count the requests and keep the latencies of the recent ones per route."""
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self._routes: dict[str, dict[str, Any]] = {}
+
+    def record(self, route: str, seconds: float, ok: bool):
+        with self._lock:
+            metrics = self._routes.get(route)
+            if metrics is None:
+                metrics = self._routes[route] = {
+                    "count": 0,
+                    "errors": 0,
+                    "total_seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "recent": deque(maxlen=self.window),
+                }
+            metrics["count"] += 1
+            metrics["errors"] += not ok
+            metrics["total_seconds"] += seconds
+            metrics["max_seconds"] = max(metrics["max_seconds"], seconds)
+            metrics["recent"].append(seconds)
+
+    def to_json(self) -> dict[str, dict[str, Any]]:
+        """Summarize the latencies in milliseconds.
+
+        The percentiles are computed over the recent ``window`` requests.
+        """
+        with self._lock:
+            routes = {
+                route: (metrics, sorted(metrics["recent"]))
+                for route, metrics in self._routes.items()
+            }
+
+        def percentile(latencies, q):
+            return latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000
+
+        return {
+            route: {
+                "count": metrics["count"],
+                "errors": metrics["errors"],
+                "mean_ms": metrics["total_seconds"] / metrics["count"] * 1000,
+                "p50_ms": percentile(recent, 0.5),
+                "p99_ms": percentile(recent, 0.99),
+                "max_ms": metrics["max_seconds"] * 1000,
+            }
+            for route, (metrics, recent) in routes.items()
+        }
+
+
+class WgWizardService:
+    """Keep a checked interface in memory and reload it when the files change.
+
+    The loaded ``WgWizard`` is never changed in place. A reload replaces it, so the
+    requests being served keep using a consistent one. The added peers are written
+    to the files, which triggers a reload.
+    """
+
+    def __init__(
+        self, config_dir, interface, cache: bool = True, compact_peers: bool = False
+    ):
+        self.config_dir = config_dir
+        self.interface = interface
+        self.cache = cache
+        self.compact_peers = compact_peers
+        self._paths = [
+            get_config_path(config_dir, interface),
+            get_secret_path(config_dir, interface),
+            get_sqlite_path(config_dir, interface),
+        ]
+        # kept across the reloads, so only the changed peers are rendered again
+        self._render_cache = PeerRenderCache(
+            get_render_cache_path(config_dir, interface) if cache else None
+        )
+        self._qrcode_cache = QrCodeCache()
+        self._reload_lock = threading.Lock()
+        self._signature = None
+        self._wg_wizard: Optional[WgWizard] = None
+
+    def _get_signature(self) -> tuple:
+        signature = []
+        for path in self._paths:
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                signature.append(None)
+            else:
+                # the files are replaced atomically, so the inode changes as well
+                signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def get_wg_wizard(self) -> WgWizard:
+        """Return the loaded interface, reloading it first if the files changed."""
+        signature = self._get_signature()
+        if signature == self._signature:
+            return self._wg_wizard
+        with self._reload_lock:
+            # another request might have reloaded it while waiting for the lock
+            if signature == self._signature:
+                return self._wg_wizard
+            logger.info("Loading the config and secret of %s.", self.interface)
+            wg_wizard = WgWizard.from_dir(
+                self.config_dir,
+                self.interface,
+                cache=self.cache,
+                read_only=True,
+                compact=self.compact_peers,
+            )
+            wg_wizard.check_secret()
+            wg_wizard._render_cache = self._render_cache
+            self._wg_wizard, self._signature = wg_wizard, signature
+        return wg_wizard
+
+    def get_peer_names(self) -> list[str]:
+        return list(self.get_wg_wizard().config.peers)
+
+    def export_server_config(self) -> str:
+        return format_wg_quick_server_config(self.get_wg_wizard())
+
+    def _get_client_config(self, peer_name: str) -> WgQuickConfig:
+        wg_wizard = self.get_wg_wizard()
+        if peer_name not in wg_wizard.config.peers:
+            raise ServiceError(404, f"Peer {peer_name} doesn't exist.")
+        return to_wg_quick_client_config(wg_wizard, peer_name, check=False)
+
+    def export_client_config(self, peer_name: str) -> str:
+        return self._get_client_config(peer_name).format_ini()
+
+    def export_client_qrcode(
+        self, peer_name: str, image_format: str, compact: bool = False
+    ) -> bytes:
+        if image_format not in QRCODE_CONTENT_TYPES:
+            raise ServiceError(400, f"Unknown QR Code format '{image_format}'.")
+        ini_str = self._get_client_config(peer_name).format_ini(compact=compact)
+        if image_format == "txt":
+            return format_qrcode_ascii(ini_str).encode()
+        return self._qrcode_cache.get_or_render(ini_str, image_format)
+
+    def check(self) -> dict[str, Any]:
+        # the secret is checked whenever the files are reloaded
+        wg_wizard = self.get_wg_wizard()
+        wg_wizard.config.check_conflicts()
+        return {"peers": len(wg_wizard.config.peers)}
+
+    def add_peer(self, row: dict[str, Any]) -> str:
+        """Add a peer in a locked session, so the CLI can change the files as well."""
+        from .bulk import add_peers
+
+        with WgWizardSession(self.config_dir, self.interface) as session:
+            added_peers, errors = add_peers(session.wg_wizard, [row], PEER_DEFAULTS)
+            if errors:
+                raise ServiceError(400, errors[1])
+            session.changed_peers = set(added_peers)
+        return added_peers[0]
+
+
+ROUTES = {
+    "GET /peers",
+    "POST /peers",
+    "GET /peers/{name}/config",
+    "GET /peers/{name}/qrcode",
+    "GET /server/config",
+    "GET /check",
+    "GET /metrics",
+}
+
+
+def get_route_name(method: str, parts: list[str]) -> str:
+    """Name the route of a request for the metrics, without the peer name."""
+    if len(parts) == 3 and parts[0] == "peers":
+        parts = [parts[0], "{name}", parts[2]]
+    route = f"{method} /{'/'.join(parts)}"
+    # don't keep the metrics of arbitrary paths
+    return route if route in ROUTES else "unknown"
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Serve the routes of ``WgWizardService`` as HTTP over the Unix socket.
+
+    - ``GET /peers``: the peer names as JSON.
+    - ``POST /peers``: add a peer defined by a JSON object like ``add-peers``.
+    - ``GET /peers/{name}/config``: the wg-quick config of a client.
+    - ``GET /peers/{name}/qrcode?format=txt|png|svg&compact=1``: the QR Code of a
+      client, optionally with the compact config.
+    - ``GET /server/config``: the wg-quick config of the server.
+    - ``GET /check``: check the config and secret.
+    - ``GET /metrics``: the request counts and latencies of each route as JSON.
+    """
+
+    server: "UnixHTTPServer"
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self) -> str:
+        # the clients of a Unix socket don't have an address
+        return "unix"
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method: str):
+        start_time = time.perf_counter()
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+        route = get_route_name(method, parts)
+        status = 500
+        try:
+            with self.server.request_semaphore:
+                status, content_type, body = self._route(
+                    method, parts, parse_qs(url.query)
+                )
+        except ServiceError as exc:
+            status, content_type, body = exc.status, *self._json({"error": str(exc)})
+        except ValueError as exc:
+            # e.g., the config or secret is invalid
+            status, content_type, body = 500, *self._json({"error": str(exc)})
+        except Exception:
+            logger.exception("Failed to handle %s %s", method, self.path)
+            content_type, body = self._json({"error": "Internal server error."})
+        # recorded before responding so that the next request sees it
+        self.server.metrics.record(
+            route, time.perf_counter() - start_time, status < 400
+        )
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def _json(obj) -> tuple[str, bytes]:
+        return "application/json", json.dumps(obj).encode()
+
+    @staticmethod
+    def _text(text: str) -> tuple[str, bytes]:
+        return "text/plain; charset=utf-8", f"{text}\n".encode()
+
+    def _read_json(self) -> Any:
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError as exc:
+            raise ServiceError(400, f"Invalid JSON: {exc}")
+
+    def _route(self, method: str, parts: list[str], query: dict[str, list[str]]):
+        service = self.server.service
+        if method == "GET" and parts == ["metrics"]:
+            return 200, *self._json(self.server.metrics.to_json())
+        if method == "GET" and parts == ["check"]:
+            return 200, *self._json(service.check())
+        if method == "GET" and parts == ["server", "config"]:
+            return 200, *self._text(service.export_server_config())
+        if parts == ["peers"]:
+            if method == "GET":
+                return 200, *self._json(service.get_peer_names())
+            row = self._read_json()
+            if not isinstance(row, dict):
+                raise ServiceError(400, "The peer must be a JSON object.")
+            with self.server.write_lock:
+                name = service.add_peer(row)
+            return 201, *self._json({"name": name})
+        if method == "GET" and len(parts) == 3 and parts[0] == "peers":
+            if parts[2] == "config":
+                return 200, *self._text(service.export_client_config(parts[1]))
+            if parts[2] == "qrcode":
+                image_format = query.get("format", ["txt"])[0]
+                compact = query.get("compact", ["0"])[0] in ("1", "true")
+                body = service.export_client_qrcode(parts[1], image_format, compact)
+                return 200, QRCODE_CONTENT_TYPES[image_format], body
+        raise ServiceError(404, f"Unknown route {method} {self.path}.")
+
+
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(
+        self, socket_path: Path, service: WgWizardService, max_concurrency: int = 8
+    ):
+        self.service = service
+        self.metrics = LatencyMetrics()
+        # limit the concurrent renders, and add the peers one by one
+        self.request_semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.write_lock = threading.Lock()
+        socket_path = Path(socket_path)
+        if socket_path.exists():
+            if not stat.S_ISSOCK(socket_path.stat().st_mode):
+                raise ValueError(f"{socket_path} exists and is not a socket.")
+            # left by a server which didn't exit cleanly
+            socket_path.unlink()
+        # only the owner can connect, as the secrets are served
+        umask = os.umask(0o177)
+        try:
+            super().__init__(str(socket_path), RequestHandler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        super().server_close()
+        Path(self.server_address).unlink(missing_ok=True)
+
+
+def serve_unix_socket(
+    socket_path: Path,
+    service: WgWizardService,
+    max_concurrency: int = 8,
+):
+    """Serve the interface on the Unix socket until interrupted."""
+    # fail early if the config or secret is invalid
+    service.get_wg_wizard()
+    with UnixHTTPServer(socket_path, service, max_concurrency) as server:
+        logger.info("Serving %s on %s", service.interface, socket_path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Stopped.")
@@ -0,0 +1,249 @@
+from contextlib import contextmanager
+import json
+import logging
+from pathlib import Path
+import sqlite3
+from typing import Iterable, Iterator, Optional
+
+from .core import (
+    WgWizard,
+    WgWizardConfig,
+    WgWizardPeerConfig,
+    WgWizardPeerSecret,
+    WgWizardSecret,
+)
+from .utils import check_file_mode
+
+logger = logging.getLogger(__name__)
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS interface (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    config TEXT NOT NULL,
+    secret TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS peers (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    config TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS peers_position ON peers (position);
+CREATE TABLE IF NOT EXISTS peer_secrets (
+    name TEXT PRIMARY KEY,
+    public_key TEXT NOT NULL,
+    secret TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS peer_secrets_public_key ON peer_secrets (public_key);
+"""
+
+
+class SqliteStore:
+    """Keep the config and secret of an interface in a SQLite file.
+
+    The interface settings, the peers and the peer secrets are stored in separate
+    tables keyed by the peer names, so a single peer can be read or written without
+    touching the others. Every row is the JSON of the corresponding model, and the
+    peers keep their order using the ``position`` column.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def connect(self) -> sqlite3.Connection:
+        check_file_mode(self.path)
+        # transactions are started explicitly in `transaction`
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == 0:
+            conn.executescript(SCHEMA)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        elif version != SCHEMA_VERSION:
+            conn.close()
+            raise ValueError(
+                f"Unsupported schema version {version} of {self.path}. "
+                "Please upgrade wg-wizard."
+            )
+        return conn
+
+    @contextmanager
+    def transaction(self, write: bool = False) -> Iterator[sqlite3.Connection]:
+        """Run the statements in a transaction, which is rolled back on errors.
+
+        A write transaction takes the write lock at the beginning, so concurrent
+        writers wait for each other instead of failing when they commit.
+        """
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def load(self, peer_names: Optional[Iterable[str]] = None) -> WgWizard:
+        """Load the whole interface or only the given peers."""
+        with self.transaction() as conn:
+            row = conn.execute("SELECT config, secret FROM interface").fetchone()
+            if row is None:
+                raise ValueError(f"{self.path} doesn't contain any config.")
+            raw_config, raw_secret = json.loads(row[0]), json.loads(row[1])
+            if peer_names is None:
+                peer_rows = conn.execute(
+                    "SELECT name, config FROM peers ORDER BY position"
+                ).fetchall()
+                secret_rows = conn.execute(
+                    "SELECT name, secret FROM peer_secrets"
+                ).fetchall()
+            else:
+                peer_names = list(dict.fromkeys(peer_names))
+                peer_rows = self._select_by_names(conn, "peers", "config", peer_names)
+                secret_rows = self._select_by_names(
+                    conn, "peer_secrets", "secret", peer_names
+                )
+        raw_config["peers"] = {name: json.loads(config) for name, config in peer_rows}
+        raw_secret["peers"] = {name: json.loads(secret) for name, secret in secret_rows}
+        wg_wizard = WgWizard(
+            config=WgWizardConfig(**raw_config),
+            secret=WgWizardSecret(**raw_secret),
+        )
+        wg_wizard._partial = peer_names is not None
+        return wg_wizard
+
+    @staticmethod
+    def _select_by_names(conn, table: str, column: str, names: list[str]) -> list:
+        rows = []
+        for name in names:
+            row = conn.execute(
+                f"SELECT name, {column} FROM {table} WHERE name = ?", (name,)
+            ).fetchone()
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def save(
+        self,
+        wg_wizard: WgWizard,
+        peer_names: Optional[Iterable[str]] = None,
+        config: bool = True,
+        secret: bool = True,
+    ):
+        """Write the interface and the peers in one transaction.
+
+        If ``peer_names`` is given, only those peers are written, and the ones which
+        are not in ``wg_wizard`` anymore are deleted. Otherwise, all the peers are
+        replaced, which isn't allowed for a partially loaded ``wg_wizard``.
+        """
+        if peer_names is None and wg_wizard._partial:
+            raise ValueError("Cannot replace all the peers with a partial load.")
+        with self.transaction(write=True) as conn:
+            self._save_interface(conn, wg_wizard, config, secret)
+            if peer_names is None:
+                if config:
+                    conn.execute("DELETE FROM peers")
+                if secret:
+                    conn.execute("DELETE FROM peer_secrets")
+                peer_names = [
+                    *wg_wizard.config.peers,
+                    *(
+                        name
+                        for name in wg_wizard.secret.peers
+                        if name not in wg_wizard.config.peers
+                    ),
+                ]
+            for name in peer_names:
+                self._save_peer(
+                    conn,
+                    name,
+                    wg_wizard.config.peers.get(name) if config else None,
+                    wg_wizard.secret.peers.get(name) if secret else None,
+                    delete_missing_config=config,
+                    delete_missing_secret=secret,
+                )
+
+    @staticmethod
+    def _save_interface(conn, wg_wizard: WgWizard, config: bool, secret: bool):
+        raw_config = wg_wizard.config.model_dump_json(
+            exclude_unset=True, exclude={"peers"}
+        )
+        raw_secret = wg_wizard.secret.model_dump_json(exclude={"peers"})
+        if conn.execute("SELECT 1 FROM interface").fetchone() is None:
+            conn.execute(
+                "INSERT INTO interface (id, config, secret) VALUES (0, ?, ?)",
+                (raw_config, raw_secret),
+            )
+            return
+        if config:
+            conn.execute("UPDATE interface SET config = ?", (raw_config,))
+        if secret:
+            conn.execute("UPDATE interface SET secret = ?", (raw_secret,))
+
+    @staticmethod
+    def _save_peer(
+        conn,
+        name: str,
+        peer_config: Optional[WgWizardPeerConfig],
+        peer_secret: Optional[WgWizardPeerSecret],
+        delete_missing_config: bool = False,
+        delete_missing_secret: bool = False,
+    ):
+        if peer_config is not None:
+            conn.execute(
+                """
+                INSERT INTO peers (name, position, config)
+                VALUES (?, (SELECT COALESCE(MAX(position), -1) + 1 FROM peers), ?)
+                ON CONFLICT (name) DO UPDATE SET config = excluded.config
+                """,
+                (name, peer_config.model_dump_json(exclude_unset=True)),
+            )
+        elif delete_missing_config:
+            conn.execute("DELETE FROM peers WHERE name = ?", (name,))
+        if peer_secret is not None:
+            conn.execute(
+                """
+                INSERT INTO peer_secrets (name, public_key, secret) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE
+                SET public_key = excluded.public_key, secret = excluded.secret
+                """,
+                (name, peer_secret.public_key, peer_secret.model_dump_json()),
+            )
+        elif delete_missing_secret:
+            conn.execute("DELETE FROM peer_secrets WHERE name = ?", (name,))
+
+    def get_peer(
+        self, name: str
+    ) -> tuple[WgWizardPeerConfig, Optional[WgWizardPeerSecret]]:
+        with self.transaction() as conn:
+            row = conn.execute("SELECT config FROM peers WHERE name = ?", (name,))
+            row = row.fetchone()
+            secret_row = conn.execute(
+                "SELECT secret FROM peer_secrets WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"Peer {name} doesn't exist.")
+        peer_secret = None
+        if secret_row is not None:
+            peer_secret = WgWizardPeerSecret.model_validate_json(secret_row[0])
+        return WgWizardPeerConfig.model_validate_json(row[0]), peer_secret
+
+    def put_peer(
+        self,
+        name: str,
+        peer_config: WgWizardPeerConfig,
+        peer_secret: Optional[WgWizardPeerSecret] = None,
+    ):
+        with self.transaction(write=True) as conn:
+            self._save_peer(conn, name, peer_config, peer_secret)
+
+    def delete_peer(self, name: str):
+        with self.transaction(write=True) as conn:
+            conn.execute("DELETE FROM peers WHERE name = ?", (name,))
+            conn.execute("DELETE FROM peer_secrets WHERE name = ?", (name,))
+
+    def get_peer_names(self) -> list[str]:
+        with self.transaction() as conn:
+            rows = conn.execute("SELECT name FROM peers ORDER BY position").fetchall()
+        return [name for name, in rows]
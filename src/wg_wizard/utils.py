@@ -1,16 +1,20 @@
 from base64 import standard_b64decode
 import binascii
-from email.policy import strict
+from contextlib import contextmanager
 from ipaddress import ip_interface
+import os
 from pathlib import Path
 import shlex
 import stat
+import tempfile
+from typing import BinaryIO, Iterator, TypeVar
 
-import click
 from pydantic import BaseModel, ConfigDict, SecretStr
 
 from .wg import pubkey
 
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
 
 def to_camel(string: str) -> str:
     return "".join(word.capitalize() for word in string.split("_"))
@@ -31,17 +35,95 @@ class StrictCamelModel(StrictModel):
     )
 
 
-def ensure_file(path: Path, mode: int, overwrite=False):
+def build_model(model_cls: type[ModelT], trusted: bool = False, **values) -> ModelT:
+    """Build a model, skipping the validation if the values are trusted.
+
+    The trusted values must already have the types of the fields, e.g., the values
+    of another validated model, because they are used as they are. The lists are
+    copied, so the models don't share them.
+    """
+    if not trusted:
+        return model_cls(**values)
+    return model_cls.model_construct(
+        **{
+            key: list(value) if isinstance(value, list) else value
+            for key, value in values.items()
+        }
+    )
+
+
+def confirm_overwrite(path: Path, overwrite=False) -> bool:
+    """Ask the user before overwriting ``path`` and return whether it exists."""
+    import click
+
     if not path.exists():
-        path.touch(mode=mode)
-    else:
-        if not path.is_file():
-            raise ValueError(f"{path} is not a file.")
-        if not overwrite:
-            click.confirm(
-                f"'{path}' already exists. Do you want to overwrite it?", abort=True
-            )
+        return False
+    if not path.is_file():
+        raise ValueError(f"{path} is not a file.")
+    if not overwrite:
+        click.confirm(
+            f"'{path}' already exists. Do you want to overwrite it?", abort=True
+        )
+    return True
+
+
+def ensure_file(path: Path, mode: int, overwrite=False):
+    if confirm_overwrite(path, overwrite):
         path.chmod(mode=mode)
+    else:
+        path.touch(mode=mode)
+
+
+@contextmanager
+def atomic_open(path: Path, mode: int = 0o600) -> Iterator[BinaryIO]:
+    """Open a temporary file for writing and rename it over ``path`` when done.
+
+    Readers never see a partially written file, and ``path`` is untouched if an
+    exception is raised. Both the file and the rename are synced to the disk, so
+    ``path`` isn't lost or left with the old content after a crash.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    # the rename is an entry in the directory, which is synced separately
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def atomic_write(path: Path, data: str | bytes, mode: int = 0o600):
+    if isinstance(data, str):
+        data = data.encode()
+    with atomic_open(path, mode) as f:
+        f.write(data)
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive advisory lock on ``path``, waiting for the other holders.
+
+    The lock is released when the process exits, so a crashed process never leaves
+    a stale lock behind.
+    """
+    import fcntl
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # closing the file releases the lock
+        os.close(fd)
 
 
 def check_file_mode(path: Path):
@@ -53,8 +135,16 @@ def check_file_mode(path: Path):
         )
 
 
+def format_ini_value(value) -> str:
+    if isinstance(value, SecretStr):
+        return value.get_secret_value()
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
 def format_ini_lines(obj: BaseModel, exclude=None):
-    for field_name, field_config in obj.model_fields.items():
+    for field_name, field_config in type(obj).model_fields.items():
         if exclude is not None and field_name in exclude:
             continue
         field_val = getattr(obj, field_name)
@@ -63,15 +153,11 @@ def format_ini_lines(obj: BaseModel, exclude=None):
         if isinstance(field_val, list):
             for val in field_val:
                 yield f"{field_config.alias} = {val}"
-        elif isinstance(field_val, SecretStr):
-            yield f"{field_config.alias} = {field_val.get_secret_value()}"
-        elif isinstance(field_val, bool):
-            yield f"{field_config.alias} = {'true' if field_val else 'false'}"
         else:
-            yield f"{field_config.alias} = {field_val}"
+            yield f"{field_config.alias} = {format_ini_value(field_val)}"
 
 
-def check_key(key: str, error_prefix: strict):
+def check_key(key: str, error_prefix: str):
     try:
         decoded = standard_b64decode(key)
     except binascii.Error as exc:
@@ -80,11 +166,17 @@ def check_key(key: str, error_prefix: strict):
         raise ValueError(f"{error_prefix} size is not 32.")
 
 
-def check_key_pair(private_key: str, public_key: str, error_prefix: str):
+def check_key_pair(
+    private_key: str, public_key: str, error_prefix: str, key_cache=None
+):
     check_key(private_key, f"{error_prefix} private_key")
     check_key(public_key, f"{error_prefix} public_key")
+    if key_cache is not None and key_cache.is_verified(private_key, public_key):
+        return
     if pubkey(private_key) != public_key:
         raise ValueError(f"{error_prefix}'s private_key and public_key is not a pair.")
+    if key_cache is not None:
+        key_cache.add(private_key, public_key)
 
 
 def get_iptables_commands(
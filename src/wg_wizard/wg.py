@@ -1,26 +1,208 @@
-import subprocess
+from abc import ABC, abstractmethod
+from base64 import standard_b64decode, standard_b64encode
+import binascii
+import os
+from typing import Optional
+
+
+class KeyBackend(ABC):
+    """Generate WireGuard keys and derive public keys."""
+
+    name: str
+
+    @abstractmethod
+    def genkey(self) -> str:
+        pass
+
+    @abstractmethod
+    def pubkey(self, private_key: str) -> str:
+        pass
+
+    @abstractmethod
+    def genpsk(self) -> str:
+        pass
+
+
+class WgCommandKeyBackend(KeyBackend):
+    """Call the ``wg`` binary once per key, like ``wg genkey | wg pubkey``."""
+
+    name = "wg"
+
+    def __init__(self, command: str = "wg"):
+        self.command = command
+
+    def _run(self, subcommand: str, input: Optional[str] = None) -> str:
+        import subprocess
+
+        return subprocess.run(
+            [self.command, subcommand],
+            input=input,
+            stdout=subprocess.PIPE,
+            check=True,
+            text=True,
+        ).stdout.strip()
+
+    def genkey(self) -> str:
+        return self._run("genkey")
+
+    def pubkey(self, private_key: str) -> str:
+        return self._run("pubkey", input=private_key)
+
+    def genpsk(self) -> str:
+        return self._run("genpsk")
+
+
+def _encode_key(key: bytes) -> str:
+    return standard_b64encode(key).decode("ascii")
+
+
+def _decode_key(key: str) -> bytes:
+    try:
+        decoded = standard_b64decode(key.strip())
+    except binascii.Error as exc:
+        raise ValueError(f"Key is not a valid base64 string: {exc}") from exc
+    if len(decoded) != 32:
+        raise ValueError("Key size is not 32.")
+    return decoded
+
+
+def _clamp(key: bytes) -> bytes:
+    clamped = bytearray(key)
+    clamped[0] &= 248
+    clamped[31] = (clamped[31] & 127) | 64
+    return bytes(clamped)
+
+
+_P = 2**255 - 19
+_A24 = 121665
+
+
+def x25519_base(scalar: bytes) -> bytes:
+    """Multiply the Curve25519 base point by a scalar (RFC 7748)."""
+    k = int.from_bytes(_clamp(scalar), "little")
+    x1 = 9
+    x2, z2, x3, z3 = 1, 0, x1, 1
+    swap = 0
+    for t in reversed(range(255)):
+        k_t = (k >> t) & 1
+        swap ^= k_t
+        if swap:
+            x2, x3 = x3, x2
+            z2, z3 = z3, z2
+        swap = k_t
+        a = (x2 + z2) % _P
+        aa = a * a % _P
+        b = (x2 - z2) % _P
+        bb = b * b % _P
+        e = (aa - bb) % _P
+        c = (x3 + z3) % _P
+        d = (x3 - z3) % _P
+        da = d * a % _P
+        cb = c * b % _P
+        x3 = (da + cb) % _P
+        x3 = x3 * x3 % _P
+        z3 = (da - cb) % _P
+        z3 = x1 * (z3 * z3 % _P) % _P
+        x2 = aa * bb % _P
+        z2 = e * (aa + _A24 * e) % _P
+    if swap:
+        x2, z2 = x3, z3
+    return (x2 * pow(z2, _P - 2, _P) % _P).to_bytes(32, "little")
+
+
+class PythonKeyBackend(KeyBackend):
+    """Pure-Python Curve25519 implementation without any dependency."""
+
+    name = "python"
+
+    def genkey(self) -> str:
+        return _encode_key(_clamp(os.urandom(32)))
+
+    def pubkey(self, private_key: str) -> str:
+        return _encode_key(x25519_base(_decode_key(private_key)))
+
+    def genpsk(self) -> str:
+        return _encode_key(os.urandom(32))
+
+
+class CryptographyKeyBackend(KeyBackend):
+    """Curve25519 implementation from the optional ``cryptography`` package."""
+
+    name = "cryptography"
+
+    def __init__(self):
+        from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+        from cryptography.hazmat.primitives.serialization import (
+            Encoding,
+            PublicFormat,
+        )
+
+        self._private_key_cls = X25519PrivateKey
+        self._encoding = Encoding.Raw
+        self._public_format = PublicFormat.Raw
+
+    def genkey(self) -> str:
+        return _encode_key(_clamp(os.urandom(32)))
+
+    def pubkey(self, private_key: str) -> str:
+        key = self._private_key_cls.from_private_bytes(_decode_key(private_key))
+        return _encode_key(
+            key.public_key().public_bytes(self._encoding, self._public_format)
+        )
+
+    def genpsk(self) -> str:
+        return _encode_key(os.urandom(32))
+
+
+KEY_BACKENDS = {
+    "cryptography": CryptographyKeyBackend,
+    "python": PythonKeyBackend,
+    "wg": WgCommandKeyBackend,
+}
+_key_backend: Optional[KeyBackend] = None
+
+
+def create_key_backend(name: str = "auto") -> KeyBackend:
+    if name == "auto":
+        try:
+            return CryptographyKeyBackend()
+        except ImportError:
+            return PythonKeyBackend()
+    if name not in KEY_BACKENDS:
+        raise ValueError(
+            f"Unknown key backend '{name}'. "
+            f"Available backends: {['auto', *KEY_BACKENDS]}."
+        )
+    return KEY_BACKENDS[name]()
+
+
+def get_key_backend() -> KeyBackend:
+    global _key_backend
+    if _key_backend is None:
+        _key_backend = create_key_backend(
+            os.environ.get("WG_WIZARD_KEY_BACKEND", "auto")
+        )
+    return _key_backend
+
+
+def set_key_backend(backend: str | KeyBackend) -> KeyBackend:
+    global _key_backend
+    if isinstance(backend, str):
+        backend = create_key_backend(backend)
+    _key_backend = backend
+    return backend
 
 
 def genkey():
-    return subprocess.run(
-        ["wg", "genkey"], stdout=subprocess.PIPE, check=True, text=True
-    ).stdout.strip()
+    return get_key_backend().genkey()
 
 
 def pubkey(private_key):
-    return subprocess.run(
-        ["wg", "pubkey"],
-        input=private_key,
-        stdout=subprocess.PIPE,
-        check=True,
-        text=True,
-    ).stdout.strip()
+    return get_key_backend().pubkey(private_key)
 
 
 def genpsk():
-    return subprocess.run(
-        ["wg", "genpsk"], stdout=subprocess.PIPE, check=True, text=True
-    ).stdout.strip()
+    return get_key_backend().genpsk()
 
 
 def gen_key_pair():
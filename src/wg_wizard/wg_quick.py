@@ -1,9 +1,35 @@
-from itertools import chain
-from typing import Literal, Optional
+from typing import get_origin, Iterable, Iterator, Literal, NamedTuple, Optional, TextIO
 
 from pydantic import Field, IPvAnyInterface, IPvAnyAddress, SecretStr
 
-from .utils import StrictCamelModel, format_ini_lines
+from .utils import StrictCamelModel, format_ini_lines, format_ini_value
+
+# the fields which can be written as comma-separated lists
+COMMA_SEPARATED_FIELDS = {"address", "dns", "allowed_ips"}
+# the values which are the same as leaving the fields out
+DEFAULT_VALUES = {
+    "fw_mark": (0, "off"),
+    "persistent_keepalive": (0, "off"),
+}
+
+
+def format_compact_ini_lines(obj: StrictCamelModel, exclude=()) -> Iterator[str]:
+    for field_name, field_config in type(obj).model_fields.items():
+        field_val = getattr(obj, field_name)
+        if (
+            field_name in exclude
+            or field_val is None
+            or field_val == []
+            or field_val in DEFAULT_VALUES.get(field_name, ())
+        ):
+            continue
+        if field_name in COMMA_SEPARATED_FIELDS:
+            yield f"{field_config.alias}={','.join(str(val) for val in field_val)}"
+        elif isinstance(field_val, list):
+            for val in field_val:
+                yield f"{field_config.alias}={val}"
+        else:
+            yield f"{field_config.alias}={format_ini_value(field_val)}"
 
 
 class WgQuickInterfaceConfig(StrictCamelModel):
@@ -20,9 +46,12 @@ class WgQuickInterfaceConfig(StrictCamelModel):
     post_down: list[str]
     save_config: Optional[bool] = None
 
-    def format_ini_lines(self) -> list[str]:
+    def format_ini_lines(self, compact: bool = False) -> list[str]:
         yield "[Interface]"
-        yield from format_ini_lines(self)
+        if compact:
+            yield from format_compact_ini_lines(self)
+        else:
+            yield from format_ini_lines(self)
 
 
 class WgQuickPeerConfig(StrictCamelModel):
@@ -33,27 +62,197 @@ class WgQuickPeerConfig(StrictCamelModel):
     endpoint: Optional[str] = None
     persistent_keepalive: Optional[Literal["off"] | int] = None
 
-    def format_ini_lines(self) -> list[str]:
+    def format_ini_lines(self, compact: bool = False) -> list[str]:
         yield "[Peer]"
+        if compact:
+            yield from format_compact_ini_lines(self, exclude={"comment"})
+            return
         if self.comment is not None:
             yield f"# {self.comment}"
         yield from format_ini_lines(self, exclude={"comment"})
 
 
+def _join_ini_lines(lines: Iterable[str]) -> str:
+    def check(s):
+        assert "\n" not in s
+        return s
+
+    return "\n".join(check(s) for s in lines)
+
+
+def format_ini_section(section: WgQuickInterfaceConfig | WgQuickPeerConfig) -> str:
+    return _join_ini_lines(section.format_ini_lines())
+
+
+def iter_ini_block_chunks(
+    interface_block: str, peer_blocks: Iterable[str]
+) -> Iterator[str]:
+    """Join the formatted sections, e.g., the [Peer] blocks from a render cache."""
+    yield interface_block
+    for peer_block in peer_blocks:
+        yield "\n\n"
+        yield peer_block
+
+
+def iter_ini_chunks(
+    interface: WgQuickInterfaceConfig, peers: Iterable[WgQuickPeerConfig]
+) -> Iterator[str]:
+    """Format the config section by section.
+
+    ``peers`` is consumed lazily, so it can be a generator. Joining the chunks gives
+    the same string as ``WgQuickConfig.format_ini``.
+    """
+    return iter_ini_block_chunks(
+        format_ini_section(interface), (format_ini_section(peer) for peer in peers)
+    )
+
+
+def write_ini_chunks(file: TextIO, chunks: Iterable[str], buffer_size: int = 65536):
+    """Write the chunks to a file object in writes of about ``buffer_size``."""
+    buffer = []
+    buffered_size = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered_size += len(chunk)
+        if buffered_size >= buffer_size:
+            file.write("".join(buffer))
+            buffer.clear()
+            buffered_size = 0
+    file.write("".join(buffer))
+
+
+def write_ini(
+    file: TextIO,
+    interface: WgQuickInterfaceConfig,
+    peers: Iterable[WgQuickPeerConfig],
+    buffer_size: int = 65536,
+):
+    """Write the formatted config to a file object in chunks of ``buffer_size``."""
+    write_ini_chunks(file, iter_ini_chunks(interface, peers), buffer_size)
+
+
 class WgQuickConfig(StrictCamelModel):
     interface: WgQuickInterfaceConfig
     peer: list[WgQuickPeerConfig]
 
-    def format_ini(self) -> str:
-        def check(s):
-            assert "\n" not in s
-            return s
+    def format_ini(self, compact: bool = False) -> str:
+        """Format the config as a wg-quick config file.
 
-        ini_str = "\n".join(
-            check(s)
-            for s in chain(
-                self.interface.format_ini_lines(),
-                *(chain(("",), peer.format_ini_lines()) for peer in self.peer),
+        A compact config has the same settings in fewer bytes, e.g., for a smaller
+        QR Code. The comments, the blank lines, the spaces around ``=`` and the
+        fields which are the same as their defaults are left out, and the addresses
+        are joined by commas.
+        """
+        if compact:
+            return "\n".join(
+                _join_ini_lines(section.format_ini_lines(compact=True))
+                for section in [self.interface, *self.peer]
             )
-        )
-        return ini_str
+        return "".join(iter_ini_chunks(self.interface, self.peer))
+
+    def write_ini(self, file: TextIO):
+        write_ini(file, self.interface, self.peer)
+
+
+class IniSection(NamedTuple):
+    name: str
+    comments: list[str]
+    items: list[tuple[str, str]]
+    line_number: int
+
+
+def iter_ini_sections(lines: Iterable[str]) -> Iterator[IniSection]:
+    """Parse a wg-quick config section by section.
+
+    Only one section is kept in memory, so ``lines`` can be a large file object.
+    The comments before the first key of a section and the comments right above
+    the section header belong to the section. The inline comments are dropped.
+    """
+    section = None
+    pending_comments = []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            comment = line[1:].strip()
+            if section is not None and not section.items:
+                section.comments.append(comment)
+            else:
+                pending_comments.append(comment)
+            continue
+        # drop the inline comments like wg-quick does with `${line%%\#*}`
+        line = line.split("#", 1)[0].rstrip()
+        if line.startswith("[") and line.endswith("]"):
+            if section is not None:
+                yield section
+            section = IniSection(line[1:-1].strip(), pending_comments, [], line_number)
+            pending_comments = []
+        elif "=" in line and section is not None:
+            key, value = line.split("=", 1)
+            section.items.append((key.strip(), value.strip()))
+            pending_comments = []
+        else:
+            raise ValueError(f"Line {line_number}: cannot parse {line!r}.")
+    if section is not None:
+        yield section
+
+
+def _parse_section(model_cls: type[StrictCamelModel], section: IniSection) -> dict:
+    fields = {
+        field.alias.lower(): field_name
+        for field_name, field in model_cls.model_fields.items()
+    }
+    values = {
+        field_name: []
+        for field_name, field in model_cls.model_fields.items()
+        if get_origin(field.annotation) is list
+    }
+    for key, value in section.items:
+        field_name = fields.get(key.lower())
+        if field_name is None or field_name == "comment":
+            raise ValueError(
+                f"Line {section.line_number}: unknown key {key!r} in [{section.name}]."
+            )
+        if field_name in COMMA_SEPARATED_FIELDS:
+            values[field_name].extend(v.strip() for v in value.split(",") if v.strip())
+        elif field_name in values:
+            values[field_name].append(value)
+        else:
+            values[field_name] = value
+    return values
+
+
+def iter_wg_quick_config(
+    lines: Iterable[str],
+) -> tuple[WgQuickInterfaceConfig, Iterator[WgQuickPeerConfig]]:
+    """Parse the [Interface] of a wg-quick config and return an iterator of the peers.
+
+    The peers are parsed lazily, and the first comment of a [Peer] becomes its
+    ``comment``, which is the name of the peer in the configs exported by wg-wizard.
+    """
+    sections = iter_ini_sections(lines)
+    section = next(sections, None)
+    if section is None or section.name != "Interface":
+        raise ValueError("A wg-quick config must start with an [Interface] section.")
+    interface = WgQuickInterfaceConfig(
+        **_parse_section(WgQuickInterfaceConfig, section)
+    )
+
+    def iter_peers():
+        for section in sections:
+            if section.name != "Peer":
+                raise ValueError(
+                    f"Line {section.line_number}: unexpected section [{section.name}]."
+                )
+            values = _parse_section(WgQuickPeerConfig, section)
+            if section.comments:
+                values["comment"] = section.comments[0]
+            yield WgQuickPeerConfig(**values)
+
+    return interface, iter_peers()
+
+
+def read_ini(lines: Iterable[str]) -> WgQuickConfig:
+    interface, peers = iter_wg_quick_config(lines)
+    return WgQuickConfig(interface=interface, peer=list(peers))
@@ -1,5 +1,12 @@
+from pathlib import Path
+import shutil
+
 import pytest
 
+from wg_wizard.paths import get_secret_path
+
+data_dir = Path(__file__).parent / "data"
+
 
 def pytest_addoption(parser):
     parser.addoption(
@@ -13,3 +20,12 @@ def pytest_addoption(parser):
 @pytest.fixture
 def update_snapshot(request):
     return request.config.getoption("--update-snapshot")
+
+
+@pytest.fixture
+def config_dir(tmp_path):
+    """Copy the config dir of wg0 with one client, so the tests can change it."""
+    config_dir = tmp_path / "config"
+    shutil.copytree(data_dir / "default_with_one_client", config_dir)
+    get_secret_path(config_dir, "wg0").chmod(mode=0o600)
+    return config_dir
@@ -0,0 +1,108 @@
+from ipaddress import ip_address, ip_interface, ip_network
+
+import pytest
+
+from wg_wizard.address_pool import (
+    AddressAllocator,
+    AddressPool,
+    AddressPoolExhausted,
+    find_overlapping_networks,
+)
+
+
+@pytest.mark.parametrize(
+    "network",
+    ["10.0.0.0/28", "10.0.0.0/31", "10.0.0.1/32", "fd00::/124", "fd00::/127"],
+)
+def test_address_pool_follows_hosts(network):
+    network = ip_network(network)
+    pool = AddressPool(network)
+    expected = list(network.hosts())
+    assert pool.count_free() == len(expected)
+    assert pool.allocate_many(len(expected)) == expected
+    with pytest.raises(AddressPoolExhausted):
+        pool.allocate()
+
+
+def test_address_pool_reserve_and_release():
+    pool = AddressPool(ip_network("10.0.0.0/24"))
+    pool.reserve(ip_network("10.0.0.0/28"))
+    pool.reserve(ip_address("10.0.0.17"))
+    assert pool.allocate_many(3) == [
+        ip_address("10.0.0.16"),
+        ip_address("10.0.0.18"),
+        ip_address("10.0.0.19"),
+    ]
+    pool.release(ip_address("10.0.0.18"))
+    pool.release(ip_address("10.0.0.16"))
+    assert ip_address("10.0.0.17") not in pool
+    assert pool.allocate() == ip_address("10.0.0.16")
+    assert pool.count_free() == 254 - 15 - 3
+
+
+def test_address_pool_exhausted_rolls_back():
+    pool = AddressPool(ip_network("10.0.0.0/29"))
+    with pytest.raises(AddressPoolExhausted):
+        pool.allocate_many(7)
+    assert pool.count_free() == 6
+    assert pool._starts == [int(ip_address("10.0.0.1"))]
+
+
+def test_address_allocator_dual_stack():
+    allocator = AddressAllocator(
+        [ip_network("10.0.0.0/30"), ip_network("fd00::/64"), ip_network("10.0.1.0/30")],
+        reserved=[ip_address("10.0.0.1"), ip_address("fd00::1")],
+    )
+    assert allocator.allocate_many(3) == [
+        [ip_interface("10.0.0.2"), ip_interface("fd00::2")],
+        [ip_interface("10.0.1.1"), ip_interface("fd00::3")],
+        [ip_interface("10.0.1.2"), ip_interface("fd00::4")],
+    ]
+    with pytest.raises(AddressPoolExhausted):
+        allocator.allocate()
+    assert allocator.pools[6][0].count_free() == 2**64 - 1 - 4
+
+
+def test_address_allocator_overlapping_networks():
+    allocator = AddressAllocator(
+        [
+            ip_network("10.0.0.0/30"),
+            ip_network("10.0.0.0/29"),
+            ip_network("10.0.0.0/30"),
+        ],
+        reserved=[ip_address("10.0.0.1")],
+    )
+    assert [pool.network for pool in allocator.pools[4]] == [ip_network("10.0.0.0/29")]
+    assert allocator.allocate_many(3) == [
+        [ip_interface("10.0.0.2")],
+        [ip_interface("10.0.0.3")],
+        [ip_interface("10.0.0.4")],
+    ]
+
+
+def test_find_overlapping_networks():
+    networks = [
+        (ip_network("10.0.0.0/8"), "a"),
+        (ip_network("10.1.0.0/16"), "b"),
+        (ip_network("10.1.2.0/24"), "c"),
+        (ip_network("10.1.2.0/24"), "c"),
+        (ip_network("10.2.0.0/16"), "a"),
+        (ip_network("11.0.0.0/8"), "b"),
+        (ip_network("fd00::/64"), "a"),
+        (ip_network("fd00::1/128"), "b"),
+        (ip_network("fd01::/64"), "c"),
+    ]
+    overlaps = [
+        (str(network), owner, str(outer_network), outer_owner)
+        for network, owner, outer_network, outer_owner in find_overlapping_networks(
+            networks
+        )
+    ]
+    assert overlaps == [
+        ("10.1.0.0/16", "b", "10.0.0.0/8", "a"),
+        ("10.1.2.0/24", "c", "10.0.0.0/8", "a"),
+        ("10.1.2.0/24", "c", "10.1.0.0/16", "b"),
+        ("10.1.2.0/24", "c", "10.0.0.0/8", "a"),
+        ("10.1.2.0/24", "c", "10.1.0.0/16", "b"),
+        ("fd00::1/128", "b", "fd00::/64", "a"),
+    ]
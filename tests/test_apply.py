@@ -0,0 +1,146 @@
+import json
+from pathlib import Path
+import stat
+import sys
+
+import pytest
+
+from wg_wizard.apply import (
+    apply_wg_quick_config,
+    format_wg_conf,
+    parse_wg_dump,
+    WgCommand,
+)
+from wg_wizard.core import to_wg_quick_server_config, WgWizard
+from wg_wizard.paths import get_secret_path
+
+data_dir = Path(__file__).parent / "data"
+FAKE_WG_SOURCE = """
+import json
+import os
+import sys
+
+args = sys.argv[1:]
+if args[0] == "show":
+    sys.stdout.write(open(os.environ["FAKE_WG_DUMP"]).read())
+else:
+    # the key files are removed after the call, so log their content instead
+    args = [open(arg).read() if os.path.isfile(arg) else arg for arg in args]
+    with open(os.environ["FAKE_WG_LOG"], "a") as f:
+        f.write(json.dumps(args) + "\\n")
+"""
+SERVER_PRIVATE_KEY = "uHcLp64yKEPEX9BVGtonUiZZRI03wK3pbwtCGuoIPEQ="
+SERVER_PUBLIC_KEY = "j4qJbzJL7/FLPb6Sr5ZZ6LjKgvJTZ2kW+c744hELoWg="
+CLIENT_PUBLIC_KEY = "SD6+qGbpgMapjVmg1FFmkDJEbHPgFfEz2cOcHWhYwEc="
+CLIENT_PRESHARED_KEY = "7fjcVDKEf//f4K8dVaOJSPrRgxP9ga+4TXo5ooITiIE="
+OTHER_PUBLIC_KEY = "hSDwCYkwp1R0i33ctD73Wg2/Og0mOBr066SpjqqbTmo="
+
+
+def format_dump(listen_port, peers):
+    lines = [f"{SERVER_PRIVATE_KEY}\t{SERVER_PUBLIC_KEY}\t{listen_port}\toff"]
+    for public_key, preshared_key, allowed_ips in peers:
+        lines.append(
+            f"{public_key}\t{preshared_key}\t1.2.3.4:5678\t{allowed_ips}\t0\t0\t0\toff"
+        )
+    return "\n".join(lines) + "\n"
+
+
+@pytest.fixture
+def fake_wg(tmp_path, monkeypatch):
+    path = tmp_path / "wg"
+    path.write_text(f"#!{sys.executable}\n{FAKE_WG_SOURCE}")
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("FAKE_WG_DUMP", str(tmp_path / "dump"))
+    monkeypatch.setenv("FAKE_WG_LOG", str(tmp_path / "log.jsonl"))
+    return path
+
+
+def read_fake_wg_calls(fake_wg):
+    log_path = fake_wg.parent / "log.jsonl"
+    if not log_path.exists():
+        return []
+    return [json.loads(line) for line in log_path.read_text().splitlines()]
+
+
+@pytest.fixture
+def wg_wizard():
+    config_dir = data_dir / "default_with_one_client"
+    get_secret_path(config_dir, "wg0").chmod(mode=0o600)
+    return WgWizard.from_dir(config_dir, "wg0")
+
+
+def test_parse_wg_dump():
+    interface, peers = parse_wg_dump(
+        format_dump(51820, [(CLIENT_PUBLIC_KEY, "(none)", "10.0.0.5/24,fd00::2/128")])
+    )
+    assert interface.listen_port == 51820
+    assert interface.fw_mark == 0
+    peer = peers[CLIENT_PUBLIC_KEY]
+    assert peer.preshared_key is None
+    assert peer.endpoint == "1.2.3.4:5678"
+    assert peer.allowed_ips == {"10.0.0.0/24", "fd00::2/128"}
+    assert peer.persistent_keepalive == 0
+
+
+def test_apply_delta_with_wg_set(wg_wizard, fake_wg):
+    (fake_wg.parent / "dump").write_text(
+        format_dump(
+            51821,
+            [
+                (CLIENT_PUBLIC_KEY, CLIENT_PRESHARED_KEY, "192.168.10.3/32"),
+                (OTHER_PUBLIC_KEY, "(none)", "192.168.10.4/32"),
+            ],
+        )
+    )
+    delta = apply_wg_quick_config(
+        to_wg_quick_server_config(wg_wizard), "wg0", WgCommand(str(fake_wg))
+    )
+    assert delta.interface == {"listen_port": (51821, 51820)}
+    assert [peer.public_key for peer in delta.removed] == [OTHER_PUBLIC_KEY]
+    assert [desired.public_key for _, desired in delta.changed] == [CLIENT_PUBLIC_KEY]
+    assert read_fake_wg_calls(fake_wg) == [
+        # a single call with only the changes
+        [
+            "set",
+            "wg0",
+            "listen-port",
+            "51820",
+            "peer",
+            OTHER_PUBLIC_KEY,
+            "remove",
+            "peer",
+            CLIENT_PUBLIC_KEY,
+            "preshared-key",
+            CLIENT_PRESHARED_KEY,
+            "persistent-keepalive",
+            "off",
+            "allowed-ips",
+            "192.168.10.2/32",
+        ]
+    ]
+
+
+def test_apply_nothing_changed(wg_wizard, fake_wg):
+    (fake_wg.parent / "dump").write_text(
+        format_dump(
+            51820, [(CLIENT_PUBLIC_KEY, CLIENT_PRESHARED_KEY, "192.168.10.2/32")]
+        )
+    )
+    delta = apply_wg_quick_config(
+        to_wg_quick_server_config(wg_wizard), "wg0", WgCommand(str(fake_wg))
+    )
+    assert not delta
+    assert read_fake_wg_calls(fake_wg) == []
+
+
+def test_apply_with_syncconf(wg_wizard, fake_wg):
+    (fake_wg.parent / "dump").write_text(format_dump(51820, []))
+    wg_quick_config = to_wg_quick_server_config(wg_wizard)
+    delta = apply_wg_quick_config(
+        wg_quick_config, "wg0", WgCommand(str(fake_wg)), method="syncconf"
+    )
+    assert [peer.public_key for peer in delta.added] == [CLIENT_PUBLIC_KEY]
+    wg_conf = format_wg_conf(wg_quick_config)
+    assert "PostUp" not in wg_conf
+    assert "Address" not in wg_conf
+    assert read_fake_wg_calls(fake_wg) == [["syncconf", "wg0", wg_conf]]
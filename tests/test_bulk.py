@@ -0,0 +1,146 @@
+from io import StringIO
+
+import pytest
+
+from wg_wizard.bulk import add_peers, guess_peer_format, iter_peer_rows
+from wg_wizard.core import WgWizard
+
+peers_csv = """name,addresses,client_allowed_ips,client_persistent_keepalive
+phone,,,
+laptop,192.168.10.3/32,,off
+client_0,,,
+tablet,,"192.168.10.0/24, fd00::/64",
+,192.168.10.9/32,,
+router,not-an-ip,,
+"""
+peers_yaml = """
+phone: {}
+laptop: {addresses: [192.168.10.3/32], client_persistent_keepalive: "off"}
+---
+- name: client_0
+- name: tablet
+  client_allowed_ips: [192.168.10.0/24, "fd00::/64"]
+- addresses: [192.168.10.9/32]
+- {name: router, addresses: [not-an-ip]}
+"""
+peers_jsonl = """{"name": "phone"}
+{"name": "laptop", "addresses": ["192.168.10.3/32"], "client_persistent_keepalive": "off"}
+{"name": "client_0"}
+{"name": "tablet", "client_allowed_ips": "192.168.10.0/24, fd00::/64"}
+{"addresses": ["192.168.10.9/32"]
+{"name": "router", "addresses": ["not-an-ip"]}
+"""
+peers_json = """[
+    {"name": "phone"},
+    {"name": "laptop", "addresses": ["192.168.10.3/32"], "client_persistent_keepalive": "off"},
+    {"name": "client_0"},
+    {"name": "tablet", "client_allowed_ips": "192.168.10.0/24, fd00::/64"},
+    {"addresses": ["192.168.10.9/32"]},
+    {"name": "router", "addresses": ["not-an-ip"]}
+]
+"""
+
+
+@pytest.mark.parametrize(
+    "peers_str, peers_format",
+    [
+        (peers_csv, "csv"),
+        (peers_yaml, "yaml"),
+        (peers_json, "json"),
+        (peers_jsonl, "jsonl"),
+    ],
+)
+def test_add_peers(config_dir, peers_str, peers_format):
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    added_peers, errors = add_peers(
+        wg_wizard,
+        iter_peer_rows(StringIO(peers_str), peers_format),
+        defaults={
+            "client_allowed_ips": "0.0.0.0/0, ::/0",
+            "client_persistent_keepalive": 25,
+        },
+    )
+    assert added_peers == ["phone", "laptop", "tablet"]
+    assert list(errors) == [3, 5, 6]
+
+    peers = wg_wizard.config.peers
+    assert [str(peers[name].addresses[0]) for name in added_peers] == [
+        "192.168.10.4/32",
+        "192.168.10.3/32",
+        "192.168.10.5/32",
+    ]
+    assert peers["phone"].client_persistent_keepalive == 25
+    assert peers["laptop"].client_persistent_keepalive == "off"
+    assert [str(ip) for ip in peers["tablet"].client_allowed_ips] == [
+        "192.168.10.0/24",
+        "fd00::/64",
+    ]
+    wg_wizard.check_secret()
+
+
+def test_add_peers_rejects_conflicts(config_dir):
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    rows = [
+        # the address of client_0
+        {"name": "phone", "addresses": "192.168.10.2/32"},
+        {"name": "laptop", "addresses": "192.168.10.3/32"},
+        {"name": "tablet", "server_allowed_ips": "192.168.10.2/31"},
+        {"name": "printer", "addresses": "10.0.0.5/32"},
+        # only conflicts with the rejected printer
+        {"name": "camera", "server_allowed_ips": "10.0.0.5/32"},
+    ]
+    added_peers, errors = add_peers(
+        wg_wizard, rows, defaults={"client_allowed_ips": "0.0.0.0/0"}
+    )
+    assert added_peers == ["laptop", "camera"]
+    assert errors == {
+        1: "Peers client_0 and phone have the same address 192.168.10.2.",
+        3: (
+            "The server_allowed_ips 192.168.10.2/32 of peer client_0 overlap with "
+            "192.168.10.2/31 of peer tablet."
+        ),
+        4: (
+            "The address 10.0.0.5 of peer printer is outside the addresses of the "
+            "server."
+        ),
+    }
+    wg_wizard.config.check_conflicts()
+
+
+def test_add_peers_releases_addresses_of_failed_rows(config_dir):
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    rows = [
+        {"addresses": "192.168.10.3/32"},
+        {"name": "phone"},
+        {"name": "laptop", "addresses": "192.168.10.4/32", "mtu": "large"},
+        # still reserved for this row
+        {"name": "tablet", "addresses": "192.168.10.4/32"},
+        {"name": "router"},
+        {
+            "name": "printer",
+            "addresses": "192.168.10.6/32",
+            "server_allowed_ips": "192.168.10.2/32",
+        },
+    ]
+    added_peers, errors = add_peers(
+        wg_wizard, rows, defaults={"client_allowed_ips": "0.0.0.0/0"}
+    )
+    assert added_peers == ["phone", "tablet", "router"]
+    assert list(errors) == [1, 3, 6]
+    peers = wg_wizard.config.peers
+    assert [str(peers[name].addresses[0]) for name in added_peers] == [
+        "192.168.10.3/32",
+        "192.168.10.4/32",
+        "192.168.10.5/32",
+    ]
+    assert str(wg_wizard.config.find_next_available_interface()) == "192.168.10.6/32"
+
+
+def test_guess_peer_format():
+    assert guess_peer_format("peers.json") == "json"
+    assert guess_peer_format("peers.ndjson") == "jsonl"
+    assert list(iter_peer_rows(StringIO('{"phone": {"mtu": 1280}}'), "json")) == [
+        {"name": "phone", "mtu": 1280}
+    ]
+    (error,) = iter_peer_rows(StringIO("[{"), "json")
+    assert isinstance(error, ValueError)
@@ -1,10 +1,15 @@
+import fcntl
+import os
 from pathlib import Path
+import shutil
 
-import pytest
+import click
 from click.testing import CliRunner
+import pytest
 
-from wg_wizard.cli import add_peer, init
-from wg_wizard.core import WgWizard
+from wg_wizard.cli import add_peer, add_peers, init
+from wg_wizard.core import WgWizard, WgWizardPeerConfig, WgWizardSession
+from wg_wizard.paths import get_lock_path, get_secret_path
 
 data_dir = Path(__file__).parent / "data"
 
@@ -36,3 +41,60 @@ def test_init_default_with_one_client(expected_config_dir, interface):
             == Path(expected_config_dir, f"{interface}.yml").read_text()
         )
         WgWizard.from_dir("./", interface).check_secret()
+
+
+@pytest.mark.parametrize(
+    "config_dir, interface", [(data_dir / "default_with_one_client", "wg0")]
+)
+def test_add_peers(config_dir, interface, tmp_path):
+    shutil.copytree(config_dir, tmp_path, dirs_exist_ok=True)
+    get_secret_path(tmp_path, interface).chmod(mode=0o600)
+    peers_path = tmp_path / "peers.jsonl"
+    peers_path.write_text(
+        '{"name": "phone"}\n{"name": "laptop", "addresses": ["192.168.10.3/32"]}\n'
+    )
+    result = CliRunner().invoke(
+        add_peers, ["-i", interface, "-c", str(tmp_path), "-f", str(peers_path)]
+    )
+    assert result.exit_code == 0
+
+    wg_wizard = WgWizard.from_dir(tmp_path, interface)
+    assert list(wg_wizard.config.peers) == ["client_0", "phone", "laptop"]
+    assert str(wg_wizard.config.peers["phone"].addresses[0]) == "192.168.10.4/32"
+    wg_wizard.check_secret()
+
+
+def test_add_peer_prompts_without_lock(config_dir, monkeypatch):
+    lock_path = get_lock_path(config_dir, "wg0")
+
+    def prompt(text, default):
+        # the lock is free while the user answers
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        finally:
+            os.close(fd)
+        if text.startswith("Interface.Address"):
+            # another job takes the suggested address meanwhile
+            with WgWizardSession(config_dir, "wg0") as session:
+                session.wg_wizard.config.add_peer(
+                    "phone",
+                    WgWizardPeerConfig(
+                        addresses=[default],
+                        server_allowed_ips=[default],
+                        client_allowed_ips=["0.0.0.0/0"],
+                    ),
+                )
+                session.wg_wizard.secret.generate_peer_secret("phone")
+        return default
+
+    monkeypatch.setattr(click, "prompt", prompt)
+    result = CliRunner().invoke(
+        add_peer, ["-i", "wg0", "-c", str(config_dir), "--name", "laptop"]
+    )
+    assert result.exit_code == 0, result.output
+
+    peers = WgWizard.from_dir(config_dir, "wg0").config.peers
+    assert list(peers) == ["client_0", "phone", "laptop"]
+    assert str(peers["phone"].addresses[0]) == "192.168.10.3/32"
+    assert str(peers["laptop"].addresses[0]) == "192.168.10.4/32"
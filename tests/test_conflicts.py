@@ -0,0 +1,71 @@
+from ipaddress import ip_interface
+
+import pytest
+
+from wg_wizard.conflicts import find_peer_conflicts, PeerConflict
+from wg_wizard.core import WgWizard, WgWizardPeerConfig, WgWizardSession
+from wg_wizard.paths import get_config_path
+
+
+def make_peer_config(addresses, server_allowed_ips=None) -> WgWizardPeerConfig:
+    return WgWizardPeerConfig(
+        addresses=addresses,
+        server_allowed_ips=(
+            addresses if server_allowed_ips is None else server_allowed_ips
+        ),
+        client_allowed_ips=["0.0.0.0/0"],
+    )
+
+
+def test_find_peer_conflicts():
+    server_addresses = [ip_interface("10.0.0.1/24"), ip_interface("fd00::1/64")]
+    peers = [
+        ("a", make_peer_config(["10.0.0.2/32", "fd00::2/128"])),
+        ("b", make_peer_config(["10.0.0.1/32"])),
+        ("c", make_peer_config(["10.0.0.3/32"], ["10.0.0.3/32", "10.1.0.0/16"])),
+        ("d", make_peer_config(["10.0.0.2/32"])),
+        ("e", make_peer_config(["10.0.1.4/32"], ["10.1.2.0/24"])),
+        ("f", make_peer_config(["10.0.0.6/32", "fd00::6/128"])),
+    ]
+    assert find_peer_conflicts(server_addresses, peers) == [
+        PeerConflict("Peer b has the address 10.0.0.1 of the server.", ("b",)),
+        PeerConflict("Peers a and d have the same address 10.0.0.2.", ("a", "d")),
+        PeerConflict(
+            "The address 10.0.1.4 of peer e is outside the addresses of the server.",
+            ("e",),
+        ),
+        PeerConflict(
+            "The server_allowed_ips 10.0.0.2/32 of peer d overlap with 10.0.0.2/32 "
+            "of peer a.",
+            ("a", "d"),
+        ),
+        PeerConflict(
+            "The server_allowed_ips 10.1.2.0/24 of peer e overlap with 10.1.0.0/16 "
+            "of peer c.",
+            ("c", "e"),
+        ),
+    ]
+    assert find_peer_conflicts(server_addresses, [peers[0], peers[-1]]) == []
+
+
+def test_check_conflicts(config_dir):
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    wg_wizard.check()
+    wg_wizard.config.add_peer("phone", make_peer_config(["192.168.10.2/32"]))
+    with pytest.raises(ValueError) as exc_info:
+        wg_wizard.config.check_conflicts()
+    assert str(exc_info.value) == (
+        "Found 2 conflicts in the peer addresses:\n"
+        "- Peers client_0 and phone have the same address 192.168.10.2.\n"
+        "- The server_allowed_ips 192.168.10.2/32 of peer phone overlap with "
+        "192.168.10.2/32 of peer client_0."
+    )
+
+    # a session doesn't write the conflicting peers
+    config_bytes = get_config_path(config_dir, "wg0").read_bytes()
+    with pytest.raises(ValueError):
+        with WgWizardSession(config_dir, "wg0") as session:
+            session.wg_wizard.config.add_peer(
+                "phone", make_peer_config(["192.168.10.2/32"])
+            )
+    assert get_config_path(config_dir, "wg0").read_bytes() == config_bytes
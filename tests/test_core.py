@@ -1,9 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from ipaddress import ip_interface
+import json
 from pathlib import Path
+import pickle
+import stat
 
 import pytest
 
-from wg_wizard.core import WgWizard, export_wg_quick_config_from_files
-from wg_wizard.paths import get_secret_path
+from wg_wizard import utils
+from wg_wizard.cache import PeerRenderCache, SnapshotCache
+from wg_wizard.core import (
+    export_wg_quick_config,
+    export_wg_quick_config_from_files,
+    format_wg_quick_server_config,
+    to_wg_quick_client_config,
+    to_wg_quick_server_config,
+    WgWizard,
+    WgWizardConfig,
+    WgWizardPeerConfig,
+    WgWizardSession,
+    write_wg_quick_server_config,
+)
+from wg_wizard.paths import (
+    get_cache_dir,
+    get_config_path,
+    get_key_cache_path,
+    get_render_cache_path,
+    get_secret_path,
+    get_snapshot_path,
+)
 
 data_dir = Path(__file__).parent / "data"
 
@@ -48,3 +74,354 @@ def test_export_wg_quick_config_from_files(
     assert expected_output_path.read_text() == captured.out
     if update_snapshot:
         pytest.skip("Snapshot updated.")
+
+
+@pytest.mark.parametrize("peer_name", [None, "client_0"])
+def test_trusted_wg_quick_config(peer_name):
+    config_dir = data_dir / "default_with_one_client"
+    get_secret_path(config_dir, "wg0").chmod(mode=0o600)
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+
+    def convert(trusted):
+        if peer_name is None:
+            return to_wg_quick_server_config(wg_wizard, trusted=trusted)
+        return to_wg_quick_client_config(wg_wizard, peer_name, trusted=trusted)
+
+    # the same as the snapshot, which is followed by the QR Code
+    expected_output = (
+        config_dir / "expected_wg_quick_config" / f"wg0_{peer_name}"
+    ).read_text()
+    assert expected_output.startswith(f"{convert(trusted=True).format_ini()}\n")
+
+    # the same peer with different addresses, as the output only needs valid keys
+    peer_config = wg_wizard.config.peers["client_0"]
+    peer_secret = wg_wizard.secret.peers["client_0"]
+    for i in range(1, 1000):
+        address = ip_interface(f"192.168.{10 + i // 250}.{2 + i % 250}/32")
+        wg_wizard.config.peers[f"client_{i}"] = peer_config.model_copy(
+            update={"addresses": [address], "server_allowed_ips": [address]}
+        )
+        wg_wizard.secret.peers[f"client_{i}"] = peer_secret
+    trusted_config = convert(trusted=True)
+    assert trusted_config == convert(trusted=False)
+    assert trusted_config.format_ini() == convert(trusted=False).format_ini()
+
+
+@pytest.mark.parametrize(
+    "config_dir, interface", [(data_dir / "default_with_one_client", "wg0")]
+)
+def test_generate_keys_missing_in_parallel(config_dir, interface):
+    get_secret_path(config_dir, interface).chmod(mode=0o600)
+    wg_wizard = WgWizard.from_dir(config_dir, interface)
+    peer_config = wg_wizard.config.peers["client_0"]
+    new_peers = [f"client_{i}" for i in range(20, 0, -1)]
+    for peer_name in new_peers:
+        wg_wizard.config.add_peer(peer_name, peer_config.model_copy())
+    client_0_secret = wg_wizard.secret.peers["client_0"]
+
+    missing_peers = wg_wizard.generate_keys(missing=True, jobs=4)
+    assert missing_peers == new_peers
+    assert list(wg_wizard.secret.peers) == ["client_0", *new_peers]
+    assert wg_wizard.secret.peers["client_0"] is client_0_secret
+    wg_wizard.check_secret()
+
+
+def test_verified_key_cache(config_dir, monkeypatch):
+    WgWizard.from_dir(config_dir, "wg0", cache=True).check_secret()
+    cache_path = get_key_cache_path(config_dir, "wg0")
+    assert stat.S_IMODE(cache_path.stat().st_mode) == 0o600
+
+    derived = []
+    original_pubkey = utils.pubkey
+
+    def pubkey(private_key):
+        derived.append(private_key)
+        return original_pubkey(private_key)
+
+    monkeypatch.setattr(utils, "pubkey", pubkey)
+    WgWizard.from_dir(config_dir, "wg0", cache=True).check_secret()
+    assert not derived
+
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", cache=True)
+    peer_secret = wg_wizard.secret.generate_peer_secret("client_0")
+    wg_wizard.check_secret()
+    assert derived == [peer_secret.private_key.get_secret_value()]
+
+    derived.clear()
+    WgWizard.from_dir(config_dir, "wg0", cache=False).check_secret()
+    assert len(derived) == 2
+
+
+def test_verified_key_cache_unwritable(config_dir, monkeypatch, caplog):
+    # the cache dir can't be created, like in a read-only config dir
+    get_cache_dir(config_dir).write_text("")
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", cache=True)
+    wg_wizard.check_secret()
+    assert "Failed to write the cache" in caplog.text
+    assert wg_wizard._key_cache.path is None
+
+    # the verified keys are still remembered in memory
+    monkeypatch.setattr(utils, "pubkey", None)
+    wg_wizard.check_secret()
+
+
+@pytest.mark.parametrize(
+    "config_dir, interface", [(data_dir / "default_with_one_client", "wg0")]
+)
+def test_find_next_available_addresses(config_dir, interface):
+    get_secret_path(config_dir, interface).chmod(mode=0o600)
+    config = WgWizard.from_dir(config_dir, interface).config
+    assert str(config.find_next_available_interface()) == "192.168.10.3/32"
+    config.addresses.append(ip_interface("fd00::1/120"))
+    config.reserved_addresses = ["192.168.10.0/30", "192.168.10.4"]
+    assert config.find_next_available_addresses(2) == [
+        [ip_interface("192.168.10.5"), ip_interface("fd00::2")],
+        [ip_interface("192.168.10.6"), ip_interface("fd00::3")],
+    ]
+
+    # the allocator is kept and updated by add_peer
+    allocator = config.get_address_allocator()
+    config.add_peer(
+        "client_1",
+        WgWizardPeerConfig(
+            addresses=["192.168.10.5/32"],
+            server_allowed_ips=["192.168.10.5/32"],
+            client_allowed_ips=["0.0.0.0/0"],
+        ),
+    )
+    assert config.get_address_allocator() is allocator
+    assert config.find_next_available_addresses(1) == [
+        [ip_interface("192.168.10.6"), ip_interface("fd00::2")],
+    ]
+    # rebuilt if the peers are changed directly
+    del config.peers["client_1"]
+    assert config.get_address_allocator() is not allocator
+    assert config.find_next_available_interface() == ip_interface("192.168.10.5")
+
+
+def test_find_next_available_addresses_changed_peers(config_dir):
+    config = WgWizard.from_dir(config_dir, "wg0").config
+    client_0 = config.peers["client_0"]
+    assert config.find_next_available_interface() == ip_interface("192.168.10.3")
+
+    # the address of a peer edited in place is taken, and its old address is free
+    client_0.addresses[0] = ip_interface("192.168.10.3/32")
+    assert config.find_next_available_addresses(2) == [
+        [ip_interface("192.168.10.2")],
+        [ip_interface("192.168.10.4")],
+    ]
+    client_0.addresses = [ip_interface("192.168.10.2/32")]
+    assert config.find_next_available_interface() == ip_interface("192.168.10.3")
+
+    # a replaced peer
+    config.peers["client_0"] = client_0.model_copy(
+        update={"addresses": [ip_interface("192.168.10.3/32")]}
+    )
+    assert config.find_next_available_addresses(2) == [
+        [ip_interface("192.168.10.2")],
+        [ip_interface("192.168.10.4")],
+    ]
+
+
+@pytest.mark.parametrize(
+    "config_dir, interface", [(data_dir / "default_with_one_client", "wg0")]
+)
+def test_write_wg_quick_server_config(config_dir, interface, capsys):
+    get_secret_path(config_dir, interface).chmod(mode=0o600)
+    wg_wizard = WgWizard.from_dir(config_dir, interface)
+    peer_config = wg_wizard.config.peers["client_0"]
+    for i in range(1, 100):
+        wg_wizard.config.add_peer(f"client_{i}", peer_config.model_copy())
+    wg_wizard.generate_keys(missing=True)
+    expected = to_wg_quick_server_config(wg_wizard).format_ini()
+
+    output = StringIO()
+    write_wg_quick_server_config(wg_wizard, output)
+    assert output.getvalue() == expected
+
+    export_wg_quick_config(
+        wg_wizard, text=True, qrcode=False, invert_qrcode=False, peer_name=None
+    )
+    assert capsys.readouterr().out == expected + "\n"
+
+
+def test_snapshot_cache(config_dir, monkeypatch):
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", cache=True, read_only=True)
+    snapshot_path = get_snapshot_path(config_dir, "wg0")
+    assert stat.S_IMODE(snapshot_path.stat().st_mode) == 0o600
+
+    def from_files(*args):
+        raise AssertionError("The snapshot is not used.")
+
+    with monkeypatch.context() as m:
+        m.setattr(WgWizard, "from_files", from_files)
+        loaded = WgWizard.from_dir(config_dir, "wg0", cache=True, read_only=True)
+        assert loaded.model_dump() == wg_wizard.model_dump()
+
+    # invalidated by any change in the files
+    config_path = get_config_path(config_dir, "wg0")
+    config_path.write_text(config_path.read_text().replace("51820", "51821"))
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", cache=True, read_only=True)
+    assert wg_wizard.config.listen_port == 51821
+    wg_wizard.check_secret()
+
+    # a broken snapshot is ignored
+    snapshot_path.write_bytes(b"broken")
+    loaded = WgWizard.from_dir(config_dir, "wg0", cache=True, read_only=True)
+    assert loaded.model_dump() == wg_wizard.model_dump()
+
+
+def test_snapshot_cache_unwritable(config_dir, caplog):
+    # the cache dir can't be created, like in a read-only config dir
+    get_cache_dir(config_dir).write_text("")
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", cache=True, read_only=True)
+    assert "Failed to write the snapshot" in caplog.text
+    assert list(wg_wizard.config.peers) == ["client_0"]
+    wg_wizard.check_secret()
+
+
+def test_snapshot_cache_versions(config_dir):
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", compact=True)
+    wg_wizard.config.find_next_available_addresses()
+    format_wg_quick_server_config(wg_wizard)
+    modules = set()
+
+    class ModuleRecorder(pickle.Unpickler):
+        def find_class(self, module, name):
+            modules.add(module)
+            return super().find_class(module, name)
+
+    # every module whose classes end up in the snapshot invalidates it
+    ModuleRecorder(BytesIO(pickle.dumps(wg_wizard))).load()
+    assert "wg_wizard.peer_table" in modules
+    assert {module for module in modules if module.startswith("wg_wizard.")} <= {
+        f"wg_wizard.{Path(module_file).stem}"
+        for module_file in SnapshotCache.module_files
+    }
+
+
+@pytest.mark.parametrize(
+    "config_dir, interface", [(data_dir / "default_with_one_client", "wg0")]
+)
+def test_config_from_file_read_only(config_dir, interface):
+    config_path = get_config_path(config_dir, interface)
+    config = WgWizardConfig.from_file(config_path)
+    read_only_config = WgWizardConfig.from_file(config_path, read_only=True)
+    assert read_only_config == WgWizardConfig.model_validate(config.model_dump())
+    assert config._yaml is not None
+    assert read_only_config._yaml is None
+
+
+def add_peer_in_session(config_dir, name):
+    with WgWizardSession(config_dir, "wg0") as session:
+        config = session.wg_wizard.config
+        addresses = config.find_next_available_addresses()[0]
+        config.add_peer(
+            name,
+            WgWizardPeerConfig(
+                addresses=addresses,
+                server_allowed_ips=addresses,
+                client_allowed_ips=["0.0.0.0/0"],
+            ),
+        )
+        session.wg_wizard.secret.generate_peer_secret(name)
+
+
+def test_session(config_dir):
+
+    # the concurrent sessions wait for each other, so no peers are lost
+    names = [f"client_{i}" for i in range(1, 9)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda name: add_peer_in_session(config_dir, name), names))
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    assert set(wg_wizard.config.peers) == {"client_0", *names}
+    wg_wizard.check_secret()
+    addresses = [peer.addresses[0] for peer in wg_wizard.config.peers.values()]
+    assert len(set(addresses)) == len(addresses)
+
+    # nothing is written if the session fails
+    config_bytes = get_config_path(config_dir, "wg0").read_bytes()
+    with pytest.raises(RuntimeError):
+        with WgWizardSession(config_dir, "wg0") as session:
+            session.wg_wizard.config.peers.pop("client_1")
+            raise RuntimeError()
+    assert get_config_path(config_dir, "wg0").read_bytes() == config_bytes
+    secret_path = get_secret_path(config_dir, "wg0")
+    assert stat.S_IMODE(secret_path.stat().st_mode) == 0o600
+    assert sorted(path.name for path in config_dir.iterdir()) == [
+        ".wg0.lock",
+        "expected_wg_quick_config",
+        "wg0.yml",
+        "wg0_secret.json",
+    ]
+
+
+def test_render_cache(config_dir):
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", cache=True)
+    expected = to_wg_quick_server_config(wg_wizard).format_ini()
+    assert format_wg_quick_server_config(wg_wizard) == expected
+    render_cache_path = get_render_cache_path(config_dir, "wg0")
+    assert stat.S_IMODE(render_cache_path.stat().st_mode) == 0o600
+
+    # the blocks are reused by another process
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", cache=True)
+    output = StringIO()
+    write_wg_quick_server_config(wg_wizard, output)
+    assert output.getvalue() == expected
+    assert (wg_wizard._render_cache.hits, wg_wizard._render_cache.misses) == (1, 0)
+
+    # a changed peer is rendered again
+    wg_wizard.config.peers["client_0"].server_allowed_ips = ["192.168.10.2/31"]
+    expected = to_wg_quick_server_config(wg_wizard).format_ini()
+    assert "192.168.10.2/31" in expected
+    assert format_wg_quick_server_config(wg_wizard) == expected
+    assert (wg_wizard._render_cache.hits, wg_wizard._render_cache.misses) == (1, 1)
+
+
+def test_render_cache_drops_stale_blocks(config_dir):
+    render_cache_path = get_render_cache_path(config_dir, "wg0")
+    format_wg_quick_server_config(WgWizard.from_dir(config_dir, "wg0", cache=True))
+    # the same blocks are rendered again in a long-running process
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", cache=True)
+    format_wg_quick_server_config(wg_wizard)
+    old_secret = wg_wizard.secret.peers["client_0"]
+    old_preshared_key = old_secret.preshared_key.get_secret_value()
+    assert old_preshared_key in render_cache_path.read_text()
+
+    # the preshared key of a rotated key isn't kept
+    new_secret = wg_wizard.secret.generate_peer_secret("client_0")
+    format_wg_quick_server_config(wg_wizard)
+    cached = render_cache_path.read_text()
+    assert old_preshared_key not in cached
+    assert new_secret.preshared_key.get_secret_value() in cached
+
+    # nor the block of a deleted peer
+    del wg_wizard.config.peers["client_0"]
+    del wg_wizard.secret.peers["client_0"]
+    format_wg_quick_server_config(wg_wizard)
+    assert json.loads(render_cache_path.read_text())["blocks"] == {}
+
+
+def test_render_cache_unwritable(config_dir, caplog):
+    # the cache dir can't be created, like in a read-only config dir
+    get_cache_dir(config_dir).write_text("")
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", cache=True)
+    expected = to_wg_quick_server_config(wg_wizard).format_ini()
+    assert format_wg_quick_server_config(wg_wizard) == expected
+    assert "Failed to write the cache" in caplog.text
+    # the blocks are still reused in memory
+    assert format_wg_quick_server_config(wg_wizard) == expected
+    assert (wg_wizard._render_cache.hits, wg_wizard._render_cache.misses) == (1, 1)
+
+
+def test_no_render_cache_by_default():
+    config_dir = data_dir / "default_with_one_client"
+    get_secret_path(config_dir, "wg0").chmod(mode=0o600)
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    output = StringIO()
+    write_wg_quick_server_config(wg_wizard, output)
+    assert output.getvalue() == to_wg_quick_server_config(wg_wizard).format_ini()
+    # the blocks aren't kept, so streaming doesn't take memory per peer
+    assert wg_wizard._render_cache is None
+    # the blocks depend on how the AllowedIPs are collapsed
+    assert "routes.py" in PeerRenderCache.get_versions()
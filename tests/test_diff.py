@@ -0,0 +1,63 @@
+import json
+
+from click.testing import CliRunner
+
+from wg_wizard.cli import diff_server_config
+from wg_wizard.core import to_wg_quick_server_config, WgWizard
+
+OTHER_PUBLIC_KEY = "hSDwCYkwp1R0i33ctD73Wg2/Og0mOBr066SpjqqbTmo="
+
+
+def test_diff_server_config(config_dir, tmp_path):
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    wg_quick_config = to_wg_quick_server_config(wg_wizard)
+    old_path = tmp_path / "wg0.conf"
+    old_path.write_text(wg_quick_config.format_ini())
+    args = ["-i", "wg0", "-c", str(config_dir), "--old", str(old_path)]
+
+    result = CliRunner().invoke(diff_server_config, args)
+    assert result.exit_code == 0
+    assert result.output == ""
+
+    # the old config has a different port, an extra peer and a different client_0
+    wg_quick_config.interface.listen_port = 51821
+    wg_quick_config.peer[0].allowed_ips = ["192.168.10.3/32"]
+    wg_quick_config.peer[0].preshared_key = None
+    removed_peer = wg_quick_config.peer[0].model_copy(
+        update={"comment": None, "public_key": OTHER_PUBLIC_KEY}
+    )
+    wg_quick_config.peer.append(removed_peer)
+    old_path.write_text(wg_quick_config.format_ini())
+    wg_wizard.config.add_peer("client_1", wg_wizard.config.peers["client_0"])
+    wg_wizard.secret.generate_peer_secret("client_1")
+    wg_wizard.dump(config_dir, "wg0")
+    client_1_public_key = wg_wizard.secret.peers["client_1"].public_key
+
+    result = CliRunner().invoke(diff_server_config, [*args, "--format", "json"])
+    assert result.exit_code == 1
+    assert json.loads(result.output) == {
+        "interface": {"ListenPort": {"old": 51821, "new": 51820}},
+        "added": [{"name": "client_1", "public_key": client_1_public_key}],
+        "removed": [{"name": None, "public_key": OTHER_PUBLIC_KEY}],
+        "changed": [
+            {
+                "name": "client_0",
+                "public_key": wg_wizard.secret.peers["client_0"].public_key,
+                "changes": {
+                    "PresharedKey": {"old": None, "new": "(hidden)"},
+                    "AllowedIPs": {
+                        "old": ["192.168.10.3/32"],
+                        "new": ["192.168.10.2/32"],
+                    },
+                },
+            }
+        ],
+    }
+
+    result = CliRunner().invoke(diff_server_config, args)
+    assert result.exit_code == 1
+    assert result.output.splitlines()[:3] == [
+        "~ [Interface]",
+        "    ListenPort: 51821 -> 51820",
+        f"+ [Peer] client_1 ({client_1_public_key})",
+    ]
@@ -0,0 +1,76 @@
+from io import BytesIO
+from pathlib import Path
+import stat
+import tarfile
+
+import pytest
+
+from wg_wizard.core import to_wg_quick_client_config, WgWizard
+from wg_wizard.export import (
+    iter_client_files,
+    select_peers,
+    write_client_files_to_dir,
+    write_client_files_to_tar,
+)
+from wg_wizard.paths import get_secret_path
+
+data_dir = Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def wg_wizard():
+    config_dir = data_dir / "default_with_one_client"
+    get_secret_path(config_dir, "wg0").chmod(mode=0o600)
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    peer_config = wg_wizard.config.peers["client_0"]
+    for name in ["phone_1", "phone_2", "laptop_1"]:
+        wg_wizard.config.add_peer(name, peer_config.model_copy())
+    wg_wizard.generate_keys(missing=True)
+    return wg_wizard
+
+
+def test_select_peers(wg_wizard):
+    assert select_peers(wg_wizard) == ["client_0", "phone_1", "phone_2", "laptop_1"]
+    assert select_peers(wg_wizard, ["phone_*", "laptop_1"]) == [
+        "phone_1",
+        "phone_2",
+        "laptop_1",
+    ]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_write_client_files_to_dir(wg_wizard, jobs, tmp_path):
+    peer_names = select_peers(wg_wizard)
+    files = iter_client_files(wg_wizard, peer_names, ["png", "svg"], jobs=jobs)
+    write_client_files_to_dir(files, tmp_path / "clients")
+    assert sorted(path.name for path in (tmp_path / "clients").iterdir()) == sorted(
+        f"{name}.{ext}" for name in peer_names for ext in ["conf", "png", "svg"]
+    )
+    for name in peer_names:
+        conf_path = tmp_path / "clients" / f"{name}.conf"
+        assert stat.S_IMODE(conf_path.stat().st_mode) == 0o600
+        expected = to_wg_quick_client_config(wg_wizard, name).format_ini() + "\n"
+        assert conf_path.read_text() == expected
+        png = (tmp_path / "clients" / f"{name}.png").read_bytes()
+        assert png.startswith(b"\x89PNG\r\n\x1a\n")
+
+    expected_client_0 = (
+        data_dir / "default_with_one_client/expected_wg_quick_config/wg0_client_0"
+    ).read_text()
+    assert expected_client_0.startswith(
+        (tmp_path / "clients" / "client_0.conf").read_text()
+    )
+
+
+def test_write_client_files_to_tar(wg_wizard):
+    output = BytesIO()
+    files = iter_client_files(wg_wizard, ["phone_1", "phone_2"], jobs=2)
+    write_client_files_to_tar(files, output)
+    output.seek(0)
+    with tarfile.open(fileobj=output) as tar:
+        members = tar.getmembers()
+        assert [member.name for member in members] == ["phone_1.conf", "phone_2.conf"]
+        assert all(member.mode == 0o600 for member in members)
+        assert tar.extractfile("phone_2.conf").read().decode() == (
+            to_wg_quick_client_config(wg_wizard, "phone_2").format_ini() + "\n"
+        )
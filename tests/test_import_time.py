@@ -0,0 +1,64 @@
+from pathlib import Path
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+data_dir = Path(__file__).parent / "data"
+
+# modules which must not be imported by a command, either because the command
+# doesn't need them or because they are only needed when the cache misses
+LIGHT_MODULES = {"qrcode", "tarfile", "concurrent.futures", "subprocess"}
+FORBIDDEN_MODULES = {
+    ("--help",): LIGHT_MODULES | {"pydantic", "ruamel.yaml", "importlib.metadata"},
+    ("check", "-i", "wg0"): LIGHT_MODULES | {"ruamel.yaml"},
+    ("export-server-config", "-i", "wg0"): LIGHT_MODULES | {"ruamel.yaml"},
+}
+# the total import time in seconds, which is about 5 times of the time on a laptop
+IMPORT_TIME_BUDGETS = {
+    ("--help",): 0.5,
+    ("check", "-i", "wg0"): 1.5,
+    ("export-server-config", "-i", "wg0"): 1.5,
+}
+
+
+def get_import_times(args, cwd) -> dict[str, int]:
+    """Run the CLI with ``-X importtime`` and return the self time of each module in μs."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "wg_wizard", *args],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, _, name = line[len("import time:") :].split("|")
+        import_times[name.strip()] = int(self_time)
+    return import_times
+
+
+@pytest.fixture(scope="module")
+def config_dir(tmp_path_factory):
+    config_dir = tmp_path_factory.mktemp("config") / "config"
+    shutil.copytree(data_dir / "default_with_one_client", config_dir)
+    (config_dir / "wg0_secret.json").chmod(0o600)
+    # warm up the caches so that the commands below take the fast path
+    subprocess.run(
+        [sys.executable, "-m", "wg_wizard", "check", "-i", "wg0"],
+        cwd=config_dir,
+        capture_output=True,
+        check=True,
+    )
+    return config_dir
+
+
+@pytest.mark.parametrize("args", list(FORBIDDEN_MODULES))
+def test_import_time(config_dir, args):
+    import_times = get_import_times(args, config_dir)
+    assert "wg_wizard.cli" in import_times
+    assert FORBIDDEN_MODULES[args].isdisjoint(import_times)
+    assert sum(import_times.values()) / 1e6 < IMPORT_TIME_BUDGETS[args]
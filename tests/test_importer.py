@@ -0,0 +1,72 @@
+from io import StringIO
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from wg_wizard.cli import import_configs
+from wg_wizard.core import (
+    to_wg_quick_client_config,
+    to_wg_quick_server_config,
+    WgWizard,
+)
+from wg_wizard.importer import import_wg_quick_configs, to_peer_name
+from wg_wizard.paths import get_secret_path
+
+data_dir = Path(__file__).parent / "data"
+
+
+def load_fixture():
+    config_dir = data_dir / "default_with_one_client"
+    get_secret_path(config_dir, "wg0").chmod(mode=0o600)
+    return WgWizard.from_dir(config_dir, "wg0")
+
+
+def test_import_server_and_client_configs(tmp_path):
+    wg_wizard = load_fixture()
+    server_path = tmp_path / "wg0.conf"
+    server_path.write_text(to_wg_quick_server_config(wg_wizard).format_ini())
+    client_path = tmp_path / "phone.conf"
+    client_path.write_text(
+        to_wg_quick_client_config(wg_wizard, "client_0").format_ini()
+    )
+
+    config_dir = tmp_path / "config"
+    config_dir.mkdir()
+    result = CliRunner().invoke(
+        import_configs,
+        ["-i", "wg0", "-c", str(config_dir), "-s", str(server_path)]
+        + ["--client", str(client_path)],
+    )
+    assert result.exit_code == 0, result.output
+
+    imported = WgWizard.from_dir(config_dir, "wg0")
+    imported.check_secret()
+    # the peer name comes from the comment instead of the file name
+    assert imported.config.model_dump() == wg_wizard.config.model_dump()
+    exclude = {"issued_on": True, "peers": {"client_0": {"issued_on"}}}
+    assert imported.secret.model_dump(exclude=exclude) == wg_wizard.secret.model_dump(
+        exclude=exclude
+    )
+
+
+def test_import_server_config_without_clients():
+    wg_wizard = load_fixture()
+    server_ini = to_wg_quick_server_config(wg_wizard).format_ini()
+    server_ini = server_ini.replace("# client_0", "# Alice's phone")
+    server_ini += "\n\n[Peer]\nPublicKey = abc\nAllowedIPs = 192.168.20.0/24\n"
+
+    imported = import_wg_quick_configs(
+        "wg0", StringIO(server_ini), {}, default_endpoint="example.com:51820"
+    )
+    assert list(imported.config.peers) == ["Alice_s_phone", "peer_1"]
+    peer_config = imported.config.peers["peer_1"]
+    assert [str(ip) for ip in peer_config.addresses] == ["192.168.20.0/24"]
+    assert [str(ip) for ip in peer_config.client_allowed_ips] == ["0.0.0.0/0", "::/0"]
+    assert imported.secret.peers == {}
+
+
+def test_to_peer_name():
+    used_names = set()
+    assert to_peer_name("phone", used_names) == "phone"
+    assert to_peer_name(" phone ", used_names) == "phone_2"
+    assert to_peer_name("#!", used_names) == "peer"
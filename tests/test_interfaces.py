@@ -0,0 +1,109 @@
+from ipaddress import ip_network
+from pathlib import Path
+import shutil
+
+from click.testing import CliRunner
+import pytest
+
+from wg_wizard.cli import check, export_client_configs, export_server_config
+from wg_wizard.interfaces import (
+    check_interface,
+    find_interface_conflicts,
+    InterfaceSummary,
+    run_on_interfaces,
+)
+from wg_wizard.paths import discover_interfaces, get_config_path, get_secret_path
+
+data_dir = Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def config_dir(tmp_path):
+    """Make wg0 and a copy of it named wg1 with another port and address pool."""
+    config_dir = tmp_path / "config"
+    shutil.copytree(data_dir / "default_with_one_client", config_dir)
+    shutil.rmtree(config_dir / "expected_wg_quick_config")
+    config = get_config_path(config_dir, "wg0").read_text()
+    get_config_path(config_dir, "wg1").write_text(
+        config.replace("name: wg0", "name: wg1")
+        .replace("51820", "51821")
+        .replace("192.168.10.", "192.168.11.")
+    )
+    shutil.copy(get_secret_path(config_dir, "wg0"), get_secret_path(config_dir, "wg1"))
+    for interface in ("wg0", "wg1"):
+        get_secret_path(config_dir, interface).chmod(mode=0o600)
+    # a config without a secret is not an interface
+    get_config_path(config_dir, "wg2").write_text(config)
+    return config_dir
+
+
+def test_discover_interfaces(config_dir):
+    assert discover_interfaces(config_dir) == ["wg0", "wg1"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_run_on_interfaces(config_dir, jobs):
+    get_secret_path(config_dir, "wg1").write_text("{}")
+    results = run_on_interfaces(check_interface, config_dir, ["wg0", "wg1"], jobs=jobs)
+    assert results[0].summary == InterfaceSummary(
+        "wg0", 51820, [ip_network("192.168.10.0/24")], 1
+    )
+    assert results[1].interface == "wg1"
+    assert results[1].summary is None
+    assert "ValidationError" in results[1].error
+
+
+def test_find_interface_conflicts():
+    def summary(name, listen_port, *networks):
+        return InterfaceSummary(name, listen_port, list(map(ip_network, networks)), 0)
+
+    assert not find_interface_conflicts(
+        [
+            summary("wg0", 51820, "10.0.0.0/24", "fd00::/64"),
+            summary("wg1", 51821, "10.0.1.0/24", "fd00:0:0:1::/64"),
+            # the pools of the same interface may overlap
+            summary("wg2", 51822, "10.1.0.0/16", "10.1.2.0/24"),
+        ]
+    )
+    assert find_interface_conflicts(
+        [
+            summary("wg0", 51820, "10.0.0.0/16", "10.2.0.0/24"),
+            summary("wg1", 51820, "10.1.0.0/24", "10.2.0.0/30"),
+            summary("wg2", 51822, "10.0.0.0/8"),
+        ]
+    ) == [
+        "wg1 and wg0 use the same listen port 51820.",
+        "The address pool 10.0.0.0/16 of wg0 overlaps with 10.0.0.0/8 of wg2.",
+        "The address pool 10.1.0.0/24 of wg1 overlaps with 10.0.0.0/8 of wg2.",
+        "The address pool 10.2.0.0/24 of wg0 overlaps with 10.0.0.0/8 of wg2.",
+        "The address pool 10.2.0.0/30 of wg1 overlaps with 10.0.0.0/8 of wg2.",
+        "The address pool 10.2.0.0/30 of wg1 overlaps with 10.2.0.0/24 of wg0.",
+    ]
+
+
+def test_all_interfaces_cli(config_dir, tmp_path):
+    runner = CliRunner()
+    # the interface isn't prompted
+    result = runner.invoke(check, ["-c", str(config_dir), "--all-interfaces"])
+    assert result.exit_code == 0
+
+    output_dir = tmp_path / "output"
+    result = runner.invoke(
+        export_server_config,
+        ["-c", str(config_dir), "--all-interfaces", "-o", str(output_dir)],
+    )
+    assert result.exit_code == 0
+    server_config = (output_dir / "wg1.conf").read_text()
+    assert "ListenPort = 51821" in server_config
+    # the same as the output of a single interface
+    result = runner.invoke(export_server_config, ["-c", str(config_dir), "-i", "wg1"])
+    assert result.exit_code == 0
+    assert result.output == server_config
+
+    result = runner.invoke(
+        export_client_configs,
+        ["-c", str(config_dir), "--all-interfaces", "--all", "-o", str(output_dir)],
+    )
+    assert result.exit_code == 0
+    assert "192.168.11.2/32" in (output_dir / "wg1" / "client_0.conf").read_text()
+    assert (output_dir / "wg0" / "client_0.conf").stat().st_mode & 0o777 == 0o600
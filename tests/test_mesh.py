@@ -0,0 +1,80 @@
+from ipaddress import ip_interface
+
+import pytest
+
+from wg_wizard.core import to_wg_quick_client_config, WgWizard, WgWizardMeshConfig
+from wg_wizard.mesh import iter_wg_quick_mesh_configs, MeshTopology
+from wg_wizard.wg_quick import read_ini
+
+
+@pytest.fixture
+def wg_wizard(config_dir):
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    peer_config = wg_wizard.config.peers["client_0"]
+    peers = {
+        "site_1": ["sites"],
+        "site_2": ["sites"],
+        "laptop_1": ["laptops"],
+        "laptop_2": ["laptops", "admins"],
+        "phone_1": [],
+    }
+    for i, (name, groups) in enumerate(peers.items(), 3):
+        address = ip_interface(f"192.168.10.{i}/32")
+        wg_wizard.config.add_peer(
+            name,
+            peer_config.model_copy(
+                update={
+                    "addresses": [address],
+                    "server_allowed_ips": [address],
+                    "groups": groups,
+                    "mesh_endpoint": f"{name}.example.com:51820",
+                }
+            ),
+        )
+    wg_wizard.config.meshes = [
+        WgWizardMeshConfig(groups=["sites"]),
+        WgWizardMeshConfig(groups=["sites", "laptops"], topology="partial"),
+        WgWizardMeshConfig(groups=["admins", "laptops"]),
+    ]
+    wg_wizard.generate_keys(missing=True)
+    return wg_wizard
+
+
+def test_mesh_topology(wg_wizard):
+    topology = MeshTopology(wg_wizard)
+    assert topology.get_nodes() == ["site_1", "site_2", "laptop_1", "laptop_2"]
+    assert topology.get_neighbors("site_1") == ["site_2", "laptop_1", "laptop_2"]
+    assert topology.get_neighbors("laptop_1") == ["site_1", "site_2", "laptop_2"]
+    assert topology.get_neighbors("phone_1") == []
+
+    wg_wizard.config.meshes = wg_wizard.config.meshes[1:2]
+    # the laptops only connect to the sites in a partial mesh
+    assert topology.get_neighbors("laptop_1") == ["site_1", "site_2", "laptop_2"]
+    topology = MeshTopology(wg_wizard)
+    assert topology.get_neighbors("laptop_1") == ["site_1", "site_2"]
+    assert topology.get_neighbors("site_1") == ["laptop_1", "laptop_2"]
+
+
+def test_iter_wg_quick_mesh_configs(wg_wizard):
+    configs = dict(iter_wg_quick_mesh_configs(wg_wizard))
+    assert list(configs) == ["site_1", "site_2", "laptop_1", "laptop_2"]
+    config = read_ini(configs["site_1"].splitlines())
+    client_config = to_wg_quick_client_config(wg_wizard, "site_1")
+    assert config.interface == client_config.interface
+    assert config.peer[0] == client_config.peer[0]
+    assert [peer.comment for peer in config.peer[1:]] == [
+        "site_2",
+        "laptop_1",
+        "laptop_2",
+    ]
+    site_2 = config.peer[1]
+    assert site_2.public_key == wg_wizard.secret.peers["site_2"].public_key
+    assert site_2.endpoint == "site_2.example.com:51820"
+    assert [str(ip) for ip in site_2.allowed_ips] == ["192.168.10.4/32"]
+    # the block of a node is the same in the configs of all its neighbors
+    block = configs["site_1"].split("\n\n")[2]
+    assert all(block in configs[name] for name in ["site_1", "laptop_1", "laptop_2"])
+
+    assert [name for name, _ in iter_wg_quick_mesh_configs(wg_wizard, ["site_2"])] == [
+        "site_2"
+    ]
@@ -0,0 +1,81 @@
+from ipaddress import ip_address, ip_interface
+
+import pytest
+
+from wg_wizard.core import format_wg_quick_server_config, WgWizard
+from wg_wizard.paths import get_config_path
+from wg_wizard.peer_table import (
+    pack_addresses,
+    pack_interfaces,
+    PeerTable,
+    unpack_addresses,
+    unpack_interfaces,
+)
+
+
+def test_pack_addresses():
+    interfaces = list(map(ip_interface, ["10.0.0.1/24", "0.0.0.0/0", "fd00::2/64"]))
+    assert unpack_interfaces(pack_interfaces(interfaces)) == interfaces
+    assert unpack_interfaces(b"") == []
+    addresses = list(map(ip_address, ["1.1.1.1", "2606:4700::1111"]))
+    assert unpack_addresses(pack_addresses(addresses)) == addresses
+
+
+def test_peer_table(config_dir):
+    config = WgWizard.from_dir(config_dir, "wg0").config
+    peer_config = config.peers["client_0"]
+    for i in range(1, 4):
+        address = ip_interface(f"192.168.10.{2 + i}/32")
+        config.add_peer(
+            f"client_{i}",
+            peer_config.model_copy(
+                update={"addresses": [address], "server_allowed_ips": [address]}
+            ),
+        )
+    peers = dict(config.peers)
+    table = PeerTable.from_dict(peers)
+    assert table == peers
+    assert list(table) == list(peers)
+    assert table["client_1"].model_fields_set == peers["client_1"].model_fields_set
+    # the equal values are stored once
+    columns = table._columns
+    assert columns["client_allowed_ips"][0] is columns["client_allowed_ips"][3]
+    assert columns["pre_up"][0] is columns["pre_up"][3]
+
+    # a changed model must be set again
+    changed = table["client_2"]
+    changed.client_persistent_keepalive = 10
+    assert table["client_2"].client_persistent_keepalive == 25
+    table["client_2"] = changed
+    assert table["client_2"].client_persistent_keepalive == 10
+    del table["client_1"]
+    assert list(table) == ["client_0", "client_2", "client_3"]
+    assert table["client_3"] == peers["client_3"]
+    with pytest.raises(KeyError):
+        table["client_1"]
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_compact_config(config_dir, cache, tmp_path):
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", read_only=True)
+    expected = format_wg_quick_server_config(wg_wizard)
+    compact_wg_wizard = WgWizard.from_dir(
+        config_dir, "wg0", cache=cache, read_only=True, compact=True
+    )
+    assert isinstance(compact_wg_wizard.config.peers, PeerTable)
+    assert compact_wg_wizard.config.peers == wg_wizard.config.peers
+    assert format_wg_quick_server_config(compact_wg_wizard) == expected
+
+    # dumped the same as the peer models
+    (tmp_path / "compact").mkdir()
+    (tmp_path / "models").mkdir()
+    compact_wg_wizard.dump(tmp_path / "compact", "wg0")
+    wg_wizard.dump(tmp_path / "models", "wg0")
+    assert (
+        get_config_path(tmp_path / "compact", "wg0").read_text()
+        == get_config_path(tmp_path / "models", "wg0").read_text()
+    )
+
+    # the cached snapshot is converted back
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", cache=cache, read_only=True)
+    assert isinstance(wg_wizard.config.peers, dict)
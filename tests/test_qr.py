@@ -0,0 +1,56 @@
+from qrcode import QRCode
+from qrcode.constants import ERROR_CORRECT_H, ERROR_CORRECT_L
+
+from wg_wizard import qr
+from wg_wizard.qr import make_qrcode, QrCodeCache
+
+SHORT_DATA = "[Interface]\nPrivateKey=aOIX/aK1w2Ig2s8Vvz7tU7CJ+22iT8Fsd/z3mbdhGn8="
+
+
+def test_make_qrcode():
+    data = SHORT_DATA * 5
+    smallest = QRCode(error_correction=ERROR_CORRECT_L)
+    smallest.add_data(data)
+    qrcode = make_qrcode(data)
+    assert qrcode.version == smallest.best_fit()
+    assert len(qrcode.get_matrix()) == len(QRCode(version=qrcode.version).get_matrix())
+
+    # the error correction is increased as long as the version is the same
+    qrcode = make_qrcode("a")
+    assert (qrcode.version, qrcode.error_correction) == (1, ERROR_CORRECT_H)
+
+
+def test_qrcode_cache(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "qrcodes"
+    png = QrCodeCache(cache_dir).get_or_render(SHORT_DATA, "png", "phone")
+    assert png.startswith(b"\x89PNG")
+    assert sorted(path.name for path in cache_dir.iterdir()) == [
+        "phone.png",
+        "phone.png.sha256",
+    ]
+    assert all(path.stat().st_mode & 0o777 == 0o600 for path in cache_dir.iterdir())
+
+    def render_qrcode_image(data, image_format):
+        raise AssertionError("The cache is not used.")
+
+    with monkeypatch.context() as m:
+        m.setattr(qr, "render_qrcode_image", render_qrcode_image)
+        assert QrCodeCache(cache_dir).get_or_render(SHORT_DATA, "png", "phone") == png
+
+    # a changed config replaces the image
+    cache = QrCodeCache(cache_dir)
+    new_png = cache.get_or_render(SHORT_DATA + "=", "png", "phone")
+    assert new_png != png
+    assert (cache_dir / "phone.png").read_bytes() == new_png
+    assert len(list(cache_dir.iterdir())) == 2
+
+
+def test_qrcode_cache_unwritable(tmp_path, caplog):
+    # the cache dir can't be created, like in a read-only config dir
+    (tmp_path / "cache").write_text("")
+    cache = QrCodeCache(tmp_path / "cache" / "qrcodes")
+    png = cache.get_or_render(SHORT_DATA, "png", "phone")
+    assert png.startswith(b"\x89PNG")
+    assert "Failed to write the cache" in caplog.text
+    assert cache.cache_dir is None
+    assert cache.get_or_render(SHORT_DATA, "png", "phone") == png
@@ -0,0 +1,141 @@
+from ipaddress import ip_interface, ip_network
+
+from click.testing import CliRunner
+from pydantic import ValidationError
+import pytest
+
+from wg_wizard.cli import allowed_ips
+from wg_wizard.core import (
+    to_wg_quick_client_config,
+    to_wg_quick_server_config,
+    WgWizard,
+    WgWizardPeerConfig,
+)
+from wg_wizard.routes import (
+    collapse_allowed_ips,
+    merge_ranges,
+    resolve_allowed_ips,
+    subtract_ranges,
+)
+
+
+def test_merge_and_subtract_ranges():
+    assert merge_ranges([(5, 9), (0, 2), (3, 4), (8, 12), (20, 20)]) == [
+        (0, 12),
+        (20, 20),
+    ]
+    assert subtract_ranges([(0, 9), (20, 29)], [(0, 1), (5, 5), (8, 21), (29, 40)]) == [
+        (2, 4),
+        (6, 7),
+        (22, 28),
+    ]
+    assert subtract_ranges([(0, 9)], []) == [(0, 9)]
+    assert subtract_ranges([(0, 9)], [(0, 9)]) == []
+
+
+@pytest.mark.parametrize(
+    "include, exclude, expected",
+    [
+        (["0.0.0.0/0"], [], ["0.0.0.0/0"]),
+        (
+            ["0.0.0.0/0"],
+            ["128.0.0.0/1", "0.0.0.0/2", "64.0.0.0/3"],
+            ["96.0.0.0/3"],
+        ),
+        # the adjacent and overlapping networks are merged
+        (["10.0.0.0/25", "10.0.0.128/25", "10.0.0.7/32"], [], ["10.0.0.0/24"]),
+        # the host bits are ignored
+        (["10.0.0.1/24"], ["10.0.0.1/25"], ["10.0.0.128/25"]),
+        (["10.0.0.0/24"], ["10.0.0.0/8"], []),
+        (
+            ["0.0.0.0/0", "::/0"],
+            ["0.0.0.0/1", "::/1", "c000::/2"],
+            ["128.0.0.0/1", "8000::/2"],
+        ),
+    ],
+)
+def test_resolve_allowed_ips(include, exclude, expected):
+    assert resolve_allowed_ips(include, exclude) == list(map(ip_network, expected))
+
+
+def test_resolve_allowed_ips_matches_address_exclude():
+    included = ip_network("10.0.0.0/8")
+    excluded = [
+        ip_network("10.1.0.0/16"),
+        ip_network("10.1.2.0/24"),
+        ip_network("10.200.3.4/30"),
+        ip_network("10.255.255.255/32"),
+    ]
+    expected = list(included.address_exclude(excluded[0]))
+    for network in excluded[2:]:
+        expected = [
+            subnet
+            for old in expected
+            for subnet in (
+                old.address_exclude(network) if network.subnet_of(old) else [old]
+            )
+        ]
+    assert resolve_allowed_ips([included], excluded) == sorted(expected)
+
+
+def test_collapse_allowed_ips():
+    allowed_ips = [ip_interface("10.0.0.2/32"), ip_interface("fd00::2/128")]
+    assert collapse_allowed_ips(allowed_ips) is allowed_ips
+    assert collapse_allowed_ips(
+        list(
+            map(
+                ip_interface, ["10.0.0.3/32", "fd00::/64", "10.0.0.2/32", "fd00::1/128"]
+            )
+        )
+    ) == list(map(ip_interface, ["10.0.0.2/31", "fd00::/64"]))
+
+
+def test_export_allowed_ips(config_dir):
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    peer_config = wg_wizard.config.peers["client_0"]
+    peer_config.server_allowed_ips = ["192.168.10.2/32", "192.168.10.3/32"]
+    peer_config.client_allowed_ips = ["0.0.0.0/0"]
+    peer_config.client_excluded_ips = ["192.168.0.0/16", "10.0.0.0/8"]
+    server_config = to_wg_quick_server_config(wg_wizard)
+    assert server_config.peer[0].allowed_ips == [ip_interface("192.168.10.2/31")]
+    client_config = to_wg_quick_client_config(wg_wizard, "client_0")
+    assert client_config.peer[0].allowed_ips == [
+        ip_interface((network.network_address, network.prefixlen))
+        for network in resolve_allowed_ips(
+            ["0.0.0.0/0"], ["192.168.0.0/16", "10.0.0.0/8"]
+        )
+    ]
+    # validated like the other wg-quick configs
+    assert to_wg_quick_client_config(wg_wizard, "client_0", trusted=False) == (
+        client_config
+    )
+
+
+def test_allowed_ips_command():
+    result = CliRunner().invoke(
+        allowed_ips, ["--include", "10.0.0.0/8", "--exclude", "10.0.0.0/9"]
+    )
+    assert result.exit_code == 0
+    assert result.output == "10.128.0.0/9\n"
+
+
+def test_excluded_all_allowed_ips(config_dir):
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    peer_config = wg_wizard.config.peers["client_0"]
+    with pytest.raises(ValidationError, match="route nothing"):
+        peer_config.client_excluded_ips = ["0.0.0.0/0", "::/0"]
+    assert peer_config.client_excluded_ips == []
+    with pytest.raises(ValidationError, match="route nothing"):
+        WgWizardPeerConfig(
+            addresses=["192.168.10.3/32"],
+            server_allowed_ips=["192.168.10.3/32"],
+            client_allowed_ips=["10.0.0.0/8"],
+            client_excluded_ips=["10.0.0.0/9", "10.128.0.0/9"],
+        )
+
+    # a peer built without validation, e.g., by a PeerTable, isn't exported either
+    wg_wizard.config.peers["client_0"] = peer_config.model_copy(
+        update={"client_excluded_ips": [ip_network("0.0.0.0/0"), ip_network("::/0")]}
+    )
+    with pytest.raises(ValueError, match="route nothing"):
+        to_wg_quick_client_config(wg_wizard, "client_0")
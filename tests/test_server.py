@@ -0,0 +1,85 @@
+from http.client import HTTPConnection
+import json
+import socket
+import stat
+import threading
+
+import pytest
+
+from wg_wizard.core import to_wg_quick_client_config, WgWizard
+from wg_wizard.paths import get_config_path
+from wg_wizard.server import UnixHTTPServer, WgWizardService
+
+
+class UnixHTTPConnection(HTTPConnection):
+    def __init__(self, socket_path):
+        super().__init__("localhost")
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(str(self.socket_path))
+
+
+@pytest.fixture
+def socket_path(config_dir):
+    socket_path = config_dir / "wg0.sock"
+    server = UnixHTTPServer(socket_path, WgWizardService(config_dir, "wg0"))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield socket_path
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def request(socket_path, method, path, body=None):
+    conn = UnixHTTPConnection(socket_path)
+    try:
+        conn.request(method, path, body=None if body is None else json.dumps(body))
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def test_export(config_dir, socket_path):
+    assert stat.S_IMODE(socket_path.stat().st_mode) == 0o600
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    expected = to_wg_quick_client_config(wg_wizard, "client_0").format_ini()
+    assert request(socket_path, "GET", "/peers/client_0/config") == (
+        200,
+        f"{expected}\n".encode(),
+    )
+    status, body = request(socket_path, "GET", "/peers/client_0/qrcode?format=png")
+    assert status == 200
+    assert body.startswith(b"\x89PNG")
+    status, body = request(socket_path, "GET", "/peers/missing/config")
+    assert status == 404
+    assert json.loads(body) == {"error": "Peer missing doesn't exist."}
+    assert request(socket_path, "GET", "/check") == (200, b'{"peers": 1}')
+
+    status, body = request(socket_path, "GET", "/metrics")
+    metrics = json.loads(body)
+    assert metrics["GET /peers/{name}/config"]["count"] == 2
+    assert metrics["GET /peers/{name}/config"]["errors"] == 1
+    assert metrics["GET /peers/{name}/qrcode"]["count"] == 1
+
+
+def test_add_peer_and_reload(config_dir, socket_path):
+    status, body = request(socket_path, "POST", "/peers", {"name": "client_1"})
+    assert (status, json.loads(body)) == (201, {"name": "client_1"})
+    status, body = request(socket_path, "POST", "/peers", {"name": "client_1"})
+    assert status == 400
+    assert "not unique" in json.loads(body)["error"]
+    assert json.loads(request(socket_path, "GET", "/peers")[1]) == [
+        "client_0",
+        "client_1",
+    ]
+
+    # the changes in the files are reloaded
+    config_path = get_config_path(config_dir, "wg0")
+    config_path.write_text(config_path.read_text().replace("51820", "51821"))
+    status, body = request(socket_path, "GET", "/server/config")
+    assert status == 200
+    assert b"ListenPort = 51821" in body
@@ -0,0 +1,71 @@
+import stat
+
+from click.testing import CliRunner
+import pytest
+
+from wg_wizard.cli import convert_storage
+from wg_wizard.core import WgWizard, WgWizardPeerConfig
+from wg_wizard.paths import get_config_path, get_secret_path, get_sqlite_path
+from wg_wizard.sqlite_store import SqliteStore
+
+
+def test_convert_storage(config_dir):
+    expected = WgWizard.from_dir(config_dir, "wg0")
+    result = CliRunner().invoke(
+        convert_storage, ["-i", "wg0", "-c", str(config_dir), "--to", "sqlite"]
+    )
+    assert result.exit_code == 0, result.output
+    sqlite_path = get_sqlite_path(config_dir, "wg0")
+    assert stat.S_IMODE(sqlite_path.stat().st_mode) == 0o600
+
+    # the sqlite storage is used instead of the files once it exists
+    get_config_path(config_dir, "wg0").unlink()
+    get_secret_path(config_dir, "wg0").unlink()
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    assert wg_wizard.model_dump() == expected.model_dump()
+
+    result = CliRunner().invoke(
+        convert_storage, ["-i", "wg0", "-c", str(config_dir), "--to", "files"]
+    )
+    assert result.exit_code == 0, result.output
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", storage="files")
+    assert wg_wizard.model_dump() == expected.model_dump()
+
+
+def test_single_peer_read_write(config_dir):
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    wg_wizard.dump(config_dir, "wg0", storage="sqlite")
+    store = SqliteStore(get_sqlite_path(config_dir, "wg0"))
+
+    peer_config = WgWizardPeerConfig(
+        addresses=["192.168.10.3/32"],
+        server_allowed_ips=["192.168.10.3/32"],
+        client_allowed_ips=["0.0.0.0/0"],
+    )
+    store.put_peer("client_1", peer_config)
+    assert store.get_peer_names() == ["client_0", "client_1"]
+    assert store.get_peer("client_1") == (peer_config, None)
+
+    # a partial load only contains the given peers and cannot replace all of them
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0", peer_names=["client_1"])
+    assert list(wg_wizard.config.peers) == ["client_1"]
+    with pytest.raises(ValueError, match="partial"):
+        wg_wizard.dump(config_dir, "wg0")
+    wg_wizard.secret.generate_peer_secret("client_1")
+    wg_wizard.dump(config_dir, "wg0", peer_names=["client_1"])
+    assert store.get_peer("client_1")[1] == wg_wizard.secret.peers["client_1"]
+
+    store.delete_peer("client_0")
+    wg_wizard = WgWizard.from_dir(config_dir, "wg0")
+    assert list(wg_wizard.config.peers) == ["client_1"]
+    assert list(wg_wizard.secret.peers) == ["client_1"]
+
+
+def test_transaction_rollback(config_dir):
+    WgWizard.from_dir(config_dir, "wg0").dump(config_dir, "wg0", storage="sqlite")
+    store = SqliteStore(get_sqlite_path(config_dir, "wg0"))
+    with pytest.raises(RuntimeError):
+        with store.transaction(write=True) as conn:
+            conn.execute("DELETE FROM peers")
+            raise RuntimeError()
+    assert store.get_peer_names() == ["client_0"]
@@ -0,0 +1,23 @@
+import os
+import stat
+
+from wg_wizard.utils import atomic_write
+
+
+def test_atomic_write(tmp_path, monkeypatch):
+    synced = []
+    original_fsync = os.fsync
+
+    def fsync(fd):
+        synced.append(stat.S_ISDIR(os.fstat(fd).st_mode))
+        original_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", fsync)
+    path = tmp_path / "file"
+    path.write_text("old")
+    atomic_write(path, "new")
+    assert path.read_text() == "new"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+    assert list(tmp_path.iterdir()) == [path]
+    # the file and then the directory with the rename
+    assert synced == [False, True]
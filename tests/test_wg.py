@@ -0,0 +1,100 @@
+from base64 import standard_b64decode
+import json
+from pathlib import Path
+import shutil
+
+import pytest
+
+from wg_wizard.wg import (
+    CryptographyKeyBackend,
+    KeyBackend,
+    PythonKeyBackend,
+    WgCommandKeyBackend,
+    create_key_backend,
+)
+
+data_dir = Path(__file__).parent / "data"
+
+
+def _cryptography_backend():
+    pytest.importorskip("cryptography")
+    return CryptographyKeyBackend()
+
+
+def _wg_backend():
+    if shutil.which("wg") is None:
+        pytest.skip("The wg binary is not installed.")
+    return WgCommandKeyBackend()
+
+
+backend_factories = {
+    "cryptography": _cryptography_backend,
+    "python": PythonKeyBackend,
+    "wg": _wg_backend,
+}
+
+
+@pytest.fixture(params=list(backend_factories))
+def key_backend(request):
+    return backend_factories[request.param]()
+
+
+def load_key_pairs(config_dir):
+    secret = json.loads((config_dir / "wg0_secret.json").read_text())
+    key_pairs = [(secret["private_key"], secret["public_key"])]
+    key_pairs.extend(
+        (peer["private_key"], peer["public_key"]) for peer in secret["peers"].values()
+    )
+    return key_pairs
+
+
+def test_rfc7748_vector():
+    # the public key of Alice in RFC 7748 section 6.1
+    private_key = "dwdtCnMYpX08FsFyUbJmRd9ML4frwJkqsXf7pR25LCo="
+    expected = "hSDwCYkwp1R0i33ctD73Wg2/Og0mOBr066SpjqqbTmo="
+    assert PythonKeyBackend().pubkey(private_key) == expected
+
+
+@pytest.mark.parametrize(
+    "private_key, public_key", load_key_pairs(data_dir / "default_with_one_client")
+)
+def test_pubkey_matches_wg(key_backend, private_key, public_key):
+    # the fixture keys were generated by the wg binary
+    assert key_backend.pubkey(private_key) == public_key
+
+
+def test_generated_keys(key_backend):
+    private_key = standard_b64decode(key_backend.genkey())
+    assert len(private_key) == 32
+    assert private_key[0] & 7 == 0
+    assert private_key[31] & 128 == 0
+    assert private_key[31] & 64 == 64
+    assert len(standard_b64decode(key_backend.genpsk())) == 32
+
+
+def test_backends_cross_check(key_backend):
+    python_backend = PythonKeyBackend()
+    for _ in range(10):
+        private_key = key_backend.genkey()
+        assert key_backend.pubkey(private_key) == python_backend.pubkey(private_key)
+        private_key = python_backend.genkey()
+        assert key_backend.pubkey(private_key) == python_backend.pubkey(private_key)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError, match="Unknown key backend"):
+        create_key_backend("unknown")
+
+
+def test_incomplete_backend():
+    class NoPskBackend(KeyBackend):
+        name = "no_psk"
+
+        def genkey(self) -> str:
+            return PythonKeyBackend().genkey()
+
+        def pubkey(self, private_key: str) -> str:
+            return PythonKeyBackend().pubkey(private_key)
+
+    with pytest.raises(TypeError):
+        NoPskBackend()
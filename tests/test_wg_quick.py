@@ -0,0 +1,81 @@
+from io import StringIO
+from pathlib import Path
+
+import pytest
+
+from wg_wizard.core import (
+    to_wg_quick_client_config,
+    to_wg_quick_server_config,
+    WgWizard,
+)
+from wg_wizard.paths import get_secret_path
+from wg_wizard.wg_quick import iter_wg_quick_config, read_ini
+
+data_dir = Path(__file__).parent / "data"
+
+
+def test_read_ini_round_trip():
+    config_dir = data_dir / "default_with_one_client"
+    get_secret_path(config_dir, "wg0").chmod(mode=0o600)
+    wg_quick_config = to_wg_quick_server_config(WgWizard.from_dir(config_dir, "wg0"))
+    assert read_ini(StringIO(wg_quick_config.format_ini())) == wg_quick_config
+
+
+def test_compact_ini_round_trip():
+    config_dir = data_dir / "default_with_one_client"
+    get_secret_path(config_dir, "wg0").chmod(mode=0o600)
+    wg_quick_config = to_wg_quick_client_config(
+        WgWizard.from_dir(config_dir, "wg0"), "client_0"
+    )
+    wg_quick_config.peer[0].persistent_keepalive = "off"
+    compact_ini = wg_quick_config.format_ini(compact=True)
+    assert len(compact_ini) < len(wg_quick_config.format_ini())
+    assert "\n\n" not in compact_ini
+    assert "AllowedIPs=0.0.0.0/0,::/0\n" in compact_ini
+    assert "PersistentKeepalive" not in compact_ini
+    wg_quick_config.peer[0].persistent_keepalive = None
+    assert read_ini(StringIO(compact_ini)) == wg_quick_config
+
+
+def test_read_hand_written_ini():
+    interface, peers = iter_wg_quick_config(
+        StringIO(
+            "# managed by hand\n"
+            "[Interface]\n"
+            "privatekey=uHcLp64yKEPEX9BVGtonUiZZRI03wK3pbwtCGuoIPEQ=\n"
+            "Address = 10.0.0.1/24, fd00::1/64\n"
+            "PostUp = iptables -A FORWARD -i %i -j ACCEPT; echo a, b\n"
+            "\n"
+            "# alice\n"
+            "[Peer] # the phone of alice\n"
+            "PublicKey = SD6+qGbpgMapjVmg1FFmkDJEbHPgFfEz2cOcHWhYwEc=\n"
+            "AllowedIPs = 10.0.0.2/32 # phone\n"
+            "AllowedIPs = fd00::2/128#phone\n"
+            "[Peer]\n"
+            "PublicKey = j4qJbzJL7/FLPb6Sr5ZZ6LjKgvJTZ2kW+c744hELoWg=\n"
+            "AllowedIPs = 10.0.0.3/32\n"
+        )
+    )
+    assert [str(address) for address in interface.address] == [
+        "10.0.0.1/24",
+        "fd00::1/64",
+    ]
+    assert interface.post_up == ["iptables -A FORWARD -i %i -j ACCEPT; echo a, b"]
+    peers = list(peers)
+    assert [peer.comment for peer in peers] == ["alice", None]
+    assert [str(ip) for ip in peers[0].allowed_ips] == ["10.0.0.2/32", "fd00::2/128"]
+
+
+@pytest.mark.parametrize(
+    "ini, error",
+    [
+        ("[Peer]\nPublicKey = a\n", "must start with an \\[Interface\\]"),
+        (
+            "[Interface]\nPrivateKey = a\nAddress = 10.0.0.1/24\nKey = b\n",
+            "unknown key",
+        ),
+    ],
+)
+def test_read_invalid_ini(ini, error):
+    with pytest.raises(ValueError, match=error):
+        read_ini(StringIO(ini))